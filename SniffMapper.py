@@ -1,22 +1,39 @@
 import sys
 import os
-from scapy.all import sniff, IP, TCP, UDP, DNS, Raw, ICMP, IPv6, ARP, conf, get_if_list
+import time
+STARTUP_STARTED = time.perf_counter()
+from scapy.arch import get_if_list
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QTabWidget, QTableWidget, QTableWidgetItem, QTextEdit, QPushButton, 
-                             QComboBox, QLineEdit, QLabel, QMessageBox, QHeaderView)
-from PyQt5.QtWebEngineWidgets import QWebEngineView
-from PyQt5.QtCore import Qt, QThread, pyqtSignal, QTimer, QSize, QUrl
-from PyQt5.QtGui import QFont, QFontDatabase, QColor, QPalette, QIcon
-import queue
+                             QTabWidget, QTableView, QPushButton, 
+                             QComboBox, QLineEdit, QLabel, QMessageBox, QHeaderView, QFileDialog,
+                             QTreeWidget, QTreeWidgetItem, QTableWidget, QTableWidgetItem, QGridLayout,
+                             QAbstractScrollArea, QTreeView)
+from PyQt5.QtCore import (Qt, QThread, QObject, pyqtSignal, pyqtSlot, QTimer, QSize, QUrl, QAbstractTableModel,
+                          QAbstractItemModel, QModelIndex, QPointF)
+from PyQt5.QtGui import (QFont, QFontDatabase, QFontMetrics, QColor, QPalette, QIcon, QBrush, QPainter, QPen,
+                         QPolygonF)
+from array import array
 from datetime import datetime
-import requests
 import logging
-import time
-from requests.exceptions import HTTPError
-import ipaddress
 import math
 import json
 import random
+from operator import attrgetter
+from collections import OrderedDict
+from packet_store import PacketStore
+from flows import FlowTable
+from map_updates import MapDeltaTracker
+from map_tiles import create_tile_cache, prefetch_on_open
+from reassembly import TcpReassembler
+from stats import TrafficStats
+from display_filter import NO_FLOW, PacketIndex, FilterSyntaxError, compile_filter
+from dissect import SummaryPool, get_endpoints, get_protocol_name
+from packet_details import DetailCache, DetailNode
+from capture import (CAPTURE_ENGINES, OVERLOAD_POLICIES, BATCH_FRAMES, BATCH_INTERVAL, RingCapture,
+                     CaptureFileReader, FrameQueue, PcapngWriter, copy_block, interface_decoder, linktype_decoder,
+                     socket_drops)
+from metrics import Metrics, quantile, start_metrics_export
+from geo import create_geo_resolver, is_private_ip, PRIVATE_IP_ERROR, RATE_LIMIT_ERROR
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -30,6 +47,37 @@ CYBER_DARK = "#0a0a0a"
 CYBER_DARKER = "#050505"
 CYBER_LIGHT = "#e0e0e0"
 
+PROTOCOL_COLORS = {
+    "TCP": CYBER_GREEN,
+    "UDP": CYBER_PURPLE,
+    "HTTP": CYBER_YELLOW,
+    "HTTPS": CYBER_ORANGE,
+    "DNS": CYBER_RED,
+}
+
+# Packet queue drain: each timer tick summarizes at most this much work so the
+# event loop keeps painting and handling input under a capture burst.
+DRAIN_TIME_BUDGET = 0.020  # seconds per tick
+DRAIN_PACKET_BUDGET = 5000
+DRAIN_IDLE_INTERVAL_MS = 100
+DRAIN_BUSY_INTERVAL_MS = 1
+BACKLOG_WARN = 10000
+BACKLOG_CRITICAL = 100000
+# Capture file loading pauses while this many frames wait to be processed
+FILE_READ_HIGH_WATER = 50000
+# The Conversations tab re-reads flow counters at this rate while it is visible
+CONVERSATIONS_REFRESH_MS = 1000
+# The Statistics tab redraws at this fixed rate while it is visible
+STATS_REFRESH_MS = 1000
+# Diagnostics rates and percentiles cover the interval between refreshes
+DIAGNOSTICS_REFRESH_MS = 1000
+# Map deltas are coalesced and pushed to the page at this fixed rate
+MAP_FRAME_MS = 200
+MAP_PAGE_URL = 'sniffmapper://app/map.html'
+# The hex viewer formats lines in blocks and keeps this many blocks around
+HEX_BLOCK_LINES = 256
+HEX_CACHE_BLOCKS = 64
+
 HTML_CONTENT = """
 <!DOCTYPE html>
 <html lang="en">
@@ -37,7 +85,7 @@ HTML_CONTENT = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>CyberTech Network Map</title>
-    <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
+    <link rel="stylesheet" href="leaflet/leaflet.css" />
     <style>
         body {
             margin: 0;
@@ -244,13 +292,16 @@ HTML_CONTENT = """
         </div>
     </div>
 
-    <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-    <script>
+    <script src="qwebchannel.js"></script>
+    <script type="module">
+        // Leaflet's ES module build, bundled in map_assets/leaflet
+        import * as L from './leaflet/leaflet-src.esm.js';
+        
         // Initialize cyberpunk map
         const map = L.map('map').setView([0, 0], 2);
         
-        // Dark cyberpunk tiles
-        L.tileLayer('https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png', {
+        // Dark cyberpunk tiles, served from the local MBTiles cache, which downloads missing ones when online
+        L.tileLayer('sniffmapper://tiles/{z}/{x}/{y}.png', {
             maxZoom: 19,
             attribution: '&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a>'
         }).addTo(map);
@@ -324,6 +375,8 @@ HTML_CONTENT = """
             paths.forEach(path => map.removeLayer(path));
             markers = [];
             paths = [];
+            flowData = null;
+            flowLayer.clearLayers();
             document.getElementById('distance-info').innerText = 'Select packets to trace network paths';
             document.getElementById('packet-info').innerHTML = '';
         }
@@ -383,6 +436,206 @@ HTML_CONTENT = """
             }
         }
         
+        // All-flows view, fed with deltas from Python over QWebChannel. Endpoints
+        // are grouped on a pixel grid for the current zoom and links are merged
+        // between groups; both are maintained incrementally as deltas arrive and
+        // only rebuilt when the zoom changes. Redraws are batched into animation
+        // frames and drawn with the canvas renderer, culled to the viewport.
+        const CLUSTER_CELL_PX = 48;
+        const MAX_DRAWN_LINKS = 2000;
+        const flowRenderer = L.canvas({ padding: 0.5 });
+        const flowLayer = L.layerGroup().addTo(map);
+        let flowData = null;
+        let flowFrame = null;
+        
+        function mercator(lat, lng) {
+            const sin = Math.sin(Math.max(Math.min(lat, 85.05), -85.05) * Math.PI / 180);
+            return [(lng + 180) / 360, 0.5 - Math.log((1 + sin) / (1 - sin)) / (4 * Math.PI)];
+        }
+        
+        function addToCluster(view, id, endpoint) {
+            const key = Math.floor(endpoint.x * view.scale) * 1e7 + Math.floor(endpoint.y * view.scale);
+            let cluster = view.clusters.get(key);
+            if (!cluster) {
+                cluster = { lat: 0, lng: 0, bytes: 0, members: new Set() };
+                view.clusters.set(key, cluster);
+            }
+            cluster.lat += endpoint.lat;
+            cluster.lng += endpoint.lng;
+            cluster.bytes += endpoint.bytes;
+            cluster.members.add(id);
+            endpoint.cell = key;
+        }
+        
+        function removeFromCluster(view, id, endpoint) {
+            const cluster = view.clusters.get(endpoint.cell);
+            cluster.members.delete(id);
+            if (!cluster.members.size) {
+                view.clusters.delete(endpoint.cell);
+                return;
+            }
+            cluster.lat -= endpoint.lat;
+            cluster.lng -= endpoint.lng;
+            cluster.bytes -= endpoint.bytes;
+        }
+        
+        function addToBundle(view, link, bytes, links) {
+            let a = flowData.endpoints.get(link.a).cell, b = flowData.endpoints.get(link.b).cell;
+            if (a === b) return;
+            if (a > b) [a, b] = [b, a];
+            const key = `${a}|${b}`;
+            let bundle = view.bundles.get(key);
+            if (!bundle) {
+                bundle = { a: a, b: b, bytes: 0, links: 0 };
+                view.bundles.set(key, bundle);
+            }
+            bundle.bytes += bytes;
+            bundle.links += links;
+            if (!bundle.links) view.bundles.delete(key);
+        }
+        
+        function clusterFlows(zoom) {
+            const view = { zoom: zoom, scale: 256 * Math.pow(2, zoom) / CLUSTER_CELL_PX,
+                           clusters: new Map(), bundles: new Map() };
+            flowData.endpoints.forEach((endpoint, id) => addToCluster(view, id, endpoint));
+            flowData.links.forEach(link => addToBundle(view, link, link.bytes, 1));
+            return view;
+        }
+        
+        function applyFlowDelta(delta) {
+            if (delta.reset) {
+                clearMap();
+                flowData = { endpoints: new Map(), links: new Map(), view: null };
+            } else if (!flowData) {
+                // Cleared with RESET MAP or replaced by a trace until MAP ALL is used again
+                return;
+            }
+            const endpoints = flowData.endpoints, links = flowData.links, view = flowData.view;
+            delta.removed_links.forEach(id => {
+                const link = links.get(id);
+                if (!link) return;
+                if (view) addToBundle(view, link, -link.bytes, -1);
+                links.delete(id);
+            });
+            delta.removed_endpoints.forEach(id => {
+                const endpoint = endpoints.get(id);
+                if (!endpoint) return;
+                if (view) removeFromCluster(view, id, endpoint);
+                endpoints.delete(id);
+            });
+            delta.endpoints.forEach(([id, lat, lng, label, bytes]) => {
+                const endpoint = endpoints.get(id);
+                if (endpoint) {
+                    if (view) view.clusters.get(endpoint.cell).bytes += bytes - endpoint.bytes;
+                    endpoint.bytes = bytes;
+                    return;
+                }
+                const [x, y] = mercator(lat, lng);
+                const added = { lat: lat, lng: lng, label: label, bytes: bytes, x: x, y: y, cell: null };
+                endpoints.set(id, added);
+                if (view) addToCluster(view, id, added);
+            });
+            delta.links.forEach(([id, a, b, bytes]) => {
+                const link = links.get(id);
+                if (link) {
+                    if (view) addToBundle(view, link, bytes - link.bytes, 0);
+                    link.bytes = bytes;
+                    return;
+                }
+                const added = { a: a, b: b, bytes: bytes };
+                links.set(id, added);
+                if (view) addToBundle(view, added, bytes, 1);
+            });
+            document.getElementById('distance-info').innerText =
+                `ALL FLOWS: ${endpoints.size} ENDPOINTS, ${links.size} LINKS`;
+            if (delta.reset && endpoints.size) {
+                const points = Array.from(endpoints.values(), endpoint => [endpoint.lat, endpoint.lng]);
+                map.fitBounds(L.latLngBounds(points), { padding: [50, 50], maxZoom: 6 });
+            }
+            if (!flowFrame) {
+                flowFrame = requestAnimationFrame(() => {
+                    flowFrame = null;
+                    drawFlows();
+                });
+            }
+        }
+        
+        function arcPoints(from, to) {
+            // Quadratic curve bowed to one side so opposite directions and parallel links stay apart
+            const dx = to.lng - from.lng, dy = to.lat - from.lat;
+            const cx = (from.lng + to.lng) / 2 - dy * 0.2, cy = (from.lat + to.lat) / 2 + dx * 0.2;
+            const points = [];
+            for (let step = 0; step <= 16; step++) {
+                const t = step / 16, u = 1 - t;
+                points.push([u * u * from.lat + 2 * u * t * cy + t * t * to.lat,
+                             u * u * from.lng + 2 * u * t * cx + t * t * to.lng]);
+            }
+            return points;
+        }
+        
+        function centroid(cluster) {
+            return { lat: cluster.lat / cluster.members.size, lng: cluster.lng / cluster.members.size };
+        }
+        
+        function drawFlows() {
+            flowLayer.clearLayers();
+            if (!flowData) return;
+            const zoom = map.getZoom();
+            if (!flowData.view || flowData.view.zoom !== zoom) {
+                flowData.view = clusterFlows(zoom);
+            }
+            const view = flowData.view;
+            const bounds = map.getBounds().pad(0.5);
+            const visible = [];
+            view.bundles.forEach(bundle => {
+                const from = centroid(view.clusters.get(bundle.a)), to = centroid(view.clusters.get(bundle.b));
+                if (bounds.intersects(L.latLngBounds([from.lat, from.lng], [to.lat, to.lng]))) {
+                    visible.push({ from: from, to: to, bytes: bundle.bytes });
+                }
+            });
+            visible.sort((x, y) => y.bytes - x.bytes);
+            const drawn = visible.slice(0, MAX_DRAWN_LINKS);
+            const maxBytes = drawn.length ? drawn[0].bytes : 1;
+            drawn.forEach(link => {
+                L.polyline(arcPoints(link.from, link.to), {
+                    renderer: flowRenderer,
+                    color: '#ff00ff',
+                    weight: 1 + 7 * Math.log1p(link.bytes) / Math.log1p(maxBytes),
+                    opacity: 0.55,
+                    interactive: false
+                }).addTo(flowLayer);
+            });
+            view.clusters.forEach(cluster => {
+                const center = centroid(cluster);
+                if (!bounds.contains([center.lat, center.lng])) return;
+                const count = cluster.members.size;
+                const label = count === 1 ? flowData.endpoints.get(cluster.members.values().next().value).label
+                                          : `${count} ENDPOINTS`;
+                L.circleMarker([center.lat, center.lng], {
+                    renderer: flowRenderer,
+                    radius: 4 + Math.min(14, 3 * Math.log10(count)),
+                    color: '#00f0ff',
+                    weight: 1,
+                    fillColor: '#00f0ff',
+                    fillOpacity: 0.6
+                }).bindTooltip(`${label}<br>${cluster.bytes} BYTES`, { className: 'cyber-tooltip' }).addTo(flowLayer);
+            });
+            document.getElementById('packet-info').innerText =
+                `${view.clusters.size} GROUPS | ${drawn.length}/${view.bundles.size} LINKS DRAWN`;
+        }
+        
+        map.on('moveend', drawFlows);
+        
+        // Python pushes map deltas through the "bridge" object; asking for a resync on
+        // connect makes the first delta after every page load a full snapshot
+        if (typeof QWebChannel !== 'undefined' && window.qt) {
+            new QWebChannel(qt.webChannelTransport, channel => {
+                const bridge = channel.objects.bridge;
+                bridge.delta.connect(text => applyFlowDelta(JSON.parse(text)));
+                bridge.resync();
+            });
+        }
+        
         // Control panel event handlers
         document.getElementById('search-btn').addEventListener('click', () => {
             const query = document.getElementById('search-input').value;
@@ -428,30 +681,699 @@ HTML_CONTENT = """
 """
 
 class SnifferThread(QThread):
-    packet_received = pyqtSignal(object)
+    # Collects frames into lists on the capture thread and puts them straight
+    # into the bounded frame queue the GUI drains, instead of one signal per
+    # packet. Frames are Scapy packets from the sniff() engine, or (raw,
+    # timestamp, interface, decoder) tuples from the ring engine.
 
-    def __init__(self, filter_text, interface):
+    def __init__(self, filter_text, interface, frame_queue, engine='scapy', writer=None, metrics=None):
         super().__init__()
         self.filter_text = filter_text
         self.interface = interface
+        self.frame_queue = frame_queue
+        self.engine = engine
+        self.writer = writer
+        self.metrics = metrics
         self.stopped = False
+        self.batch = []
+        self.batch_started = 0.0
+        self.kernel_drops = 0
 
     def run(self):
         try:
-            sniff(filter=self.filter_text, iface=self.interface, prn=self.packet_handler, 
-                  store=False, stop_filter=lambda x: self.stopped)
+            if self.engine == 'tpacket_v3':
+                self.run_ring()
+            else:
+                self.run_sniff()
         except Exception as e:
             logging.error(f"Sniffing error: {e}")
             QMessageBox.critical(None, "ERROR", f"Sniffing failed: {e}")
+        finally:
+            self.flush()
+
+    def run_sniff(self):
+        from scapy.config import conf
+        from scapy.sendrecv import sniff
+        # sniff() has no idle callback, so it runs in BATCH_INTERVAL slices on
+        # one open socket and the batch is flushed between slices
+        sock = conf.L2listen(iface=self.interface, filter=self.filter_text or None)
+        try:
+            while not self.stopped:
+                sniff(opened_socket=sock, prn=self.packet_handler, store=False, timeout=BATCH_INTERVAL,
+                      stop_filter=lambda x: self.stopped)
+                self.kernel_drops += socket_drops(getattr(sock, 'ins', None))
+                self.flush()
+        finally:
+            sock.close()
+
+    def run_ring(self):
+        decoder = interface_decoder(self.interface)
+        with RingCapture(self.interface, self.filter_text) as ring:
+            ring.run(lambda view, frames: self.block_handler(view, frames, decoder), lambda: self.poll_ring(ring))
+            received, self.kernel_drops = ring.kernel_stats()
+        logging.info(f"Ring capture on {self.interface} stopped: {received} frames, {self.kernel_drops} kernel drops")
+
+    def poll_ring(self, ring):
+        # Called between blocks and on every idle poll of the ring
+        if self.batch_started and time.monotonic() - self.batch_started >= BATCH_INTERVAL:
+            self.kernel_drops = ring.kernel_stats()[1]
+            self.flush()
+        return self.stopped
+
+    def block_handler(self, view, frames, decoder):
+        batch = copy_block(view, frames, self.interface, decoder)
+        if self.writer:
+            self.writer.submit([(raw, timestamp, decoder) for raw, timestamp, _, decoder in batch])
+        if not self.batch:
+            self.batch_started = time.monotonic()
+        self.batch.extend(batch)
+        if len(self.batch) >= BATCH_FRAMES:
+            self.flush()
 
     def packet_handler(self, packet):
         if not self.stopped:
-            self.packet_received.emit(packet)
+            batch = self.batch
+            if not batch:
+                self.batch_started = time.monotonic()
+            batch.append(packet)
+            if len(batch) >= BATCH_FRAMES:
+                self.flush()
+
+    def flush(self):
+        batch = self.batch
+        if not batch:
+            return
+        self.batch = []
+        self.batch_started = 0.0
+        if self.writer and self.engine != 'tpacket_v3':
+            self.writer.submit([(getattr(packet, 'original', None) or bytes(packet), packet.time, type(packet))
+                                for packet in batch])
+        started = time.perf_counter()
+        self.frame_queue.put(batch, lambda: self.stopped)
+        if self.metrics is not None:
+            self.metrics.observe('capture_handoff_seconds', time.perf_counter() - started)
+            self.metrics.inc('capture_frames_total', len(batch))
+
+    def stop(self):
+        self.stopped = True
+
+class CaptureFileThread(QThread):
+    # Streams frame references out of a pcap/pcapng file in chunks. The reader
+    # pauses while the GUI pipeline is behind so memory stays bounded however
+    # large the file is, and its frames are never dropped by the overload policy.
+    progress = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, source_id, frame_queue, backlog):
+        super().__init__()
+        self.path = path
+        self.source_id = source_id
+        self.frame_queue = frame_queue
+        self.backlog = backlog
+        self.stopped = False
+        self.frames_read = 0
+
+    def run(self):
+        try:
+            reader = CaptureFileReader(self.path)
+        except (OSError, ValueError) as e:
+            logging.error(f"Cannot open capture file {self.path}: {e}")
+            self.failed.emit(str(e))
+            return
+        
+        decoders = {}
+        try:
+            for chunk in reader.chunks():
+                while not self.stopped and self.backlog() > FILE_READ_HIGH_WATER:
+                    self.msleep(20)
+                if self.stopped:
+                    break
+                frames = []
+                for offset, length, timestamp, linktype in chunk:
+                    decoder = decoders.get(linktype)
+                    if decoder is None:
+                        decoder = decoders[linktype] = linktype_decoder(linktype)
+                    frames.append((self.source_id, offset, length, timestamp, None, decoder))
+                self.frame_queue.put(frames, lambda: self.stopped, lossless=True)
+                if self.stopped:
+                    break
+                self.frames_read += len(frames)
+                self.progress.emit(reader.position, reader.size)
+        except Exception as e:
+            logging.error(f"Error reading capture file {self.path}: {e}")
+            self.failed.emit(str(e))
+        finally:
+            reader.close()
 
     def stop(self):
         self.stopped = True
 
+class PacketTableModel(QAbstractTableModel):
+    HEADERS = ['TIME', 'SOURCE', 'DEST', 'PROTO', 'SIZE', 'INFO']
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.default_brush = QBrush(QColor(CYBER_BLUE))
+        self.clear_store()
+
+    def clear_store(self):
+        # One slot per packet in flat typed arrays; addresses and protocol names
+        # are interned so millions of rows cost a few bytes each plus the info text.
+        self.times = array('d')
+        self.lengths = array('I')
+        self.src_ids = array('I')
+        self.dst_ids = array('I')
+        self.proto_ids = array('H')
+        self.l4_protos = array('H')
+        self.sports = array('H')
+        self.dports = array('H')
+        self.tcp_flags = array('B')
+        self.infos = []
+        self.strings = []
+        self.string_ids = {}
+        self.protocols = []
+        self.protocol_ids = {}
+        self.brushes = []
+        self.order = None
+        self.sort_column = 0
+        self.sort_order = Qt.AscendingOrder
+        self.filter_index = PacketIndex()
+        # With a display filter, `filtered` holds the matching packet indexes
+        # in capture order and `order` is always set to the displayed subset.
+        self.display_filter = None
+        self.filter_test = None
+        self.filtered = None
+
+    def intern(self, text):
+        string_id = self.string_ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self.string_ids[text] = string_id
+        return string_id
+    
+    def intern_protocol(self, protocol):
+        proto_id = self.protocol_ids.get(protocol)
+        if proto_id is None:
+            proto_id = len(self.protocols)
+            self.protocols.append(protocol)
+            self.protocol_ids[protocol] = proto_id
+            color = PROTOCOL_COLORS.get(protocol)
+            self.brushes.append(QBrush(QColor(color)) if color else self.default_brush)
+        return proto_id
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.times) if self.order is None else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def packet_count(self):
+        return len(self.times)
+
+    def packet_index(self, row):
+        if self.order is None:
+            return row
+        return self.order[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        i = self.packet_index(index.row())
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return datetime.fromtimestamp(self.times[i]).strftime('%H:%M:%S.%f')[:-3]
+            if column == 1:
+                return self.strings[self.src_ids[i]]
+            if column == 2:
+                return self.strings[self.dst_ids[i]]
+            if column == 3:
+                return self.protocols[self.proto_ids[i]]
+            if column == 4:
+                return str(self.lengths[i])
+            return self.infos[i]
+        if role == Qt.ForegroundRole:
+            return self.brushes[self.proto_ids[i]]
+        return None
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.times)
+        if self.order is None:
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        intern = self.intern
+        for time_value, src, dst, protocol, length, info, flow in rows:
+            self.times.append(time_value)
+            self.src_ids.append(intern(src))
+            self.dst_ids.append(intern(dst))
+            self.proto_ids.append(self.intern_protocol(protocol))
+            self.lengths.append(length)
+            self.infos.append(info)
+            if flow is None:
+                self.l4_protos.append(NO_FLOW)
+                self.sports.append(0)
+                self.dports.append(0)
+                self.tcp_flags.append(0)
+            else:
+                self.l4_protos.append(flow[0])
+                self.sports.append(flow[1])
+                self.dports.append(flow[2])
+                self.tcp_flags.append(flow[3] & 0xFF)
+        self.filter_index.update(self)
+        if self.order is None:
+            self.endInsertRows()
+            return
+        added = range(first, first + len(rows))
+        if self.filter_test is not None:
+            added = array('I', filter(self.filter_test, added))
+            self.filtered.extend(added)
+        if added:
+            # New packets land below the sorted block until the next sort
+            start = len(self.order)
+            self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+            self.order.extend(added)
+            self.endInsertRows()
+
+    def clear(self):
+        self.beginResetModel()
+        display_filter = self.display_filter
+        self.clear_store()
+        if display_filter is not None:
+            self.display_filter = display_filter
+            self.filter_test = display_filter.predicate(self)
+            self.filtered = array('I')
+            self.order = array('I')
+        self.endResetModel()
+
+    def set_filter(self, display_filter):
+        self.beginResetModel()
+        if display_filter is None:
+            self.display_filter = self.filter_test = self.filtered = None
+        else:
+            self.display_filter = display_filter
+            self.filtered = display_filter.apply(self, self.filter_index)
+            self.filter_test = display_filter.predicate(self)
+        self.order = self.sorted_order(self.sort_column, self.sort_order)
+        self.endResetModel()
+
+    def sorted_order(self, column, order):
+        rows = range(len(self.times)) if self.filtered is None else self.filtered
+        if column == 0 and order == Qt.AscendingOrder:
+            # Capture order is time order, so the default sort needs no permutation
+            return None if self.filtered is None else array('I', self.filtered)
+        return array('I', sorted(rows, key=self.sort_key(column), reverse=order == Qt.DescendingOrder))
+
+    def sort_key(self, column):
+        if column == 0:
+            return self.times.__getitem__
+        if column == 4:
+            return self.lengths.__getitem__
+        if column == 5:
+            return self.infos.__getitem__
+        if column == 3:
+            protocols, proto_ids = self.protocols, self.proto_ids
+            return lambda i: protocols[proto_ids[i]]
+        ids = self.src_ids if column == 1 else self.dst_ids
+        strings = self.strings
+        return lambda i: strings[ids[i]]
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        packet_rows = [self.packet_index(index.row()) for index in persistent]
+        
+        self.order = self.sorted_order(column, order)
+        
+        if persistent:
+            if self.order is None:
+                positions = {i: i for i in packet_rows}
+            else:
+                wanted = set(packet_rows)
+                positions = {i: row for row, i in enumerate(self.order) if i in wanted}
+            self.changePersistentIndexList(
+                persistent,
+                [self.index(positions[i], index.column()) for i, index in zip(packet_rows, persistent)])
+        self.layoutChanged.emit()
+
+class ConversationTableModel(QAbstractTableModel):
+    HEADERS = ['PROTO', 'ADDRESS A', 'PORT A', 'ADDRESS B', 'PORT B', 'PACKETS', 'BYTES',
+               'PKTS A→B', 'PKTS B→A', 'START', 'DURATION', 'STATE']
+    SORT_KEYS = [attrgetter('protocol_name'), attrgetter('src'), attrgetter('sport'), attrgetter('dst'),
+                 attrgetter('dport'), attrgetter('packets'), attrgetter('bytes'), attrgetter('packets_ab'),
+                 attrgetter('packets_ba'), attrgetter('first_seen'), attrgetter('duration'), attrgetter('state_name')]
+
+    def __init__(self, flow_table, parent=None):
+        super().__init__(parent)
+        self.flow_table = flow_table
+        self.default_brush = QBrush(QColor(CYBER_BLUE))
+        self.brushes = {protocol: QBrush(QColor(color)) for protocol, color in PROTOCOL_COLORS.items()}
+        self.reset_view()
+
+    def reset_view(self):
+        # Flow objects are updated in place by the FlowTable; the model only
+        # tracks how many of them it has announced and the sort permutation.
+        self.flows = self.flow_table.flows
+        self.shown = 0
+        self.generation = self.flow_table.generation
+        self.order = None
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.shown
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flow(self, row):
+        return self.flows[row if self.order is None else self.order[row]]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        flow = self.flow(index.row())
+        if role == Qt.DisplayRole:
+            column = index.column()
+            if column == 0:
+                return flow.protocol_name
+            if column == 1:
+                return flow.src
+            if column == 2:
+                return str(flow.sport) if flow.sport else ""
+            if column == 3:
+                return flow.dst
+            if column == 4:
+                return str(flow.dport) if flow.dport else ""
+            if column == 5:
+                return str(flow.packets)
+            if column == 6:
+                return str(flow.bytes)
+            if column == 7:
+                return str(flow.packets_ab)
+            if column == 8:
+                return str(flow.packets_ba)
+            if column == 9:
+                return datetime.fromtimestamp(flow.first_seen).strftime('%H:%M:%S.%f')[:-3]
+            if column == 10:
+                return f"{flow.duration:.3f}s"
+            return flow.state_name
+        if role == Qt.ForegroundRole:
+            return self.brushes.get(flow.protocol_name, self.default_brush)
+        return None
+
+    def refresh(self):
+        if self.generation != self.flow_table.generation or self.flows is not self.flow_table.flows:
+            self.beginResetModel()
+            sort_column, sort_order = self.sort_column, self.sort_order
+            self.reset_view()
+            self.shown = len(self.flows)
+            if sort_column is not None:
+                self.sort_column, self.sort_order = sort_column, sort_order
+                self.order = self.sorted_order()
+            self.endResetModel()
+            return
+        count = len(self.flows)
+        if count > self.shown:
+            first = self.shown
+            self.beginInsertRows(QModelIndex(), first, count - 1)
+            self.shown = count
+            if self.order is not None:
+                # New flows land below the sorted block until the next sort
+                self.order.extend(range(first, count))
+            self.endInsertRows()
+        if self.shown:
+            # Counters change in place; the view only repaints what is visible
+            self.dataChanged.emit(self.index(0, 0), self.index(self.shown - 1, len(self.HEADERS) - 1))
+
+    def sorted_order(self):
+        key = self.SORT_KEYS[self.sort_column]
+        flows = self.flows
+        return array('I', sorted(range(self.shown), key=lambda i: key(flows[i]),
+                                 reverse=self.sort_order == Qt.DescendingOrder))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_column = column
+        self.sort_order = order
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        flow_ids = [id(self.flow(index.row())) for index in persistent]
+        self.order = self.sorted_order()
+        if persistent:
+            wanted = set(flow_ids)
+            positions = {id(self.flows[i]): row for row, i in enumerate(self.order) if id(self.flows[i]) in wanted}
+            self.changePersistentIndexList(
+                persistent,
+                [self.index(positions[flow_id], index.column()) for flow_id, index in zip(flow_ids, persistent)])
+        self.layoutChanged.emit()
+
+def format_si(value, unit):
+    for scale, prefix in ((1e9, 'G'), (1e6, 'M'), (1e3, 'K')):
+        if value >= scale:
+            return f"{value / scale:.1f} {prefix}{unit}"
+    return f"{value:.0f} {unit}"
+
+class RateGraph(QWidget):
+    # Line chart of a fixed-length series, newest sample on the right
+    def __init__(self, title, unit, color, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.unit = unit
+        self.color = QColor(color)
+        self.values = []
+        self.setMinimumHeight(140)
+
+    def set_values(self, values):
+        self.values = values
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        rect = self.rect().adjusted(8, 20, -8, -8)
+        painter.fillRect(self.rect(), QColor(CYBER_DARK))
+        painter.setPen(QPen(QColor(CYBER_BLUE), 1))
+        painter.drawRect(rect)
+        peak = max(self.values) if self.values else 0
+        current = self.values[-1] if self.values else 0
+        painter.drawText(8, 14, f"{self.title}  NOW {format_si(current, self.unit)}  PEAK {format_si(peak, self.unit)}")
+        if len(self.values) > 1 and peak > 0:
+            step = rect.width() / (len(self.values) - 1)
+            points = [QPointF(rect.left() + i * step, rect.bottom() - value / peak * rect.height())
+                      for i, value in enumerate(self.values)]
+            painter.setPen(QPen(self.color, 2))
+            painter.drawPolyline(QPolygonF(points))
+        painter.end()
+
+HEX_ASCII = bytes(b if 32 <= b <= 126 else ord('.') for b in range(256))
+
+def hex_lines(data, first, count):
+    # Dump lines first..first+count; bytes.hex and bytes.translate do the per-byte work in C
+    lines = []
+    for offset in range(first * 16, min((first + count) * 16, len(data)), 16):
+        chunk = bytes(data[offset:offset + 16])
+        lines.append(f"{offset:08x}:  {chunk.hex(' '):<47}  {chunk.translate(HEX_ASCII).decode('ascii')}")
+    return lines
+
+class HexView(QAbstractScrollArea):
+    # Hex dump that only paints the lines in view, straight from the raw buffer.
+    # Lines are formatted a block at a time and kept in a small LRU, so a
+    # multi-megabyte buffer costs a screenful of formatting per scroll step.
+    # One byte range can be highlighted, e.g. the selected protocol layer.
+    LINE_CHARS = 10 + 47 + 2 + 16
+    MARGIN = 6
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        font = QFont('Courier New')
+        font.setStyleHint(QFont.TypeWriter)
+        font.setPixelSize(12)
+        self.setFont(font)
+        self.setStyleSheet(f"QAbstractScrollArea {{ background-color: {CYBER_DARK}; border: 1px solid {CYBER_BLUE}; }}")
+        self.data = b''
+        self.line_count = 0
+        self.blocks = OrderedDict()
+        self.highlight = None
+    
+    def set_data(self, data):
+        self.data = data
+        self.line_count = (len(data) + 15) // 16
+        self.blocks.clear()
+        self.highlight = None
+        self.verticalScrollBar().setValue(0)
+        self.update_scrollbars()
+        self.viewport().update()
+    
+    def clear(self):
+        self.set_data(b'')
+    
+    def set_highlight(self, start, end):
+        self.highlight = (start, end) if end > start else None
+        if self.highlight:
+            self.scroll_to_offset(start)
+        self.viewport().update()
+    
+    def scroll_to_offset(self, offset):
+        line = offset // 16
+        first = self.verticalScrollBar().value()
+        visible = self.visible_lines()
+        if not first <= line < first + visible - 1:
+            self.verticalScrollBar().setValue(max(line - visible // 3, 0))
+    
+    def metrics(self):
+        metrics = QFontMetrics(self.font())
+        return metrics.height(), metrics.horizontalAdvance('0'), metrics.ascent()
+    
+    def visible_lines(self):
+        return max(self.viewport().height() // self.metrics()[0], 1)
+    
+    def update_scrollbars(self):
+        visible = self.visible_lines()
+        self.verticalScrollBar().setRange(0, max(self.line_count - visible, 0))
+        self.verticalScrollBar().setPageStep(visible)
+        width = self.LINE_CHARS * self.metrics()[1] + 2 * self.MARGIN
+        self.horizontalScrollBar().setRange(0, max(width - self.viewport().width(), 0))
+        self.horizontalScrollBar().setPageStep(self.viewport().width())
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scrollbars()
+    
+    def lines(self, first, count):
+        lines = []
+        for block in range(first // HEX_BLOCK_LINES, (first + count - 1) // HEX_BLOCK_LINES + 1):
+            cached = self.blocks.get(block)
+            if cached is None:
+                cached = self.blocks[block] = hex_lines(self.data, block * HEX_BLOCK_LINES, HEX_BLOCK_LINES)
+                if len(self.blocks) > HEX_CACHE_BLOCKS:
+                    self.blocks.popitem(last=False)
+            else:
+                self.blocks.move_to_end(block)
+            lines.extend(cached)
+        skip = first % HEX_BLOCK_LINES
+        return lines[skip:skip + count]
+    
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        painter.fillRect(event.rect(), QColor(CYBER_DARK))
+        line_height, char_width, ascent = self.metrics()
+        first = self.verticalScrollBar().value()
+        left = self.MARGIN - self.horizontalScrollBar().value()
+        lines = self.lines(first, self.visible_lines() + 1) if self.line_count else []
+        if self.highlight:
+            start, end = self.highlight
+            color = QColor(CYBER_PURPLE)
+            color.setAlpha(110)
+            for row in range(len(lines)):
+                line_start = (first + row) * 16
+                lo, hi = max(start, line_start), min(end, line_start + 16)
+                if lo >= hi:
+                    continue
+                lo, hi = lo - line_start, hi - line_start - 1
+                y = row * line_height
+                painter.fillRect(left + (10 + 3 * lo) * char_width, y, (3 * (hi - lo) + 2) * char_width, line_height,
+                                 color)
+                painter.fillRect(left + (59 + lo) * char_width, y, (hi - lo + 1) * char_width, line_height, color)
+        painter.setPen(QColor(CYBER_BLUE))
+        for row, text in enumerate(lines):
+            painter.drawText(left, row * line_height + ascent, text)
+        painter.end()
+
+class DetailTreeModel(QAbstractItemModel):
+    # Shows a packet_details.DetailNode tree. Unloaded nodes report children
+    # but no rows; the view's fetchMore on expand runs their loader.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.root = DetailNode("")
+    
+    def set_root(self, root):
+        self.beginResetModel()
+        self.root = root
+        self.endResetModel()
+    
+    def node(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+    
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.node(parent)
+        if column != 0 or not node.loaded() or not 0 <= row < len(node.children):
+            return QModelIndex()
+        return self.createIndex(row, 0, node.children[row])
+    
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.parent.children.index(parent), 0, parent)
+    
+    def rowCount(self, parent=QModelIndex()):
+        node = self.node(parent)
+        return len(node.children) if node.loaded() else 0
+    
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+    
+    def hasChildren(self, parent=QModelIndex()):
+        return self.node(parent).has_children()
+    
+    def canFetchMore(self, parent):
+        return not self.node(parent).loaded()
+    
+    def fetchMore(self, parent):
+        node = self.node(parent)
+        children = node.build()
+        if children:
+            self.beginInsertRows(parent, 0, len(children) - 1)
+        node.load()
+        if children:
+            self.endInsertRows()
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return node.text
+        if role == Qt.ForegroundRole and node.parent is self.root:
+            return QBrush(QColor(CYBER_PURPLE))
+        return None
+
+class MapBridge(QObject):
+    # Registered on the map page's QWebChannel as "bridge". Each delta is one
+    # JSON document; the page calls resync() whenever it (re)connects.
+    delta = pyqtSignal(str)
+    resync_requested = pyqtSignal()
+    
+    @pyqtSlot()
+    def resync(self):
+        self.resync_requested.emit()
+
 class CyberTechPacketTracker(QMainWindow):
+    geo_ready = pyqtSignal(str, object)
+    
     def __init__(self):
         super().__init__()
         self.setWindowTitle("CYBERTECH PACKET TRACKER")
@@ -462,6 +1384,15 @@ class CyberTechPacketTracker(QMainWindow):
         self.set_cyberpunk_style()
         
         self.geo_scan_in_progress = False
+        self.geo_scan = None
+        self.map_trace = None
+        self.bulk_geo = None
+        # ip -> (latitude, longitude, label) for every address located so far
+        self.geo_locations = {}
+        # Per-stage counters and latencies for the DIAGNOSTICS tab and the optional exporters
+        self.metrics = Metrics()
+        self.geo_resolver = create_geo_resolver(self.metrics)
+        self.geo_ready.connect(self.on_geo_ready)
         
         main_widget = QWidget()
         self.setCentralWidget(main_widget)
@@ -512,12 +1443,28 @@ class CyberTechPacketTracker(QMainWindow):
         packet_list_layout = QVBoxLayout()
         self.packet_list_widget.setLayout(packet_list_layout)
         
+        # Display filter bar: narrows the table without touching the capture
+        display_filter_layout = QHBoxLayout()
+        display_filter_label = QLabel("DISPLAY FILTER:")
+        display_filter_label.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 11px;")
+        display_filter_layout.addWidget(display_filter_label)
+        self.display_filter_entry = QLineEdit()
+        self.display_filter_entry.setPlaceholderText("e.g. ip.src == 1.2.3.4 && tcp.flags.syn && len > 1000")
+        self.display_filter_entry.returnPressed.connect(self.apply_display_filter)
+        display_filter_layout.addWidget(self.display_filter_entry)
+        self.create_cyber_button("APPLY", self.apply_display_filter, display_filter_layout)
+        self.display_filter_status = QLabel("")
+        self.display_filter_status.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 11px;")
+        display_filter_layout.addWidget(self.display_filter_status)
+        packet_list_layout.addLayout(display_filter_layout)
+        self.set_display_filter_style(True)
+        
         # Packet table with cyber styling
-        self.packet_table = QTableWidget()
-        self.packet_table.setColumnCount(6)
-        self.packet_table.setHorizontalHeaderLabels(['TIME', 'SOURCE', 'DEST', 'PROTO', 'SIZE', 'INFO'])
+        self.packet_model = PacketTableModel(self)
+        self.packet_table = QTableView()
+        self.packet_table.setModel(self.packet_model)
         self.packet_table.setStyleSheet(f"""
-            QTableWidget {{
+            QTableView {{
                 background-color: {CYBER_DARK};
                 color: {CYBER_BLUE};
                 border: 1px solid {CYBER_BLUE};
@@ -532,10 +1479,10 @@ class CyberTechPacketTracker(QMainWindow):
                 border: 1px solid {CYBER_BLUE};
                 font-weight: bold;
             }}
-            QTableWidget::item {{
+            QTableView::item {{
                 padding: 3px;
             }}
-            QTableWidget::item:selected {{
+            QTableView::item:selected {{
                 background-color: {CYBER_BLUE};
                 color: {CYBER_DARK};
             }}
@@ -548,23 +1495,99 @@ class CyberTechPacketTracker(QMainWindow):
         self.packet_table.setColumnWidth(4, 60)   # Length
         self.packet_table.setColumnWidth(5, 400)  # Info
         
+        # Fixed row heights keep the view from measuring rows it never shows
+        self.packet_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.packet_table.verticalHeader().setDefaultSectionSize(20)
+        
         self.packet_table.setSortingEnabled(True)
         self.packet_table.sortByColumn(0, Qt.AscendingOrder)
         
-        self.packet_table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.packet_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.packet_table.setSelectionBehavior(QTableView.SelectRows)
+        self.packet_table.setEditTriggers(QTableView.NoEditTriggers)
         self.packet_table.selectionModel().selectionChanged.connect(self.show_packet_details)
         
         packet_list_layout.addWidget(self.packet_table)
         self.tabs.addTab(self.packet_list_widget, "PACKET LIST")
         
+        # Conversations Tab: packets folded into bidirectional 5-tuple flows
+        self.flow_table = FlowTable()
+        self.conversations_widget = QWidget()
+        conversations_layout = QVBoxLayout()
+        self.conversations_widget.setLayout(conversations_layout)
+        
+        self.flow_summary_label = QLabel("0 CONVERSATIONS")
+        self.flow_summary_label.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 11px;")
+        conversations_layout.addWidget(self.flow_summary_label)
+        
+        self.conversation_model = ConversationTableModel(self.flow_table, self)
+        self.conversation_table = QTableView()
+        self.conversation_table.setModel(self.conversation_model)
+        self.conversation_table.setStyleSheet(self.packet_table.styleSheet())
+        self.conversation_table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.conversation_table.verticalHeader().setDefaultSectionSize(20)
+        self.conversation_table.setColumnWidth(1, 180)  # Address A
+        self.conversation_table.setColumnWidth(3, 180)  # Address B
+        self.conversation_table.setSortingEnabled(True)
+        self.conversation_table.setSelectionBehavior(QTableView.SelectRows)
+        self.conversation_table.setEditTriggers(QTableView.NoEditTriggers)
+        conversations_layout.addWidget(self.conversation_table)
+        self.tabs.addTab(self.conversations_widget, "CONVERSATIONS")
+        
+        self.conversations_timer = QTimer(self)
+        self.conversations_timer.timeout.connect(self.refresh_conversations)
+        self.conversations_timer.start(CONVERSATIONS_REFRESH_MS)
+        
+        # Statistics Tab: rates, protocol hierarchy and top talkers
+        self.traffic_stats = TrafficStats()
+        self.stats_widget = QWidget()
+        stats_layout = QGridLayout()
+        self.stats_widget.setLayout(stats_layout)
+        
+        self.pps_graph = RateGraph("PACKETS/S", "pps", CYBER_GREEN)
+        self.bps_graph = RateGraph("BITS/S", "bps", CYBER_PURPLE)
+        stats_layout.addWidget(self.pps_graph, 0, 0)
+        stats_layout.addWidget(self.bps_graph, 0, 1)
+        
+        self.hierarchy_tree = QTreeWidget()
+        self.hierarchy_tree.setHeaderLabels(['PROTOCOL', 'PACKETS', '% PACKETS', 'BYTES'])
+        self.hierarchy_tree.setColumnWidth(0, 200)
+        stats_layout.addWidget(self.hierarchy_tree, 1, 0, 2, 1)
+        
+        self.top_endpoints_table = QTableWidget(0, 2)
+        self.top_endpoints_table.setHorizontalHeaderLabels(['TOP ENDPOINTS (60S)', 'BYTES'])
+        self.top_ports_table = QTableWidget(0, 2)
+        self.top_ports_table.setHorizontalHeaderLabels(['TOP PORTS (60S)', 'PACKETS'])
+        for table in (self.top_endpoints_table, self.top_ports_table):
+            table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+            table.verticalHeader().hide()
+            table.setEditTriggers(QTableWidget.NoEditTriggers)
+        stats_layout.addWidget(self.top_endpoints_table, 1, 1)
+        stats_layout.addWidget(self.top_ports_table, 2, 1)
+        
+        stats_style = self.packet_table.styleSheet().replace('QTableView', 'QTreeView, QTableView')
+        for widget in (self.hierarchy_tree, self.top_endpoints_table, self.top_ports_table):
+            widget.setStyleSheet(stats_style)
+        self.tabs.addTab(self.stats_widget, "STATISTICS")
+        
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.refresh_statistics)
+        self.stats_timer.start(STATS_REFRESH_MS)
+        
         self.packet_details_widget = QWidget()
         packet_details_layout = QVBoxLayout()
         self.packet_details_widget.setLayout(packet_details_layout)
         
-        self.details_text = QTextEdit()
-        self.details_text.setStyleSheet(f"""
-            QTextEdit {{
+        # Sections are built when expanded and whole trees are cached per packet,
+        # so stepping through rows only rebuilds what is new and on screen
+        self.detail_cache = DetailCache()
+        self.detail_model = DetailTreeModel(self)
+        self.expanded_sections = {"PACKET INSPECTION"}
+        self.details_tree = QTreeView()
+        self.details_tree.setModel(self.detail_model)
+        self.details_tree.setHeaderHidden(True)
+        self.details_tree.setUniformRowHeights(True)
+        self.details_tree.setStyleSheet(f"""
+            QTreeView {{
                 background-color: {CYBER_DARK};
                 color: {CYBER_BLUE};
                 border: 1px solid {CYBER_BLUE};
@@ -574,28 +1597,34 @@ class CyberTechPacketTracker(QMainWindow):
                 selection-color: {CYBER_DARK};
             }}
         """)
-        self.details_text.setReadOnly(True)
-        packet_details_layout.addWidget(self.details_text)
+        self.details_tree.expanded.connect(self.on_detail_expanded)
+        self.details_tree.collapsed.connect(self.on_detail_collapsed)
+        # Selecting a node highlights the bytes of its layer in the hex view
+        self.details_tree.selectionModel().currentChanged.connect(self.highlight_detail_node)
+        packet_details_layout.addWidget(self.details_tree)
         self.tabs.addTab(self.packet_details_widget, "PACKET INSPECTOR")
         
         self.hex_widget = QWidget()
         hex_layout = QVBoxLayout()
         self.hex_widget.setLayout(hex_layout)
         
-        self.hex_text = QTextEdit()
-        self.hex_text.setStyleSheet(f"""
-            QTextEdit {{
+        self.hex_offset_entry = QLineEdit()
+        self.hex_offset_entry.setPlaceholderText("GO TO OFFSET (HEX)")
+        self.hex_offset_entry.setStyleSheet(f"""
+            QLineEdit {{
                 background-color: {CYBER_DARK};
                 color: {CYBER_BLUE};
                 border: 1px solid {CYBER_BLUE};
                 font-family: 'Courier New';
                 font-size: 11px;
-                selection-background-color: {CYBER_BLUE};
-                selection-color: {CYBER_DARK};
+                padding: 3px;
             }}
         """)
-        self.hex_text.setReadOnly(True)
-        hex_layout.addWidget(self.hex_text)
+        self.hex_offset_entry.returnPressed.connect(self.go_to_hex_offset)
+        hex_layout.addWidget(self.hex_offset_entry)
+        
+        self.hex_view = HexView()
+        hex_layout.addWidget(self.hex_view)
         self.tabs.addTab(self.hex_widget, "HEX ANALYZER")
         
         self.map_widget = QWidget()
@@ -603,11 +1632,48 @@ class CyberTechPacketTracker(QMainWindow):
         self.map_widget.setLayout(map_layout)
         map_layout.setContentsMargins(0, 0, 0, 0)
         
-        self.map_view = QWebEngineView()
-        self.map_view.setHtml(HTML_CONTENT)
-        map_layout.addWidget(self.map_view)
+        # QtWebEngine starts a Chromium process; build the view on first use
+        self.map_layout = map_layout
+        self.map_view = None
+        self.tile_cache = None
+        self.map_ready = False
+        self.map_scripts = []
+        # Set while the map shows every located flow rather than a single trace
+        self.map_all_flows = False
+        self.map_tracker = MapDeltaTracker()
+        self.map_bridge = MapBridge(self)
+        self.map_bridge.resync_requested.connect(self.on_map_resync)
+        self.map_channel_ready = False
+        self.map_timer = QTimer(self)
+        self.map_timer.timeout.connect(self.push_map_delta)
+        self.map_timer.start(MAP_FRAME_MS)
+        self.map_placeholder = QLabel("NETWORK MAP LOADS ON FIRST VIEW")
+        self.map_placeholder.setAlignment(Qt.AlignCenter)
+        self.map_placeholder.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 14px;")
+        map_layout.addWidget(self.map_placeholder)
         self.tabs.addTab(self.map_widget, "NETWORK MAP")
         
+        # Diagnostics Tab: per-stage rates, latencies and queue depths
+        self.diagnostics_widget = QWidget()
+        diagnostics_layout = QVBoxLayout()
+        self.diagnostics_widget.setLayout(diagnostics_layout)
+        self.diagnostics_label = QLabel("NO METRICS EXPORT CONFIGURED")
+        self.diagnostics_label.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 11px;")
+        diagnostics_layout.addWidget(self.diagnostics_label)
+        self.diagnostics_table = QTableWidget(0, 6)
+        self.diagnostics_table.setHorizontalHeaderLabels(['METRIC', 'RATE/S', 'TOTAL', 'P50 MS', 'P90 MS', 'P99 MS'])
+        self.diagnostics_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.diagnostics_table.verticalHeader().hide()
+        self.diagnostics_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.diagnostics_table.setStyleSheet(self.top_endpoints_table.styleSheet())
+        diagnostics_layout.addWidget(self.diagnostics_table)
+        self.tabs.addTab(self.diagnostics_widget, "DIAGNOSTICS")
+        self.diagnostics_snapshot = None
+        self.diagnostics_timer = QTimer(self)
+        self.diagnostics_timer.timeout.connect(self.refresh_diagnostics)
+        self.diagnostics_timer.start(DIAGNOSTICS_REFRESH_MS)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        
         control_widget = QWidget()
         control_layout = QHBoxLayout()
         control_widget.setLayout(control_layout)
@@ -645,6 +1711,23 @@ class CyberTechPacketTracker(QMainWindow):
             self.interface_combo.addItems(interfaces)
         control_layout.addWidget(self.interface_combo)
         
+        engine_label = QLabel("ENGINE:")
+        engine_label.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 11px;")
+        control_layout.addWidget(engine_label)
+        
+        self.engine_combo = QComboBox()
+        self.engine_combo.setStyleSheet(self.interface_combo.styleSheet())
+        for engine, label in CAPTURE_ENGINES.items():
+            self.engine_combo.addItem(label, engine)
+        control_layout.addWidget(self.engine_combo)
+        
+        # What happens to new frames when the GUI falls FRAME_QUEUE_FRAMES behind
+        self.overload_combo = QComboBox()
+        self.overload_combo.setStyleSheet(self.interface_combo.styleSheet())
+        for policy, label in OVERLOAD_POLICIES.items():
+            self.overload_combo.addItem(label, policy)
+        control_layout.addWidget(self.overload_combo)
+        
         filter_label = QLabel("FILTER:")
         filter_label.setStyleSheet(f"color: {CYBER_BLUE}; font-family: 'Courier New'; font-size: 11px;")
         control_layout.addWidget(filter_label)
@@ -667,7 +1750,12 @@ class CyberTechPacketTracker(QMainWindow):
         self.create_cyber_button("START", self.start_sniffing, control_layout)
         self.create_cyber_button("STOP", self.stop_sniffing, control_layout, False)
         self.create_cyber_button("GEO SCAN", self.scan_selected_packet_geo, control_layout)
+        self.create_cyber_button("GEO SCAN ALL", self.scan_all_geo, control_layout)
         self.create_cyber_button("MAP TRACE", self.show_in_map, control_layout)
+        self.create_cyber_button("MAP ALL", self.show_all_flows_in_map, control_layout)
+        self.create_cyber_button("RECORD", self.toggle_recording, control_layout)
+        self.record_button.setCheckable(True)
+        self.create_cyber_button("OPEN FILE", self.open_capture_file, control_layout)
         self.create_cyber_button("CLEAR", self.clear_display, control_layout)
         
         self.status_label = QLabel("SYSTEM READY")
@@ -683,15 +1771,69 @@ class CyberTechPacketTracker(QMainWindow):
         """)
         control_layout.addWidget(self.status_label)
         
+        self.backlog_label = QLabel()
+        control_layout.addWidget(self.backlog_label)
+        self.backlog_level = None
+        
+        self.drops_label = QLabel()
+        self.drops_label.setStyleSheet(f"""
+            color: {CYBER_YELLOW};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_YELLOW};
+        """)
+        control_layout.addWidget(self.drops_label)
+        self.drop_counts = None
+        
+        self.writer_label = QLabel()
+        self.writer_label.setStyleSheet(f"""
+            color: {CYBER_PURPLE};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_PURPLE};
+        """)
+        self.writer_label.hide()
+        control_layout.addWidget(self.writer_label)
+        
         control_layout.addStretch()
         
         main_layout.addWidget(control_widget)
         
         self.sniffer_thread = None
-        self.packet_queue = queue.Queue()
-        self.packets = []
-        
-        self.process_packet_queue()
+        self.file_thread = None
+        self.record_dir = None
+        self.writer = None
+        self.writer_updated = 0.0
+        self.frame_queue = FrameQueue()
+        self.packets = PacketStore()
+        
+        # Running estimates of seconds per packet to store and submit a frame
+        # (add_packets_to_table) and to insert its row (append_ready_rows). A
+        # tick takes as many of each as their sum fits in DRAIN_TIME_BUDGET.
+        self.submit_cost = 0.00001
+        self.insert_cost = 0.00001
+        self.summary_pool = SummaryPool(metrics=self.metrics)
+        self.reassembler = TcpReassembler()
+        self.update_backlog_indicator(0)
+        self.update_drop_indicator()
+        # Gauges are sampled on snapshot, possibly from the exporter's thread
+        self.metrics.gauge('frame_queue_depth', lambda: len(self.frame_queue))
+        self.metrics.gauge('frame_queue_dropped', lambda: self.frame_queue.frames_dropped)
+        self.metrics.gauge('kernel_drops', lambda: self.sniffer_thread.kernel_drops if self.sniffer_thread else 0)
+        self.metrics.gauge('summary_backlog', self.summary_pool.backlog)
+        self.metrics.gauge('packets_stored', lambda: len(self.packets))
+        self.metrics.gauge('geo_pending', self.geo_resolver.pending)
+        self.metrics_exporters = start_metrics_export(self.metrics)
+        if self.metrics_exporters:
+            locations = '  |  '.join(exporter.location for exporter in self.metrics_exporters)
+            self.diagnostics_label.setText(f"EXPORTING TO: {locations}")
+        self.queue_timer = QTimer(self)
+        self.queue_timer.timeout.connect(self.process_packet_queue)
+        self.queue_timer.start(DRAIN_IDLE_INTERVAL_MS)
     
     def load_fonts(self):
         font_db = QFontDatabase()
@@ -789,306 +1931,220 @@ class CyberTechPacketTracker(QMainWindow):
             self.stop_button = button
         elif text == "GEO SCAN":
             self.geo_button = button
+        elif text == "GEO SCAN ALL":
+            self.geo_all_button = button
+        elif text == "RECORD":
+            self.record_button = button
     
     def process_packet_queue(self):
+        tick_started = time.perf_counter()
+        limit = max(1, min(DRAIN_PACKET_BUDGET, int(DRAIN_TIME_BUDGET / (self.submit_cost + self.insert_cost))))
+        batch = self.frame_queue.get(limit)
+        
+        if batch:
+            started = time.perf_counter()
+            self.add_packets_to_table(batch)
+            cost = (time.perf_counter() - started) / len(batch)
+            self.submit_cost = 0.8 * self.submit_cost + 0.2 * max(cost, 1e-7)
+            self.metrics.inc('drain_frames_total', len(batch))
+        started = time.perf_counter()
+        inserted = self.append_ready_rows(limit)
+        if inserted:
+            cost = (time.perf_counter() - started) / inserted
+            self.insert_cost = 0.8 * self.insert_cost + 0.2 * max(cost, 1e-7)
+        if inserted or batch:
+            self.metrics.observe('drain_tick_seconds', time.perf_counter() - tick_started)
+        
+        # Poll fast while a backlog remains, relax back to the idle rate once drained
+        backlog = len(self.frame_queue) + self.summary_pool.backlog()
+        if backlog >= limit:
+            interval = DRAIN_BUSY_INTERVAL_MS
+        elif backlog:
+            interval = DRAIN_IDLE_INTERVAL_MS * backlog // limit + DRAIN_BUSY_INTERVAL_MS
+        else:
+            interval = DRAIN_IDLE_INTERVAL_MS
+        if interval != self.queue_timer.interval():
+            self.queue_timer.setInterval(interval)
+        self.update_backlog_indicator(backlog)
+        self.update_drop_indicator()
+        if self.writer and time.monotonic() - self.writer_updated >= 1.0:
+            self.update_writer_indicator()
+    
+    def update_writer_indicator(self):
+        self.writer_updated = time.monotonic()
+        stats = self.writer.stats()
+        self.writer_label.setText(f"DISK: {stats['bytes_per_sec'] / 1048576:.1f} MB/s  "
+                                  f"Q: {stats['queue_depth']}  DROP: {stats['frames_dropped']}")
+    
+    def toggle_recording(self, checked):
+        if not checked:
+            self.record_dir = None
+            return
+        directory = QFileDialog.getExistingDirectory(self, "RECORD CAPTURE TO DIRECTORY")
+        if not directory:
+            self.record_button.setChecked(False)
+            return
+        self.record_dir = directory
+        logging.info(f"Live captures will be recorded to {directory}")
+    
+    def update_drop_indicator(self):
+        # Kernel drops of the current (or last) live capture, and frames the
+        # frame queue discarded under its overload policy
+        kernel = self.sniffer_thread.kernel_drops if self.sniffer_thread else 0
+        counts = (kernel, self.frame_queue.frames_dropped)
+        if counts != self.drop_counts:
+            self.drop_counts = counts
+            self.drops_label.setText(f"DROPS: KERNEL {counts[0]}  APP {counts[1]}")
+    
+    def update_backlog_indicator(self, backlog):
+        if backlog >= BACKLOG_CRITICAL:
+            level, color = "critical", CYBER_RED
+        elif backlog >= BACKLOG_WARN:
+            level, color = "warn", CYBER_ORANGE
+        else:
+            level, color = "ok", CYBER_GREEN
+        self.backlog_label.setText(f"BACKLOG: {backlog}")
+        if level != self.backlog_level:
+            self.backlog_level = level
+            self.backlog_label.setStyleSheet(f"""
+                color: {color};
+                font-family: 'Courier New';
+                font-size: 11px;
+                font-weight: bold;
+                padding: 5px;
+                border: 1px solid {color};
+                min-width: 120px;
+            """)
+    
+    def add_packets_to_table(self, packets):
+        if not packets:
+            return
+        # Rows are summarized by the worker pool and show up in append_ready_rows
+        started = time.perf_counter()
+        first = len(self.packets)
+        self.packets.extend(packets)
+        self.summary_pool.submit([self.packets.frame(i) for i in range(first, len(self.packets))])
+        self.metrics.observe('table_submit_seconds', time.perf_counter() - started)
+    
+    def append_ready_rows(self, limit=None):
+        rows = self.summary_pool.collect(limit)
+        if rows:
+            started = time.perf_counter()
+            # Rows arrive in capture order, so row i is packet first + i in the store
+            first = self.packet_model.packet_count()
+            rows = self.reassembler.process(rows, lambda i: self.packets.raw(first + i))
+            follow = self.follows_new_rows()
+            self.packet_model.append_rows(rows)
+            self.flow_table.update(rows)
+            self.map_tracker.update(rows)
+            self.traffic_stats.update(rows)
+            self.update_display_filter_status()
+            if follow:
+                self.packet_table.scrollToBottom()
+            self.metrics.observe('table_insert_seconds', time.perf_counter() - started)
+            self.metrics.inc('table_rows_total', len(rows))
+            if self.sniffer_thread and self.sniffer_thread.isRunning():
+                self.metrics.observe('capture_to_table_seconds', max(0.0, time.time() - rows[-1][0]))
+        return len(rows)
+    
+    def follows_new_rows(self):
+        # New rows only pull the table down when it already showed the bottom,
+        # and never while a file loads under the user's selection, sort or filter
+        model = self.packet_model
+        loading = self.file_thread is not None and \
+            (self.file_thread.isRunning() or len(self.frame_queue) or self.summary_pool.backlog())
+        if loading and (self.packet_table.selectionModel().hasSelection() or model.display_filter is not None or
+                        model.sort_column != 0 or model.sort_order != Qt.AscendingOrder):
+            return False
+        scrollbar = self.packet_table.verticalScrollBar()
+        return scrollbar.value() >= scrollbar.maximum()
+    
+    def set_display_filter_style(self, valid):
+        color = CYBER_BLUE if valid else CYBER_RED
+        self.display_filter_entry.setStyleSheet(f"""
+            QLineEdit {{
+                background-color: {CYBER_DARK};
+                color: {color};
+                border: 1px solid {color};
+                font-family: 'Courier New';
+                font-size: 11px;
+                padding: 3px;
+            }}
+        """)
+    
+    def apply_display_filter(self):
+        text = self.display_filter_entry.text().strip()
+        if not text:
+            self.packet_model.set_filter(None)
+            self.set_display_filter_style(True)
+            self.display_filter_status.setText("")
+            return
         try:
-            while True:
-                packet = self.packet_queue.get_nowait()
-                self.packets.append(packet)
-                self.add_packet_to_table(packet)
-        except queue.Empty:
-            pass
-        QApplication.processEvents()
-        QTimer.singleShot(100, self.process_packet_queue)
+            display_filter = compile_filter(text)
+        except FilterSyntaxError as e:
+            self.set_display_filter_style(False)
+            self.display_filter_status.setText(f"INVALID: {e}")
+            logging.warning(f"Invalid display filter '{text}': {e}")
+            return
+        started = time.perf_counter()
+        self.packet_model.set_filter(display_filter)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.set_display_filter_style(True)
+        self.update_display_filter_status(f" ({elapsed:.0f} ms)")
+        logging.info(f"Display filter '{text}' matched {len(self.packet_model.filtered)} packets in {elapsed:.1f} ms")
+    
+    def update_display_filter_status(self, suffix=""):
+        if self.packet_model.filtered is not None:
+            self.display_filter_status.setText(
+                f"{len(self.packet_model.filtered)} OF {self.packet_model.packet_count()} PACKETS{suffix}")
     
     def add_packet_to_table(self, packet):
-        time_str = datetime.fromtimestamp(packet.time).strftime('%H:%M:%S.%f')[:-3]
-        src = dst = "UNKNOWN"
-        
-        if IP in packet:
-            src = packet[IP].src
-            dst = packet[IP].dst
-        elif IPv6 in packet:
-            src = packet[IPv6].src
-            dst = packet[IPv6].dst
-        elif ARP in packet:
-            src = packet[ARP].psrc
-            dst = packet[ARP].pdst
-        
-        protocol = self.get_protocol_name(packet)
-        length = len(packet)
-        info = self.get_packet_info(packet)
-        
-        row = self.packet_table.rowCount()
-        self.packet_table.insertRow(row)
-        
-        time_item = QTableWidgetItem(time_str)
-        src_item = QTableWidgetItem(src)
-        dst_item = QTableWidgetItem(dst)
-        proto_item = QTableWidgetItem(protocol)
-        length_item = QTableWidgetItem(str(length))
-        info_item = QTableWidgetItem(info)
-        
-        self.packet_table.setItem(row, 0, time_item)
-        self.packet_table.setItem(row, 1, src_item)
-        self.packet_table.setItem(row, 2, dst_item)
-        self.packet_table.setItem(row, 3, proto_item)
-        self.packet_table.setItem(row, 4, length_item)
-        self.packet_table.setItem(row, 5, info_item)
-        
-        color = CYBER_BLUE  # Default
-        if protocol == "TCP":
-            color = CYBER_GREEN
-        elif protocol == "UDP":
-            color = CYBER_PURPLE
-        elif protocol == "HTTP":
-            color = CYBER_YELLOW
-        elif protocol == "HTTPS":
-            color = CYBER_ORANGE
-        elif protocol == "DNS":
-            color = CYBER_RED
-        
-        for col in range(6):
-            self.packet_table.item(row, col).setForeground(QColor(color))
-        
-        self.packet_table.scrollToBottom()
-    
-    def get_protocol_name(self, packet):
-        if TCP in packet:
-            if packet[TCP].dport == 80 or packet[TCP].sport == 80:
-                return "HTTP"
-            if packet[TCP].dport == 443 or packet[TCP].sport == 443:
-                return "HTTPS"
-            if packet[TCP].dport == 53 or packet[TCP].sport == 53:
-                return "DNS"
-            return "TCP"
-        elif UDP in packet:
-            if packet[UDP].dport == 53 or packet[UDP].sport == 53:
-                return "DNS"
-            return "UDP"
-        elif ICMP in packet:
-            return "ICMP"
-        elif ARP in packet:
-            return "ARP"
-        elif IPv6 in packet:
-            return "IPv6"
-        return "OTHER"
-    
-    def get_packet_info(self, packet):
-        info = ""
-        if TCP in packet:
-            tcp = packet[TCP]
-            info = f"TCP {tcp.sport} → {tcp.dport} [Flags: {self.get_tcp_flags(tcp)}]"
-            if tcp.dport == 80 or tcp.sport == 80:
-                if Raw in packet:
-                    try:
-                        load = packet[Raw].load.decode('ascii', errors='ignore')
-                        if 'HTTP' in load:
-                            first_line = load.split('\r\n')[0]
-                            info = f"HTTP: {first_line}"
-                    except:
-                        pass
-        elif UDP in packet:
-            udp = packet[UDP]
-            info = f"UDP {udp.sport} → {udp.dport}"
-            if (udp.dport == 53 or udp.sport == 53) and DNS in packet:
-                dns = packet[DNS]
-                if dns.qr == 0:
-                    if dns.qd:
-                        info = f"DNS Query: {dns.qd.qname.decode('utf-8')}"
-                else:
-                    if dns.an:
-                        info = f"DNS Response: {dns.an[0].rdata if dns.an else 'N/A'}"
-        elif ICMP in packet:
-            icmp = packet[ICMP]
-            info = f"ICMP Type: {icmp.type}, Code: {icmp.code}"
-        elif ARP in packet:
-            arp = packet[ARP]
-            if arp.op == 1:
-                info = f"ARP Who has {arp.pdst}? Tell {arp.psrc}"
-            elif arp.op == 2:
-                info = f"ARP {arp.psrc} is at {arp.hwsrc}"
-        return info
-    
-    def get_tcp_flags(self, tcp):
-        flags = []
-        if tcp.flags & 0x01:
-            flags.append("FIN")
-        if tcp.flags & 0x02:
-            flags.append("SYN")
-        if tcp.flags & 0x04:
-            flags.append("RST")
-        if tcp.flags & 0x08:
-            flags.append("PSH")
-        if tcp.flags & 0x10:
-            flags.append("ACK")
-        if tcp.flags & 0x20:
-            flags.append("URG")
-        return '/'.join(flags) if flags else "NONE"
+        self.add_packets_to_table([packet])
     
     def show_packet_details(self):
         selected_rows = self.packet_table.selectionModel().selectedRows()
         if not selected_rows:
             return
         
-        index = selected_rows[0].row()
+        index = self.packet_model.packet_index(selected_rows[0].row())
         if index < len(self.packets):
-            packet = self.packets[index]
-            
-            self.details_text.setText(self.get_packet_details(packet))
-            hexdump = self.hex_dump(bytes(packet))
-            self.hex_text.setText(hexdump)
-    
-    def get_packet_details(self, packet):
-        details = [
-            "=== PACKET INSPECTION ===",
-            f"TIMESTAMP: {datetime.fromtimestamp(packet.time).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}",
-            f"LENGTH: {len(packet)} bytes",
-            f"SUMMARY: {self.get_packet_info(packet)}"
-        ]
-        
-        if packet.haslayer('Ether'):
-            eth = packet['Ether']
-            details.append("\n=== ETHERNET FRAME ===")
-            details.append(f"SOURCE MAC: {eth.src}")
-            details.append(f"DESTINATION MAC: {eth.dst}")
-            details.append(f"TYPE: 0x{eth.type:04x}")
-        
-        if IP in packet:
-            ip = packet[IP]
-            details.append("\n=== IP DATAGRAM ===")
-            details.append(f"VERSION: {ip.version}")
-            details.append(f"HEADER LENGTH: {ip.ihl * 4} bytes")
-            details.append(f"TOS: 0x{ip.tos:02x}")
-            details.append(f"TOTAL LENGTH: {len(ip)} bytes")
-            details.append(f"ID: {ip.id}")
-            details.append(f"FLAGS: {ip.flags}")
-            details.append(f"FRAGMENT OFFSET: {ip.frag}")
-            details.append(f"TTL: {ip.ttl}")
-            details.append(f"PROTOCOL: {ip.proto} ({self.get_proto_name(ip.proto)})")
-            details.append(f"CHECKSUM: 0x{ip.chksum:04x}")
-            details.append(f"SOURCE IP: {ip.src}")
-            details.append(f"DESTINATION IP: {ip.dst}")
-        elif IPv6 in packet:
-            ipv6 = packet[IPv6]
-            details.append("\n=== IPv6 DATAGRAM ===")
-            details.append(f"VERSION: {ipv6.version}")
-            details.append(f"TRAFFIC CLASS: 0x{ipv6.tc:02x}")
-            details.append(f"FLOW LABEL: 0x{ipv6.fl:05x}")
-            details.append(f"PAYLOAD LENGTH: {ipv6.plen}")
-            details.append(f"NEXT HEADER: {ipv6.nh}")
-            details.append(f"HOP LIMIT: {ipv6.hlim}")
-            details.append(f"SOURCE IP: {ipv6.src}")
-            details.append(f"DESTINATION IP: {ipv6.dst}")
-        
-        if TCP in packet:
-            tcp = packet[TCP]
-            details.append("\n=== TCP SEGMENT ===")
-            details.append(f"SOURCE PORT: {tcp.sport}")
-            details.append(f"DESTINATION PORT: {tcp.dport}")
-            details.append(f"SEQUENCE NUMBER: {tcp.seq}")
-            details.append(f"ACK NUMBER: {tcp.ack}")
-            details.append(f"DATA OFFSET: {tcp.dataofs * 4} bytes")
-            details.append(f"FLAGS: {self.get_tcp_flags(tcp)}")
-            details.append(f"WINDOW SIZE: {tcp.window}")
-            details.append(f"CHECKSUM: 0x{tcp.chksum:04x}")
-            details.append(f"URGENT POINTER: {tcp.urgptr}")
-            
-            if (tcp.dport == 80 or tcp.sport == 80) and Raw in packet:
-                try:
-                    load = packet[Raw].load.decode('ascii')
-                    if 'HTTP' in load:
-                        details.append("\n=== HTTP CONTENT ===")
-                        details.append(load[:500])
-                except UnicodeDecodeError:
-                    pass
-        elif UDP in packet:
-            udp = packet[UDP]
-            details.append("\n=== UDP DATAGRAM ===")
-            details.append(f"SOURCE PORT: {udp.sport}")
-            details.append(f"DESTINATION PORT: {udp.dport}")
-            details.append(f"LENGTH: {udp.len}")
-            details.append(f"CHECKSUM: 0x{udp.chksum:04x}")
-            
-            if (udp.dport == 53 or udp.sport == 53) and DNS in packet:
-                dns = packet[DNS]
-                details.append("\n=== DNS MESSAGE ===")
-                details.append(f"TRANSACTION ID: 0x{dns.id:04x}")
-                details.append(f"FLAGS: 0x{dns.flags:04x}")
-                details.append(f"QUESTIONS: {len(dns.qd) if dns.qd else 0}")
-                details.append(f"ANSWER RRs: {len(dns.an) if hasattr(dns, 'an') else 0}")
-                details.append(f"AUTHORITY RRs: {len(dns.ns) if dns.ns else 0}")
-                details.append(f"ADDITIONAL RRs: {len(dns.ar) if hasattr(dns, 'ar') else 0}")
-                
-                if dns.qr == 0:
-                    if dns.qd:
-                        details.append(f"\nQUESTION:")
-                        if hasattr(dns.qd, 'qname'):
-                            details.append(f"  NAME: {dns.qd.qname.decode('ascii')}")
-                        details.append(f"  TYPE: {dns.qd.qtype}")
-                        details.append(f"  CLASS: {dns.qd.qclass}")
-                else:
-                    for i in range(len(dns.an)):
-                        rr = dns.an[i]
-                        details.append(f"\nANSWER {i+1}:")
-                        details.append(f"  NAME: {rr.rrname.decode('ascii') if hasattr(rr, 'rrname') else ''}")
-                        details.append(f"  TYPE: {rr.type if hasattr(rr, 'type') else ''}")
-                        details.append(f"  CLASS: {rr.rclass if hasattr(rr, 'rclass') else ''}")
-                        details.append(f"  TTL: {rr.ttl if hasattr(rr, 'ttl') else ''}")
-                        details.append(f"  DATA: {rr.rdata if hasattr(rr, 'rdata') else ''}")
-        
-        elif ICMP in packet:
-            icmp = packet[ICMP]
-            details.append("\n=== ICMP MESSAGE ===")
-            details.append(f"TYPE: {icmp.type}")
-            details.append(f"CODE: {icmp.code}")
-            details.append(f"CHECKSUM: 0x{icmp.chksum:04x}")
-        
-        elif ARP in packet:
-            arp = packet[ARP]
-            details.append("\n=== ARP MESSAGE ===")
-            details.append(f"HARDWARE TYPE: {arp.hwtype}")
-            details.append(f"PROTOCOL TYPE: 0x{arp.ptype:04x}")
-            details.append(f"HARDWARE SIZE: {arp.hwlen}")
-            details.append(f"PROTOCOL SIZE: {arp.plen}")
-            details.append(f"OPERATION: {self.get_arp_operation(arp.op)}")
-            details.append(f"SENDER MAC: {arp.hwsrc}")
-            details.append(f"SENDER IP: {arp.psrc}")
-            details.append(f"TARGET MAC: {arp.hwdst}")
-            details.append(f"TARGET IP: {arp.pdst}")
-        
-        return '\n'.join(details)
-    
-    def get_proto_name(self, proto_num):
-        proto_names = {
-            1: "ICMP",
-            6: "TCP",
-            17: "UDP",
-            2: "IGMP",
-            58: "ICMPv6",
-            89: "OSPF"
-        }
-        return proto_names.get(proto_num, str(proto_num))
-    
-    def get_arp_operation(self, op):
-        ops = {
-            1: "ARP REQUEST",
-            2: "ARP REPLY",
-            3: "RARP REQUEST",
-            4: "RARP REPLY"
-        }
-        return ops.get(op, str(op))
+            self.hex_view.set_data(self.packets.raw(index))
+            self.show_detail_tree(self.detail_cache.get(index, lambda: self.packets[index]))
+    
+    def show_detail_tree(self, root):
+        self.detail_model.set_root(root)
+        # Keep the same sections open from packet to packet; only those get built
+        for row, node in enumerate(root.children):
+            if node.text in self.expanded_sections:
+                self.details_tree.expand(self.detail_model.index(row, 0))
+    
+    def on_detail_expanded(self, index):
+        node = self.detail_model.node(index)
+        if node.parent is self.detail_model.root:
+            self.expanded_sections.add(node.text)
+    
+    def on_detail_collapsed(self, index):
+        node = self.detail_model.node(index)
+        if node.parent is self.detail_model.root:
+            self.expanded_sections.discard(node.text)
+    
+    def highlight_detail_node(self, current, previous):
+        byte_range = self.detail_model.node(current).byte_range if current.isValid() else None
+        self.hex_view.set_highlight(*(byte_range or (0, 0)))
     
-    def hex_dump(self, data):
-        hex_dump = []
-        for i in range(0, len(data), 16):
-            chunk = data[i:i+16]
-            hex_str = ' '.join(f"{b:02x}" for b in chunk)
-            ascii_str = ''.join(chr(b) if 32 <= b <= 126 else '.' for b in chunk)
-            hex_dump.append(f"{i:08x}:  {hex_str.ljust(47)}  {ascii_str}")
-        return '\n'.join(hex_dump)
+    def go_to_hex_offset(self):
+        try:
+            offset = int(self.hex_offset_entry.text().strip(), 16)
+        except ValueError:
+            return
+        if 0 <= offset < len(self.hex_view.data):
+            self.hex_view.set_highlight(offset, offset + 1)
     
     def start_sniffing(self):
+        if self.file_thread and self.file_thread.isRunning():
+            QMessageBox.warning(self, "WARNING", "CAPTURE FILE IS STILL LOADING")
+            return
+        
         filter_text = self.filter_entry.text()
         if not filter_text:
             QMessageBox.critical(self, "ERROR", "PLEASE ENTER A VALID FILTER EXPRESSION")
@@ -1115,14 +2171,33 @@ class CyberTechPacketTracker(QMainWindow):
         """)
         
         interface = self.interface_combo.currentText()
-        self.sniffer_thread = SnifferThread(filter_text, interface)
-        self.sniffer_thread.packet_received.connect(self.packet_queue.put)
+        if self.record_dir:
+            self.writer = PcapngWriter(self.record_dir)
+            self.writer.start()
+            self.writer_label.show()
+            self.update_writer_indicator()
+        self.frame_queue.policy = self.overload_combo.currentData()
+        self.frame_queue.frames_dropped = 0
+        self.sniffer_thread = SnifferThread(filter_text, interface, self.frame_queue, self.engine_combo.currentData(),
+                                            self.writer, self.metrics)
         self.sniffer_thread.start()
     
     def stop_sniffing(self):
         if self.sniffer_thread:
             self.sniffer_thread.stop()
             self.sniffer_thread.wait()
+            logging.info(f"Capture stopped: {self.sniffer_thread.kernel_drops} kernel drops, "
+                         f"{self.frame_queue.frames_dropped} frames dropped by the "
+                         f"{self.frame_queue.policy} policy")
+            self.update_drop_indicator()
+        if self.writer:
+            self.writer.close()
+            stats = self.writer.stats()
+            logging.info(f"Recorded {stats['frames_written']} frames ({stats['bytes_written']} bytes), "
+                         f"{stats['frames_dropped']} dropped")
+            self.writer = None
+            self.writer_label.hide()
+        self.stop_file_loading()
         self.start_button.setEnabled(True)
         self.stop_button.setEnabled(False)
         self.status_label.setText("SYSTEM READY")
@@ -1137,71 +2212,115 @@ class CyberTechPacketTracker(QMainWindow):
             text-align: center;
         """)
     
+    def open_capture_file(self):
+        if self.sniffer_thread and self.sniffer_thread.isRunning():
+            QMessageBox.warning(self, "WARNING", "STOP THE LIVE CAPTURE BEFORE OPENING A FILE")
+            return
+        
+        path, _ = QFileDialog.getOpenFileName(self, "OPEN CAPTURE FILE", "",
+                                              "Capture files (*.pcap *.pcapng *.cap);;All files (*)")
+        if not path:
+            return
+        
+        self.clear_display()
+        try:
+            source_id = self.packets.add_file(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "ERROR", f"CANNOT OPEN CAPTURE FILE: {e}")
+            return
+        
+        logging.info(f"Loading capture file {path}")
+        self.file_thread = CaptureFileThread(path, source_id, self.frame_queue,
+                                             lambda: len(self.frame_queue) + self.summary_pool.backlog())
+        self.file_thread.progress.connect(self.on_file_progress)
+        self.file_thread.failed.connect(self.on_file_failed)
+        self.file_thread.finished.connect(self.on_file_loaded)
+        self.file_progress = -1
+        self.stop_button.setEnabled(True)
+        self.status_label.setText("LOADING 0%")
+        self.status_label.setStyleSheet(f"""
+            color: {CYBER_ORANGE};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_ORANGE};
+            min-width: 150px;
+            text-align: center;
+        """)
+        self.file_thread.start()
+    
+    def on_file_progress(self, position, size):
+        percent = position * 100 // size if size else 100
+        if percent != self.file_progress:
+            self.file_progress = percent
+            self.status_label.setText(f"LOADING {percent}%")
+    
+    def on_file_failed(self, error):
+        QMessageBox.critical(self, "ERROR", f"CAPTURE FILE ERROR: {error}")
+    
+    def on_file_loaded(self):
+        thread = self.sender()
+        if thread is not self.file_thread:
+            return
+        self.stop_button.setEnabled(False)
+        self.status_label.setText(f"FILE LOADED: {thread.frames_read} PACKETS")
+        self.status_label.setStyleSheet(f"""
+            color: {CYBER_BLUE};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_BLUE};
+            min-width: 150px;
+            text-align: center;
+        """)
+    
+    def stop_file_loading(self):
+        if self.file_thread:
+            self.file_thread.stop()
+            self.file_thread.wait()
+            self.file_thread = None
+    
     def clear_display(self):
-        self.packet_table.setRowCount(0)
-        self.details_text.clear()
-        self.hex_text.clear()
+        self.stop_file_loading()
+        # Frames still queued belong to the capture being cleared
+        self.frame_queue.clear()
+        self.summary_pool.reset()
+        self.packet_model.clear()
+        self.flow_table.clear()
+        self.map_tracker.clear()
+        self.reassembler.clear()
+        self.traffic_stats.clear()
+        self.conversation_model.beginResetModel()
+        self.conversation_model.reset_view()
+        self.conversation_model.endResetModel()
+        self.refresh_conversations()
+        self.refresh_statistics()
+        self.detail_cache.clear()
+        self.detail_model.set_root(DetailNode(""))
+        self.hex_view.clear()
         self.packets.clear()
-        self.map_view.setHtml(HTML_CONTENT)
+        if self.map_view is not None:
+            self.map_ready = False
+            self.map_scripts = []
+            self.map_channel_ready = False
+            self.map_view.load(QUrl(MAP_PAGE_URL))
+        self.map_trace = None
+        self.map_all_flows = False
+        if self.bulk_geo:
+            self.finish_bulk_geo()
         self.status_label.setText("SYSTEM READY")
     
-    def is_private_ip(self, ip):
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            return ip_obj.is_private
-        except ValueError:
-            return True
-    
-    def get_geolocation(self, ip):
-        if not ip or self.is_private_ip(ip):
-            logging.info(f"Skipping geolocation for IP {ip}: Private or invalid IP")
-            return {'ip': ip, 'error': 'Private or invalid IP'}
-        
-        logging.info(f"Requesting geolocation for {ip}")
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = requests.get(f"https://ipinfo.io/{ip}/json", timeout=5)
-                response.raise_for_status()
-                data = response.json()
-                
-                loc = data.get('loc', '')
-                latitude = longitude = 'N/A'
-                if loc:
-                    latitude, longitude = loc.split(',')
-                
-                geo_data = {
-                    'ip': data.get('ip', 'Unknown'),
-                    'city': data.get('city', 'Unknown'),
-                    'region': data.get('region', 'Unknown'),
-                    'country': data.get('country', 'Unknown'),
-                    'latitude': latitude,
-                    'longitude': longitude,
-                    'org': data.get('org', 'Unknown'),
-                    'postal': data.get('postal', ''),
-                    'timezone': data.get('timezone', '')
-                }
-                logging.info(f"Successfully fetched geolocation for {ip}")
-                return geo_data
-            except HTTPError as e:
-                if response.status_code == 429:
-                    if attempt < max_retries - 1:
-                        wait_time = (2 ** attempt) * 5
-                        logging.warning(f"Rate limit hit for {ip}, retry after {wait_time}s")
-                        time.sleep(wait_time)
-                        continue
-                    else:
-                        logging.error(f"Max retries for {ip}: Too Many Requests")
-                        QMessageBox.critical(self, "API ERROR", f"GEOLOCATION FAILED FOR {ip}: RATE LIMIT EXCEEDED")
-                        return {'ip': ip, 'error': 'Too Many Requests'}
-                else:
-                    logging.error(f"HTTP error for {ip}: {e}")
-                    QMessageBox.critical(self, "API ERROR", f"GEOLOCATION FAILED FOR {ip}: {e}")
-                    return {'ip': ip, 'error': str(e)}
-            except requests.RequestException as e:
-                logging.error(f"Error fetching geolocation for {ip}: {e}")
-                QMessageBox.critical(self, "API ERROR", f"GEOLOCATION FAILED FOR {ip}: {e}")
-                return {'ip': ip, 'error': str(e)}
+    def closeEvent(self, event):
+        self.stop_sniffing()
+        self.summary_pool.shutdown()
+        self.geo_resolver.shutdown()
+        if self.tile_cache is not None:
+            self.tile_cache.shutdown()
+        for exporter in self.metrics_exporters:
+            exporter.close()
+        super().closeEvent(event)
     
     def format_geo_string(self, geo_data):
         if not geo_data or 'error' in geo_data:
@@ -1251,6 +2370,115 @@ class CyberTechPacketTracker(QMainWindow):
         
         return valid_locations
     
+    def request_geolocation(self, ip):
+        # Results come back on a geo worker thread; the signal hops them onto the GUI thread
+        future = self.geo_resolver.lookup(ip)
+        future.add_done_callback(lambda f, ip=ip: self.geo_ready.emit(ip, self.geo_result(ip, f)))
+    
+    def geo_result(self, ip, future):
+        try:
+            return future.result()
+        except Exception as e:
+            logging.error(f"Geolocation lookup for {ip} failed: {e}")
+            return {'ip': ip, 'error': str(e)}
+    
+    def on_geo_ready(self, ip, geo_data):
+        if self.has_location(geo_data):
+            self.geo_locations[ip] = (float(geo_data['latitude']), float(geo_data['longitude']),
+                                      f"{ip} {geo_data.get('city', '')}, {geo_data.get('country', '')}")
+            self.map_tracker.located(ip)
+        if self.bulk_geo and ip in self.bulk_geo['pending']:
+            self.update_bulk_geo(ip, geo_data)
+        
+        delivered = False
+        for request in (self.geo_scan, self.map_trace):
+            if request and ip in request['pending']:
+                request['pending'].discard(ip)
+                request['results'][ip] = geo_data
+                delivered = True
+        if not delivered:
+            return
+        
+        error = geo_data.get('error')
+        if error == RATE_LIMIT_ERROR:
+            QMessageBox.critical(self, "API ERROR", f"GEOLOCATION FAILED FOR {ip}: RATE LIMIT EXCEEDED")
+        elif error and error != PRIVATE_IP_ERROR:
+            QMessageBox.critical(self, "API ERROR", f"GEOLOCATION FAILED FOR {ip}: {error}")
+        
+        if self.geo_scan and ip in self.geo_scan['results']:
+            self.update_geo_scan()
+        if self.map_trace and ip in self.map_trace['results']:
+            self.update_map_trace()
+    
+    def scan_all_geo(self):
+        if self.bulk_geo:
+            QMessageBox.warning(self, "WARNING", "GEOLOCATION SCAN ALREADY IN PROGRESS")
+            return
+        
+        # The table model already interns every address it has shown, so deduplication is free
+        ips = [ip for ip in self.packet_model.strings if not is_private_ip(ip)]
+        if not ips:
+            QMessageBox.warning(self, "WARNING", "NO PUBLIC IP ADDRESSES IN CAPTURE")
+            return
+        
+        logging.info(f"Bulk geolocation of {len(ips)} unique public IPs")
+        self.bulk_geo = {'total': len(ips), 'pending': set(ips), 'located': 0, 'failed': 0}
+        self.geo_all_button.setEnabled(False)
+        self.status_label.setStyleSheet(f"""
+            color: {CYBER_ORANGE};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_ORANGE};
+            min-width: 150px;
+            text-align: center;
+        """)
+        self.status_label.setText(f"GEO SCAN ALL: 0/{len(ips)}")
+        for ip in ips:
+            self.request_geolocation(ip)
+    
+    def update_bulk_geo(self, ip, geo_data):
+        bulk = self.bulk_geo
+        bulk['pending'].discard(ip)
+        if self.has_location(geo_data):
+            bulk['located'] += 1
+        else:
+            bulk['failed'] += 1
+        done = bulk['total'] - len(bulk['pending'])
+        self.status_label.setText(f"GEO SCAN ALL: {done}/{bulk['total']}")
+        if not bulk['pending']:
+            logging.info(f"Bulk geolocation finished: {bulk['located']} located, {bulk['failed']} failed")
+            self.finish_bulk_geo()
+            self.status_label.setText(f"GEO: {bulk['located']}/{bulk['total']} LOCATED")
+    
+    def finish_bulk_geo(self):
+        self.bulk_geo = None
+        self.geo_all_button.setEnabled(True)
+        self.status_label.setStyleSheet(f"""
+            color: {CYBER_BLUE};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_BLUE};
+            min-width: 150px;
+            text-align: center;
+        """)
+    
+    def start_geo_request(self, packet):
+        src, dst = get_endpoints(packet)
+        return {
+            'src': src,
+            'dst': dst,
+            'protocol': get_protocol_name(packet),
+            'pending': {src, dst},
+            'results': {}
+        }
+    
+    def has_location(self, geo_data):
+        return bool(geo_data) and 'error' not in geo_data and geo_data.get('latitude') not in ['N/A', None]
+    
     def show_in_map(self):
         selected_rows = self.packet_table.selectionModel().selectedRows()
         if not selected_rows:
@@ -1258,34 +2486,192 @@ class CyberTechPacketTracker(QMainWindow):
             logging.warning("No packet selected for map display")
             return
         
-        index = selected_rows[0].row()
+        index = self.packet_model.packet_index(selected_rows[0].row())
         if index < len(self.packets):
             packet = self.packets[index]
-            src = dst = "UNKNOWN"
-            protocol = self.get_protocol_name(packet)
-            
-            if IP in packet:
-                src = packet[IP].src
-                dst = packet[IP].dst
-            elif IPv6 in packet:
-                src = packet[IPv6].src
-                dst = packet[IPv6].dst
-            elif ARP in packet:
-                src = packet[ARP].psrc
-                dst = packet[ARP].pdst
+            self.map_trace = self.start_geo_request(packet)
+            self.map_trace['shown'] = False
             
-            logging.info(f"Fetching geolocation for src={src}, dst={dst}")
-            src_geo = self.get_geolocation(src)
-            dst_geo = self.get_geolocation(dst)
-            
-            markers = self.generate_map_markers(src_geo, dst_geo, src, dst, protocol)
-            if markers:
-                js_code = f"window.addNetworkPath({json.dumps(markers)});"
-                self.map_view.page().runJavaScript(js_code)
+            logging.info(f"Fetching geolocation for src={self.map_trace['src']}, dst={self.map_trace['dst']}")
+            for ip in list(self.map_trace['pending']):
+                self.request_geolocation(ip)
+    
+    def on_tab_changed(self, index):
+        if self.tabs.widget(index) is self.map_widget:
+            self.ensure_map_view()
+        elif self.tabs.widget(index) is self.conversations_widget:
+            self.refresh_conversations()
+        elif self.tabs.widget(index) is self.stats_widget:
+            self.refresh_statistics()
+        elif self.tabs.widget(index) is self.diagnostics_widget:
+            self.refresh_diagnostics()
+    
+    def refresh_statistics(self):
+        if self.tabs.currentWidget() is not self.stats_widget:
+            return
+        snapshot = self.traffic_stats.snapshot()
+        self.pps_graph.set_values(snapshot['pps'])
+        self.bps_graph.set_values(snapshot['bps'])
+        
+        total = snapshot['total_packets'] or 1
+        self.hierarchy_tree.clear()
+        items = {}
+        for path, packets, volume in snapshot['hierarchy']:
+            item = QTreeWidgetItem([path[-1], str(packets), f"{packets * 100 / total:.1f}", str(volume)])
+            parent = items.get(path[:-1])
+            if parent is None:
+                self.hierarchy_tree.addTopLevelItem(item)
+            else:
+                parent.addChild(item)
+            items[path] = item
+        self.hierarchy_tree.expandAll()
+        
+        self.fill_top_table(self.top_endpoints_table, snapshot['top_endpoints'])
+        self.fill_top_table(self.top_ports_table,
+                            [(f"{transport} {port}", packets) for (transport, port), packets in snapshot['top_ports']])
+    
+    def refresh_diagnostics(self):
+        # Snapshots are taken every tick so rates always cover one interval,
+        # but the table is only filled while the tab is visible
+        snapshot = self.metrics.snapshot()
+        previous, self.diagnostics_snapshot = self.diagnostics_snapshot, snapshot
+        if previous is None or self.tabs.currentWidget() is not self.diagnostics_widget:
+            return
+        elapsed = max(snapshot['time'] - previous['time'], 1e-3)
+        
+        rows = []
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            before = previous['histograms'].get(name, {'count': 0, 'counts': [0] * len(histogram['counts'])})
+            window = [now - then for now, then in zip(histogram['counts'], before['counts'])]
+            percentiles = [quantile(window, q) for q in (0.5, 0.9, 0.99)]
+            rows.append([name, f"{(histogram['count'] - before['count']) / elapsed:.1f}", str(histogram['count'])] +
+                        ["-" if value is None else f"{value * 1000:.2f}" for value in percentiles])
+        for name, value in sorted(snapshot['counters'].items()):
+            rate = (value - previous['counters'].get(name, 0)) / elapsed
+            rows.append([name, f"{rate:.1f}", str(value), "", "", ""])
+        for name, value in sorted(snapshot['gauges'].items()):
+            rows.append([name, "", str(value), "", "", ""])
+        
+        table = self.diagnostics_table
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, QTableWidgetItem(value.upper() if column == 0 else value))
+    
+    def fill_top_table(self, table, entries):
+        table.setRowCount(len(entries))
+        for row, (name, value) in enumerate(entries):
+            table.setItem(row, 0, QTableWidgetItem(str(name)))
+            table.setItem(row, 1, QTableWidgetItem(str(value)))
+    
+    def refresh_conversations(self):
+        # Flows are counted for every packet, but the view is only synced while visible
+        if self.tabs.currentWidget() is not self.conversations_widget:
+            return
+        self.conversation_model.refresh()
+        flow_table = self.flow_table
+        self.flow_summary_label.setText(f"{len(flow_table)} CONVERSATIONS  |  {len(flow_table.active)} ACTIVE  |  "
+                                        f"{flow_table.evicted} IDLE")
+    
+    def ensure_map_view(self):
+        if self.map_view is None:
+            from PyQt5.QtWebEngineWidgets import QWebEngineView
+            started = time.perf_counter()
+            from PyQt5.QtWebChannel import QWebChannel
+            from map_scheme import MAP_SCHEME, MapSchemeHandler
+            self.map_view = QWebEngineView()
+            self.map_channel = QWebChannel(self.map_view.page())
+            self.map_channel.registerObject('bridge', self.map_bridge)
+            self.map_view.page().setWebChannel(self.map_channel)
+            # Page, Leaflet and tiles are all served locally through the custom scheme
+            self.tile_cache = create_tile_cache()
+            self.map_scheme_handler = MapSchemeHandler(HTML_CONTENT, self.tile_cache, self)
+            self.map_view.page().profile().installUrlSchemeHandler(MAP_SCHEME, self.map_scheme_handler)
+            self.map_view.loadFinished.connect(self.on_map_loaded)
+            self.map_view.load(QUrl(MAP_PAGE_URL))
+            if prefetch_on_open():
+                self.tile_cache.prefetch()
+            self.map_layout.removeWidget(self.map_placeholder)
+            self.map_placeholder.deleteLater()
+            self.map_layout.addWidget(self.map_view)
+            logging.info(f"Network map view created in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return self.map_view
+    
+    def on_map_loaded(self, ok):
+        self.map_ready = True
+        scripts, self.map_scripts = self.map_scripts, []
+        for js_code in scripts:
+            self.map_view.page().runJavaScript(js_code)
+    
+    def run_map_script(self, js_code):
+        # Scripts sent before Leaflet has loaded would hit an empty page
+        self.ensure_map_view()
+        if self.map_ready:
+            self.map_view.page().runJavaScript(js_code)
+        else:
+            self.map_scripts.append(js_code)
+    
+    def report_startup(self):
+        elapsed = (time.perf_counter() - STARTUP_STARTED) * 1000
+        logging.info(f"Startup: window interactive after {elapsed:.0f} ms")
+        if '--measure-startup' in sys.argv:
+            QApplication.instance().quit()
+    
+    def show_all_flows_in_map(self):
+        if not self.geo_locations:
+            QMessageBox.warning(self, "WARNING", "NO GEOLOCATED ENDPOINTS: RUN GEO SCAN ALL FIRST")
+            return
+        # The next frame sends a full snapshot; later frames only carry what changed
+        self.map_all_flows = True
+        self.map_trace = None
+        self.map_tracker.reset_sent()
+        self.ensure_map_view()
+        self.tabs.setCurrentWidget(self.map_widget)
+        self.push_map_delta()
+    
+    def on_map_resync(self):
+        self.map_channel_ready = True
+        self.map_tracker.reset_sent()
+        self.push_map_delta()
+    
+    def push_map_delta(self):
+        # Changes pile up in the tracker between frames and while the tab is hidden
+        if not (self.map_all_flows and self.map_channel_ready and self.tabs.currentWidget() is self.map_widget):
+            return
+        started = time.perf_counter()
+        delta = self.map_tracker.delta(self.geo_locations)
+        if delta is not None:
+            self.map_bridge.delta.emit(json.dumps(delta))
+            self.metrics.observe('map_delta_seconds', time.perf_counter() - started)
+            self.metrics.inc('map_frames_total')
+            self.metrics.inc('map_endpoints_sent_total', len(delta['endpoints']))
+            self.metrics.inc('map_links_sent_total', len(delta['links']))
+    
+    def update_map_trace(self):
+        request = self.map_trace
+        src_geo = request['results'].get(request['src'], {})
+        dst_geo = request['results'].get(request['dst'], {})
+        done = not request['pending']
+        
+        # Draw whichever endpoint resolved first; the path appears once both are in
+        markers = None
+        if done or self.has_location(src_geo) or self.has_location(dst_geo):
+            markers = self.generate_map_markers(src_geo, dst_geo, request['src'], request['dst'], request['protocol'])
+        
+        if markers:
+            self.map_all_flows = False
+            js_code = f"window.addNetworkPath({json.dumps(markers)});"
+            self.run_map_script(js_code)
+            if not request['shown']:
+                request['shown'] = True
                 self.tabs.setCurrentWidget(self.map_widget)
+            if done:
                 logging.info("Network path displayed on map")
-            else:
-                QMessageBox.warning(self, "WARNING", "NO VALID GEOLOCATION DATA AVAILABLE FOR SELECTED PACKET")
+        elif done:
+            QMessageBox.warning(self, "WARNING", "NO VALID GEOLOCATION DATA AVAILABLE FOR SELECTED PACKET")
+        
+        if done:
+            self.map_trace = None
     
     def scan_selected_packet_geo(self):
         if self.geo_scan_in_progress:
@@ -1299,6 +2685,10 @@ class CyberTechPacketTracker(QMainWindow):
             logging.warning("No packet selected for geolocation scan")
             return
         
+        index = self.packet_model.packet_index(selected_rows[0].row())
+        if index >= len(self.packets):
+            return
+        
         self.geo_scan_in_progress = True
         self.geo_button.setEnabled(False)
         self.status_label.setText("GEO SCAN IN PROGRESS...")
@@ -1313,59 +2703,67 @@ class CyberTechPacketTracker(QMainWindow):
             text-align: center;
         """)
         
-        try:
-            index = selected_rows[0].row()
-            if index < len(self.packets):
-                packet = self.packets[index]
-                src = dst = "UNKNOWN"
-                protocol = self.get_protocol_name(packet)
-                
-                if IP in packet:
-                    src = packet[IP].src
-                    dst = packet[IP].dst
-                elif IPv6 in packet:
-                    src = packet[IPv6].src
-                    dst = packet[IPv6].dst
-                elif ARP in packet:
-                    src = packet[ARP].psrc
-                    dst = packet[ARP].pdst
-                
-                src_geo = self.get_geolocation(src)
-                dst_geo = self.get_geolocation(dst)
-                
-                details = self.get_packet_details(packet)
-                details += "\n\n=== GEOLOCATION DATA ==="
-                details += f"\nSOURCE IP: {src}\nPROTOCOL: {protocol}\n"
-                details += self.format_geo_string(src_geo) + "\n\n"
-                details += f"DESTINATION IP: {dst}\nPROTOCOL: {protocol}\n"
-                details += self.format_geo_string(dst_geo)
-                self.details_text.setText(details)
-                
-                # Show distance if we have both locations
-                if (src_geo.get('latitude') not in ['N/A', None] and 
-                    dst_geo.get('latitude') not in ['N/A', None] and
-                    'error' not in src_geo and 'error' not in dst_geo):
-                    distance = self.calculate_distance(
-                        src_geo['latitude'], src_geo['longitude'],
-                        dst_geo['latitude'], dst_geo['longitude']
-                    )
-                    details += f"\n\nDISTANCE: {distance:.2f} km"
-                    self.details_text.setText(details)
-        finally:
-            self.geo_scan_in_progress = False
-            self.geo_button.setEnabled(True)
-            self.status_label.setText("SYSTEM READY")
-            self.status_label.setStyleSheet(f"""
-                color: {CYBER_BLUE};
-                font-family: 'Courier New';
-                font-size: 11px;
-                font-weight: bold;
-                padding: 5px;
-                border: 1px solid {CYBER_BLUE};
-                min-width: 150px;
-                text-align: center;
-            """)
+        packet = self.packets[index]
+        self.geo_scan = self.start_geo_request(packet)
+        self.geo_scan['root'] = self.detail_cache.get(index, lambda: packet)
+        self.update_geo_scan()
+        for ip in list(self.geo_scan['pending']):
+            self.request_geolocation(ip)
+    
+    def show_geo_details(self, root):
+        self.show_detail_tree(root)
+        self.details_tree.expandRecursively(self.detail_model.index(len(root.children) - 1, 0))
+    
+    def update_geo_scan(self):
+        request = self.geo_scan
+        src, dst, protocol = request['src'], request['dst'], request['protocol']
+        src_geo = request['results'].get(src)
+        dst_geo = request['results'].get(dst)
+        
+        root = request['root']
+        root.children = [node for node in root.children if node.text != "GEOLOCATION DATA"]
+        geo = root.add("GEOLOCATION DATA")
+        for label, ip, ip_geo in (("SOURCE IP", src, src_geo), ("DESTINATION IP", dst, dst_geo)):
+            endpoint = geo.add(f"{label}: {ip}")
+            endpoint.add(f"PROTOCOL: {protocol}")
+            endpoint.add_lines((self.format_geo_string(ip_geo) if ip_geo else "RESOLVING...").splitlines())
+        self.expanded_sections.add("GEOLOCATION DATA")
+        
+        if request['pending']:
+            self.show_geo_details(root)
+            return
+        
+        # Show distance if we have both locations
+        if self.has_location(src_geo) and self.has_location(dst_geo):
+            distance = self.calculate_distance(
+                src_geo['latitude'], src_geo['longitude'],
+                dst_geo['latitude'], dst_geo['longitude']
+            )
+            geo.add(f"DISTANCE: {distance:.2f} km")
+        
+        if self.geo_resolver.cache is not None:
+            stats = self.geo_resolver.cache.stats()
+            geo.add(f"GEO CACHE: {stats['memory_hits']} MEMORY HITS / {stats['disk_hits']} DISK HITS / "
+                    f"{stats['misses']} MISSES")
+        self.show_geo_details(root)
+        
+        self.geo_scan = None
+        self.geo_scan_in_progress = False
+        self.geo_button.setEnabled(True)
+        self.status_label.setText("SYSTEM READY")
+        self.status_label.setStyleSheet(f"""
+            color: {CYBER_BLUE};
+            font-family: 'Courier New';
+            font-size: 11px;
+            font-weight: bold;
+            padding: 5px;
+            border: 1px solid {CYBER_BLUE};
+            min-width: 150px;
+            text-align: center;
+        """)
 
+# Everything that starts the application stays under this guard: summary
+# workers must be able to import this module without opening a window
 if __name__ == "__main__":
     # Check if running as root and add --no-sandbox for QWebEngineView
     if os.geteuid() == 0:
@@ -1375,7 +2773,17 @@ if __name__ == "__main__":
     else:
         logging.info("Running as non-root user")
     
+    # Lets QtWebEngine be imported lazily, after the QApplication exists
+    QApplication.setAttribute(Qt.AA_ShareOpenGLContexts)
+    # The map's URL scheme has to be registered before the QApplication exists
+    try:
+        from map_scheme import register_map_scheme
+        register_map_scheme()
+    except ImportError as e:
+        logging.error(f"QtWebEngine unavailable, the network map will not load: {e}")
     app = QApplication(sys.argv)
     window = CyberTechPacketTracker()
     window.show()
+    # Fires once the event loop has painted the window and is taking input
+    QTimer.singleShot(0, window.report_startup)
     sys.exit(app.exec_())
@@ -0,0 +1,551 @@
+import logging
+import mmap
+import os
+import queue
+import select
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_STATISTICS = 6
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+RING_BLOCK_SIZE = 1 << 20
+RING_BLOCK_COUNT = 64
+RING_FRAME_SIZE = 2048
+RING_BLOCK_TIMEOUT_MS = 50
+RING_POLL_MS = 100
+
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1
+BLOCK_HEADER = struct.Struct('=IIIIII')
+# struct tpacket3_hdr up to tp_net
+FRAME_HEADER = struct.Struct('=IIIIIIHH')
+STATS_V3 = struct.Struct('=III')
+# struct tpacket_stats, for sockets without a ring
+STATS_V1 = struct.Struct('=II')
+
+CAPTURE_ENGINES = {'scapy': 'SCAPY SNIFF'}
+if sys.platform.startswith('linux'):
+    CAPTURE_ENGINES['tpacket_v3'] = 'TPACKET_V3 RING'
+
+# Capture threads hand frames over in lists of up to BATCH_FRAMES, at least
+# every BATCH_INTERVAL seconds while frames are waiting
+BATCH_FRAMES = 512
+BATCH_INTERVAL = 0.05
+FRAME_QUEUE_FRAMES = 200000
+OVERLOAD_POLICIES = {'drop_newest': 'DROP NEWEST', 'drop_oldest': 'DROP OLDEST', 'block': 'BLOCK'}
+
+
+def interface_decoder(interface):
+    # Pick the Scapy class for the interface's link type the same way sniff() does
+    from scapy.config import conf
+    from scapy.layers.l2 import Ether
+    try:
+        with open(f"/sys/class/net/{interface}/type") as f:
+            arphrd = int(f.read().strip())
+    except (OSError, ValueError):
+        return Ether
+    return conf.l2types.get(arphrd, Ether)
+
+
+def socket_drops(sock):
+    # Kernel drops on a plain AF_PACKET socket since the previous call
+    # (PACKET_STATISTICS resets on read); 0 where the counter is unavailable
+    try:
+        return STATS_V1.unpack(sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, STATS_V1.size))[1]
+    except (OSError, AttributeError):
+        return 0
+
+
+def copy_block(view, frames, interface, decoder):
+    # One copy of the used part of a ring block; the frames are slices of it.
+    # This is deliberately not zero-copy: frames outlive the block (they wait
+    # in the frame queue and are pickled to summary workers), and the kernel
+    # needs the block back right away, so one bulk copy per block replaces
+    # the per-packet copies instead of holding ring memory.
+    start = frames[0][0]
+    end = frames[-1][0] + frames[-1][1]
+    data = memoryview(bytes(view[start:end]))
+    return [(data[offset - start:offset - start + length], timestamp, interface, decoder)
+            for offset, length, timestamp in frames]
+
+
+class RingCapture:
+    # Linux AF_PACKET capture through a memory-mapped TPACKET_V3 ring. The
+    # kernel fills whole blocks of frames, applies the BPF filter before
+    # anything is copied to user space, and hands a block over by flipping
+    # its status word. Blocks are passed to the handler as memoryviews over
+    # the ring itself and returned to the kernel as soon as it returns, so
+    # the handler must copy whatever it wants to keep.
+
+    def __init__(self, interface, filter_text=None, block_size=RING_BLOCK_SIZE,
+                 block_count=RING_BLOCK_COUNT, frame_size=RING_FRAME_SIZE,
+                 block_timeout=RING_BLOCK_TIMEOUT_MS):
+        self.interface = interface
+        self.filter_text = filter_text
+        self.block_size = block_size
+        self.block_count = block_count
+        self.frame_size = frame_size
+        self.block_timeout = block_timeout
+        self.sock = None
+        self.ring = None
+        self.received = 0
+        self.dropped = 0
+
+    def open(self):
+        # Protocol 0 receives nothing until bind(), so the filter and the ring
+        # are in place before the first frame arrives, and only frames of
+        # this interface ever reach the ring
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            if self.filter_text:
+                from scapy.arch.linux import attach_filter
+                attach_filter(sock, self.filter_text, self.interface)
+            sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            req = struct.pack('=IIIIIII', self.block_size, self.block_count, self.frame_size,
+                              self.block_size * self.block_count // self.frame_size,
+                              self.block_timeout, 0, 0)
+            sock.setsockopt(SOL_PACKET, PACKET_RX_RING, req)
+            self.ring = mmap.mmap(sock.fileno(), self.block_size * self.block_count,
+                                  mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+            sock.bind((self.interface if self.interface and self.interface != 'any' else '', ETH_P_ALL))
+        except Exception:
+            sock.close()
+            raise
+        self.sock = sock
+        return self
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read_block(self, view):
+        status, num_pkts, first, blk_len = BLOCK_HEADER.unpack_from(view, 8)[:4]
+        frames = []
+        offset = first
+        for _ in range(num_pkts):
+            next_offset, sec, nsec, snaplen, wire_len, _, mac, _ = FRAME_HEADER.unpack_from(view, offset)
+            frames.append((offset + mac, snaplen, sec + nsec * 1e-9))
+            if not next_offset:
+                break
+            offset += next_offset
+        return frames
+
+    def run(self, handler, stopped):
+        # handler(block_view, frames) gets frames as (offset, length, timestamp)
+        # into block_view; stopped() is polled at least every RING_POLL_MS.
+        poller = select.poll()
+        poller.register(self.sock.fileno(), select.POLLIN | select.POLLERR)
+        ring = memoryview(self.ring)
+        block = 0
+        try:
+            while not stopped():
+                base = block * self.block_size
+                status = struct.unpack_from('=I', ring, base + 8)[0]
+                if not status & TP_STATUS_USER:
+                    poller.poll(RING_POLL_MS)
+                    continue
+                view = ring[base:base + self.block_size]
+                try:
+                    frames = self.read_block(view)
+                    self.received += len(frames)
+                    if frames:
+                        handler(view, frames)
+                finally:
+                    view.release()
+                    struct.pack_into('=I', ring, base + 8, TP_STATUS_KERNEL)
+                block = (block + 1) % self.block_count
+        finally:
+            ring.release()
+
+    def kernel_stats(self):
+        # PACKET_STATISTICS resets on read, so accumulate drops here
+        if self.sock is None:
+            return self.received, self.dropped
+        packets, drops, _ = STATS_V3.unpack(self.sock.getsockopt(SOL_PACKET, PACKET_STATISTICS, STATS_V3.size))
+        self.dropped += drops
+        return self.received, self.dropped
+
+
+class FrameQueue:
+    # Bounded hand-off of frame lists from capture threads to the GUI drain.
+    # The bound is in frames, not lists. When a list does not fit, the policy
+    # decides: drop_newest discards what does not fit, drop_oldest discards
+    # queued frames from the front, and block makes the producer wait, so
+    # the overload backs up into the kernel and shows up as kernel drops.
+    # Producers that cannot wait (no `stopped` callable) fall back to
+    # drop_newest. Every discarded frame is counted in frames_dropped.
+    # lossless puts (capture files) always wait for room whatever the
+    # policy, and are abandoned uncounted if stopped() turns true first.
+
+    def __init__(self, capacity=FRAME_QUEUE_FRAMES, policy='drop_newest'):
+        self.capacity = capacity
+        self.policy = policy
+        self.condition = threading.Condition()
+        self.batches = deque()
+        self.depth = 0
+        self.frames_accepted = 0
+        self.frames_dropped = 0
+
+    def __len__(self):
+        return self.depth
+
+    def put(self, frames, stopped=None, lossless=False):
+        with self.condition:
+            if (lossless or self.policy == 'block') and stopped is not None:
+                while self.depth and self.depth + len(frames) > self.capacity and not stopped():
+                    self.condition.wait(0.1)
+                if lossless and stopped():
+                    return
+            # A lossless list larger than the whole queue goes in once it is empty
+            overflow = 0 if lossless else self.depth + len(frames) - self.capacity
+            if overflow > 0:
+                if self.policy == 'drop_oldest':
+                    if len(frames) > self.capacity:
+                        self.frames_dropped += len(frames) - self.capacity
+                        frames = frames[-self.capacity:]
+                    self.discard_oldest(self.depth + len(frames) - self.capacity)
+                else:
+                    self.frames_dropped += min(overflow, len(frames))
+                    frames = frames[:max(0, len(frames) - overflow)]
+            if frames:
+                self.batches.append(frames)
+                self.depth += len(frames)
+                self.frames_accepted += len(frames)
+
+    def discard_oldest(self, count):
+        batches = self.batches
+        while count > 0 and batches:
+            first = batches[0]
+            if len(first) <= count:
+                batches.popleft()
+                dropped = len(first)
+            else:
+                batches[0] = first[count:]
+                dropped = count
+            count -= dropped
+            self.depth -= dropped
+            self.frames_dropped += dropped
+
+    def get(self, limit):
+        # Whole lists in arrival order until at least `limit` frames or empty
+        frames = []
+        with self.condition:
+            batches = self.batches
+            while batches and len(frames) < limit:
+                frames.extend(batches.popleft())
+            self.depth -= len(frames)
+            self.condition.notify_all()
+        return frames
+
+    def clear(self):
+        with self.condition:
+            self.batches.clear()
+            self.depth = 0
+            self.frames_accepted = 0
+            self.frames_dropped = 0
+            self.condition.notify_all()
+
+
+PCAP_MAGIC_US = 0xA1B2C3D4
+PCAP_MAGIC_NS = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER = 0x1A2B3C4D
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_IF_TSRESOL = 9
+FILE_CHUNK_FRAMES = 2048
+
+WRITER_SEGMENT_BYTES = 100 * 1024 * 1024
+WRITER_SEGMENT_SECONDS = 600
+WRITER_RING_FILES = 10
+WRITER_QUEUE_BATCHES = 1024
+WRITER_BUFFER_BYTES = 1 << 20
+WRITER_CLOSE_TIMEOUT = 5.0  # seconds to wait for queued frames to reach disk
+
+
+class CaptureFileReader:
+    # Streams frame locations out of a pcap or pcapng file without reading it
+    # into memory: the file is mmapped and each chunk lists (offset, length,
+    # timestamp, linktype) for the frames it covers, so callers can keep just
+    # the offsets and read bytes back through the same mapping later.
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        self.position = 0
+        magic = self.data[:4]
+        if len(magic) < 4:
+            self.close()
+            raise ValueError(f"{path} is not a pcap or pcapng file")
+        if struct.unpack('<I', magic)[0] == PCAPNG_SHB:
+            self.format = 'pcapng'
+        elif struct.unpack('<I', magic)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS) or \
+                struct.unpack('>I', magic)[0] in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+            self.format = 'pcap'
+        else:
+            self.close()
+            raise ValueError(f"{path} is not a pcap or pcapng file")
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data = b''
+        self.file.close()
+
+    def chunks(self, chunk_size=FILE_CHUNK_FRAMES):
+        chunk = []
+        frames = self.pcap_frames() if self.format == 'pcap' else self.pcapng_frames()
+        for frame in frames:
+            chunk.append(frame)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def pcap_frames(self):
+        data = self.data
+        magic = struct.unpack('<I', data[:4])[0]
+        endian = '<' if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS) else '>'
+        magic = struct.unpack(endian + 'I', data[:4])[0]
+        scale = 1e-9 if magic == PCAP_MAGIC_NS else 1e-6
+        linktype = struct.unpack_from(endian + 'I', data, 20)[0] & 0x0FFFFFFF
+        record = struct.Struct(endian + 'IIII')
+        offset = 24
+        while offset + 16 <= self.size:
+            sec, frac, caplen, _ = record.unpack_from(data, offset)
+            offset += 16
+            if offset + caplen > self.size:
+                logging.warning(f"{self.path}: truncated record at offset {offset - 16}")
+                break
+            self.position = offset + caplen
+            yield (offset, caplen, sec + frac * scale, linktype)
+            offset += caplen
+        self.position = self.size
+
+    def pcapng_frames(self):
+        data = self.data
+        endian = '<'
+        interfaces = []
+        # Simple packet blocks carry no timestamp; they reuse the last one seen
+        timestamp = 0.0
+        offset = 0
+        while offset + 12 <= self.size:
+            block_type, block_len = struct.unpack_from(endian + 'II', data, offset)
+            if block_type == PCAPNG_SHB:
+                # Each section header restates the byte order and resets interfaces
+                endian = '<' if struct.unpack_from('<I', data, offset + 8)[0] == PCAPNG_BYTE_ORDER else '>'
+                block_len = struct.unpack_from(endian + 'I', data, offset + 4)[0]
+                interfaces = []
+            if block_len < 12 or offset + block_len > self.size:
+                logging.warning(f"{self.path}: truncated block at offset {offset}")
+                break
+            body = offset + 8
+            if block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + 'H', data, body)[0]
+                interfaces.append((linktype, self.idb_resolution(data, body + 8, offset + block_len - 4, endian)))
+            elif block_type == PCAPNG_EPB and interfaces:
+                iface, ts_high, ts_low, caplen = struct.unpack_from(endian + 'IIII', data, body)
+                linktype, scale = interfaces[iface] if iface < len(interfaces) else interfaces[0]
+                timestamp = ((ts_high << 32) | ts_low) * scale
+                self.position = offset + block_len
+                yield (body + 20, caplen, timestamp, linktype)
+            elif block_type == PCAPNG_PB and interfaces:
+                iface, _, ts_high, ts_low, caplen = struct.unpack_from(endian + 'HHIII', data, body)
+                linktype, scale = interfaces[iface] if iface < len(interfaces) else interfaces[0]
+                timestamp = ((ts_high << 32) | ts_low) * scale
+                self.position = offset + block_len
+                yield (body + 20, caplen, timestamp, linktype)
+            elif block_type == PCAPNG_SPB and interfaces:
+                orig_len = struct.unpack_from(endian + 'I', data, body)[0]
+                self.position = offset + block_len
+                yield (body + 4, min(orig_len, block_len - 16), timestamp, interfaces[0][0])
+            offset += block_len
+        self.position = self.size
+
+    def idb_resolution(self, data, offset, end, endian):
+        while offset + 4 <= end:
+            code, length = struct.unpack_from(endian + 'HH', data, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_IF_TSRESOL and length >= 1:
+                value = data[offset + 4]
+                return 2.0 ** -(value & 0x7F) if value & 0x80 else 10.0 ** -value
+            offset += 4 + (length + 3) // 4 * 4
+        return 1e-6
+
+
+def linktype_decoder(linktype):
+    from scapy.config import conf
+    from scapy.packet import Raw
+    return conf.l2types.get(linktype, Raw)
+
+
+def decoder_linktype(decoder):
+    from scapy.config import conf
+    return conf.l2types.layer2num.get(decoder, 1)
+
+
+class PcapngWriter(threading.Thread):
+    # Streams captured frames to a ring of pcapng segments on its own thread.
+    # submit() never blocks: if the disk falls behind and the queue fills,
+    # the batch is counted as dropped instead of stalling capture. Segments
+    # rotate on size or age and only the newest ring_files are kept. After
+    # a write error the writer stops and further batches count as dropped.
+
+    def __init__(self, directory, segment_bytes=WRITER_SEGMENT_BYTES, segment_seconds=WRITER_SEGMENT_SECONDS,
+                 ring_files=WRITER_RING_FILES, queue_batches=WRITER_QUEUE_BATCHES):
+        super().__init__(name='pcapng-writer', daemon=True)
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.ring_files = ring_files
+        self.queue = queue.Queue(maxsize=queue_batches)
+        self.stopped = threading.Event()
+        self.failed = False
+        self.file = None
+        self.segments = []
+        self.sequence = 0
+        self.interfaces = {}
+        self.segment_size = 0
+        self.segment_started = 0.0
+        self.bytes_written = 0
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.rate_mark = (time.monotonic(), 0)
+        self.epb_header = struct.Struct('=IIIIIII')
+
+    def submit(self, frames):
+        # frames: (raw, timestamp, decoder) tuples
+        if self.failed or self.stopped.is_set():
+            self.frames_dropped += len(frames)
+            return
+        try:
+            self.queue.put_nowait(frames)
+        except queue.Full:
+            self.frames_dropped += len(frames)
+
+    def close(self, timeout=WRITER_CLOSE_TIMEOUT):
+        # The writer finishes what is queued, then exits; the sentinel only
+        # wakes it early and may be skipped when the queue is full
+        self.stopped.set()
+        if not self.is_alive():
+            return
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self.join(timeout)
+        if self.is_alive():
+            logging.warning(f"PCAP writer did not finish within {timeout:.0f}s, {self.queue.qsize()} batches unwritten")
+
+    def run(self):
+        linktypes = {}
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            while True:
+                try:
+                    frames = self.queue.get(timeout=0.1)
+                except queue.Empty:
+                    if self.stopped.is_set():
+                        break
+                    continue
+                if frames is None:
+                    break
+                for raw, timestamp, decoder in frames:
+                    linktype = linktypes.get(decoder)
+                    if linktype is None:
+                        linktype = linktypes[decoder] = decoder_linktype(decoder)
+                    self.write_frame(raw, timestamp, linktype)
+        except OSError as e:
+            self.failed = True
+            logging.error(f"PCAP writer stopped: {e}")
+        finally:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def open_segment(self):
+        if self.file is not None:
+            self.file.close()
+        self.sequence += 1
+        name = f"sniffmapper_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.sequence:04d}.pcapng"
+        path = os.path.join(self.directory, name)
+        self.file = open(path, 'wb', buffering=WRITER_BUFFER_BYTES)
+        self.segments.append(path)
+        while len(self.segments) > self.ring_files:
+            oldest = self.segments.pop(0)
+            try:
+                os.remove(oldest)
+            except OSError as e:
+                logging.warning(f"Cannot remove old capture segment {oldest}: {e}")
+        self.interfaces = {}
+        self.segment_size = 0
+        self.segment_started = time.monotonic()
+        # Section header: byte-order magic, version 1.0, unknown section length
+        self.write_block(struct.pack('=IIIHHq', PCAPNG_SHB, 28, PCAPNG_BYTE_ORDER, 1, 0, -1) + struct.pack('=I', 28))
+        logging.info(f"Writing capture segment {path}")
+
+    def write_block(self, block):
+        self.file.write(block)
+        self.segment_size += len(block)
+        self.bytes_written += len(block)
+
+    def write_frame(self, raw, timestamp, linktype):
+        if self.file is None or self.segment_size >= self.segment_bytes or \
+                time.monotonic() - self.segment_started >= self.segment_seconds:
+            self.open_segment()
+        iface = self.interfaces.get(linktype)
+        if iface is None:
+            iface = self.interfaces[linktype] = len(self.interfaces)
+            self.write_block(struct.pack('=IIHHII', PCAPNG_IDB, 20, linktype, 0, 0, 20))
+        length = len(raw)
+        padding = -length % 4
+        block_len = 32 + length + padding
+        micros = int(timestamp * 1000000)
+        self.write_block(self.epb_header.pack(PCAPNG_EPB, block_len, iface, micros >> 32, micros & 0xFFFFFFFF,
+                                              length, length))
+        self.file.write(raw)
+        self.file.write(b'\x00' * padding + struct.pack('=I', block_len))
+        self.segment_size += length + padding + 4
+        self.bytes_written += length + padding + 4
+        self.frames_written += 1
+
+    def stats(self):
+        now = time.monotonic()
+        mark_time, mark_bytes = self.rate_mark
+        elapsed = now - mark_time
+        rate = (self.bytes_written - mark_bytes) / elapsed if elapsed > 0 else 0.0
+        self.rate_mark = (now, self.bytes_written)
+        return {
+            'bytes_written': self.bytes_written,
+            'bytes_per_sec': rate,
+            'frames_written': self.frames_written,
+            'frames_dropped': self.frames_dropped,
+            'queue_depth': self.queue.qsize()
+        }
@@ -0,0 +1,168 @@
+from display_filter import NO_FLOW
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INITIAL_CAPACITY = 65536
+
+COLUMNS = (
+    ('time', 'f8'),
+    ('length', 'u4'),
+    ('protocol', 'u2'),
+    ('src', 'u4'),
+    ('dst', 'u4'),
+    ('ip_proto', 'u2'),
+    ('sport', 'u2'),
+    ('dport', 'u2'),
+    ('tcp_flags', 'u1'),
+)
+
+
+def numpy_available():
+    return np is not None
+
+
+class ColumnarStore:
+    # Packet metadata as growable NumPy columns, filled from the same summary
+    # rows as the packet table. Endpoint addresses and protocol names are
+    # interned to small integer codes, so aggregations are bincounts and
+    # boolean masks over contiguous arrays instead of loops over packets.
+    # Column arrays handed out by column() are views: copy them before
+    # holding on to them across appends.
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        if np is None:
+            raise ImportError("the columnar store needs numpy")
+        self.initial_capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.size = 0
+        self.data = {name: np.zeros(self.initial_capacity, dtype=dtype) for name, dtype in COLUMNS}
+        self.endpoints = []
+        self.endpoint_ids = {}
+        self.protocols = []
+        self.protocol_ids = {}
+
+    def __len__(self):
+        return self.size
+
+    def reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.data['time'])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name, column in self.data.items():
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            self.data[name] = grown
+
+    def intern(self, table, ids, value):
+        code = ids.get(value)
+        if code is None:
+            code = ids[value] = len(table)
+            table.append(value)
+        return code
+
+    def append_rows(self, rows):
+        # rows: summary tuples (time, src, dst, protocol, length, info, flow)
+        count = len(rows)
+        if not count:
+            return
+        self.reserve(count)
+        start, end = self.size, self.size + count
+        endpoints, endpoint_ids = self.endpoints, self.endpoint_ids
+        protocols, protocol_ids = self.protocols, self.protocol_ids
+        intern = self.intern
+        data = self.data
+        data['time'][start:end] = [row[0] for row in rows]
+        data['length'][start:end] = [row[4] for row in rows]
+        data['src'][start:end] = [intern(endpoints, endpoint_ids, row[1]) for row in rows]
+        data['dst'][start:end] = [intern(endpoints, endpoint_ids, row[2]) for row in rows]
+        data['protocol'][start:end] = [intern(protocols, protocol_ids, row[3]) for row in rows]
+        flows = [row[6] or (NO_FLOW, 0, 0, 0) for row in rows]
+        data['ip_proto'][start:end] = [flow[0] for flow in flows]
+        data['sport'][start:end] = [flow[1] for flow in flows]
+        data['dport'][start:end] = [flow[2] for flow in flows]
+        data['tcp_flags'][start:end] = [flow[3] & 0xFF for flow in flows]
+        self.size = end
+
+    def column(self, name):
+        return self.data[name][:self.size]
+
+    def mask(self, protocol=None, endpoint=None, src=None, dst=None, port=None, start=None, end=None):
+        # Boolean row mask for the aggregations; every condition is optional
+        selected = np.ones(self.size, dtype=bool)
+        if protocol is not None:
+            selected &= self.column('protocol') == self.protocol_ids.get(protocol, -1)
+        if endpoint is not None:
+            code = self.endpoint_ids.get(endpoint, -1)
+            selected &= (self.column('src') == code) | (self.column('dst') == code)
+        if src is not None:
+            selected &= self.column('src') == self.endpoint_ids.get(src, -1)
+        if dst is not None:
+            selected &= self.column('dst') == self.endpoint_ids.get(dst, -1)
+        if port is not None:
+            selected &= (self.column('sport') == port) | (self.column('dport') == port)
+        if start is not None:
+            selected &= self.column('time') >= start
+        if end is not None:
+            selected &= self.column('time') < end
+        return selected
+
+    def selected(self, name, mask):
+        column = self.column(name)
+        return column if mask is None else column[mask]
+
+    def counts_by_protocol(self, mask=None):
+        # [(protocol, packets, bytes)], busiest first
+        codes = self.selected('protocol', mask)
+        packets = np.bincount(codes, minlength=len(self.protocols))
+        volume = np.bincount(codes, weights=self.selected('length', mask), minlength=len(self.protocols))
+        order = np.argsort(-packets, kind='stable')
+        return [(self.protocols[i], int(packets[i]), int(volume[i])) for i in order if packets[i]]
+
+    def bytes_per_endpoint(self, top=None, mask=None):
+        # [(endpoint, bytes sent, bytes received, packets)], by total bytes
+        lengths = self.selected('length', mask)
+        src, dst = self.selected('src', mask), self.selected('dst', mask)
+        size = len(self.endpoints)
+        sent = np.bincount(src, weights=lengths, minlength=size)
+        received = np.bincount(dst, weights=lengths, minlength=size)
+        packets = np.bincount(src, minlength=size) + np.bincount(dst, minlength=size)
+        total = sent + received
+        if top is not None and top < size:
+            order = np.argpartition(-total, top)[:top]
+            order = order[np.argsort(-total[order], kind='stable')]
+        else:
+            order = np.argsort(-total, kind='stable')
+        return [(self.endpoints[i], int(sent[i]), int(received[i]), int(packets[i])) for i in order if packets[i]]
+
+    def top_ports(self, top=10, mask=None):
+        # [(port, packets)] over destination ports of TCP/UDP traffic
+        ip_proto = self.selected('ip_proto', mask)
+        ports = self.selected('dport', mask)[(ip_proto == 6) | (ip_proto == 17)]
+        counts = np.bincount(ports, minlength=1)
+        order = np.argsort(-counts, kind='stable')[:top]
+        return [(int(port), int(counts[port])) for port in order if counts[port]]
+
+    def rates(self, interval=1.0, mask=None, start=None, end=None):
+        # Packets and bytes per interval: (bucket start times, packets, bytes)
+        times = self.selected('time', mask)
+        if not len(times):
+            return np.zeros(0), np.zeros(0, dtype=np.int64), np.zeros(0)
+        if start is None:
+            start = float(times.min())
+        if end is None:
+            end = float(times.max())
+        buckets = np.floor((times - start) / interval).astype(np.int64)
+        count = max(int((end - start) // interval) + 1, 1)
+        inside = (buckets >= 0) & (buckets < count)
+        buckets = buckets[inside]
+        packets = np.bincount(buckets, minlength=count)
+        volume = np.bincount(buckets, weights=self.selected('length', mask)[inside], minlength=count)
+        return start + np.arange(count) * interval, packets, volume
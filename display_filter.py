@@ -0,0 +1,574 @@
+import ipaddress
+import re
+from array import array
+from itertools import chain
+
+# Display filters run over the packet table's columns, never over Scapy
+# packets. A filter is parsed once into a small tree; each node can say which
+# rows might match from the per-column posting lists in PacketIndex, and can
+# build a per-row predicate for whatever the indexes cannot answer exactly.
+
+NO_FLOW = 0xFFFF
+
+TCP_FLAG_BITS = {'fin': 0x01, 'syn': 0x02, 'reset': 0x04, 'rst': 0x04, 'push': 0x08, 'psh': 0x08,
+                 'ack': 0x10, 'urg': 0x20}
+
+OPERATORS = {'==': '==', 'eq': '==', '!=': '!=', 'ne': '!=', '>': '>', 'gt': '>', '<': '<', 'lt': '<',
+             '>=': '>=', 'ge': '>=', '<=': '<=', 'le': '<=', 'contains': 'contains', 'matches': 'matches',
+             '~': 'matches'}
+
+COMPARE = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '>': lambda a, b: a > b,
+    '<': lambda a, b: a < b,
+    '>=': lambda a, b: a >= b,
+    '<=': lambda a, b: a <= b,
+}
+
+# field name -> (kind, columns, ip protocol restriction)
+FIELDS = {
+    'ip.src': ('addr', ('src_ids',), None),
+    'ip.dst': ('addr', ('dst_ids',), None),
+    'ip.addr': ('addr', ('src_ids', 'dst_ids'), None),
+    'ipv6.src': ('addr', ('src_ids',), None),
+    'ipv6.dst': ('addr', ('dst_ids',), None),
+    'ipv6.addr': ('addr', ('src_ids', 'dst_ids'), None),
+    'tcp.srcport': ('number', ('sports',), 6),
+    'tcp.dstport': ('number', ('dports',), 6),
+    'tcp.port': ('number', ('sports', 'dports'), 6),
+    'udp.srcport': ('number', ('sports',), 17),
+    'udp.dstport': ('number', ('dports',), 17),
+    'udp.port': ('number', ('sports', 'dports'), 17),
+    'port': ('number', ('sports', 'dports'), None),
+    'tcp.flags': ('number', ('tcp_flags',), 6),
+    'ip.proto': ('number', ('l4_protos',), None),
+    'len': ('number', ('lengths',), None),
+    'frame.len': ('number', ('lengths',), None),
+    'frame.time_epoch': ('time', ('times',), None),
+    'time': ('time', ('times',), None),
+    'proto': ('protocol', ('proto_ids',), None),
+    'protocol': ('protocol', ('proto_ids',), None),
+    'info': ('text', ('infos',), None),
+}
+
+# Bare protocol names: IP protocol numbers, or names from the PROTO column
+PROTOCOL_NUMBERS = {'tcp': (6,), 'udp': (17,), 'icmp': (1, 58), 'icmpv6': (58,)}
+PROTOCOL_LABELS = {'http': ('HTTP',), 'https': ('HTTPS',), 'tls': ('TLS', 'HTTPS'), 'dns': ('DNS',),
+                   'arp': ('ARP',)}
+
+INDEXED_COLUMNS = ('src_ids', 'dst_ids', 'proto_ids', 'lengths', 'l4_protos', 'sports', 'dports', 'tcp_flags')
+
+TOKEN_RE = re.compile(r'\s*(?:(&&|\|\||==|!=|>=|<=|[()!<>~])|"((?:[^"\\]|\\.)*)"|([^\s()!=<>&|~"]+))')
+
+
+class FilterSyntaxError(ValueError):
+    pass
+
+
+class PacketIndex:
+    # value -> array of row numbers for each indexed column, kept up to date
+    # by update() as rows are appended. Row numbers are the packet indexes, so
+    # every posting list is already sorted.
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.count = 0
+        self.postings = {name: {} for name in INDEXED_COLUMNS}
+        self.sorted_keys = {}
+
+    def update(self, columns):
+        end = len(columns.times)
+        start = self.count
+        if end <= start:
+            return
+        for name in INDEXED_COLUMNS:
+            postings = self.postings[name]
+            get = postings.get
+            values = getattr(columns, name)
+            for i in range(start, end):
+                value = values[i]
+                rows = get(value)
+                if rows is None:
+                    rows = postings[value] = array('I')
+                    self.sorted_keys.pop(name, None)
+                rows.append(i)
+        self.count = end
+
+    def keys(self, name):
+        keys = self.sorted_keys.get(name)
+        if keys is None:
+            keys = self.sorted_keys[name] = sorted(self.postings[name])
+        return keys
+
+    def size(self, name, values):
+        postings = self.postings[name]
+        return sum(len(postings[value]) for value in values if value in postings)
+
+    def rows(self, name, values):
+        postings = self.postings[name]
+        lists = [postings[value] for value in values if value in postings]
+        # Different values of one column never share a row
+        return union(lists, disjoint=True)
+
+    def rows_where(self, name, test):
+        return self.rows(name, [value for value in self.keys(name) if test(value)])
+
+    def size_where(self, name, test):
+        return self.size(name, [value for value in self.keys(name) if test(value)])
+
+
+def union(lists, disjoint=False):
+    if not lists:
+        return array('I')
+    if len(lists) == 1:
+        return array('I', lists[0])
+    # The lists are sorted runs; timsort merges them quickly
+    if disjoint:
+        return array('I', sorted(chain.from_iterable(lists)))
+    return array('I', sorted(set(chain.from_iterable(lists))))
+
+
+def intersect(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    members = set(b)
+    return array('I', (i for i in a if i in members))
+
+
+class Node:
+    # candidates() returns sorted row numbers that may match, or None when the
+    # node needs a full scan; exact means the candidates are the answer.
+    # estimate() is an upper bound on len(candidates()) that does not build
+    # the list, so AND can pick its most selective indexed term cheaply.
+    exact = False
+
+    def estimate(self, columns, index):
+        return None
+
+    def candidates(self, columns, index):
+        return None
+
+    def predicate(self, columns):
+        raise NotImplementedError
+
+
+class And(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, columns, index):
+        sizes = [child.estimate(columns, index) for child in self.children]
+        sizes = [size for size in sizes if size is not None]
+        return min(sizes) if sizes else None
+
+    def candidates(self, columns, index):
+        # Only the most selective term is materialized; the rest are checked
+        # row by row on its candidates
+        best = None
+        for child in self.children:
+            size = child.estimate(columns, index)
+            if size is not None and (best is None or size < best[0]):
+                best = (size, child)
+        self.exact = False
+        if best is None:
+            return None
+        return best[1].candidates(columns, index)
+
+    def predicate(self, columns):
+        tests = [child.predicate(columns) for child in self.children]
+        if len(tests) == 2:
+            first, second = tests
+            return lambda i: first(i) and second(i)
+        return lambda i: all(test(i) for test in tests)
+
+
+class Or(Node):
+    def __init__(self, children):
+        self.children = children
+
+    def estimate(self, columns, index):
+        sizes = [child.estimate(columns, index) for child in self.children]
+        if any(size is None for size in sizes):
+            return None
+        return sum(sizes)
+
+    def candidates(self, columns, index):
+        if self.estimate(columns, index) is None:
+            return None
+        found = [child.candidates(columns, index) for child in self.children]
+        self.exact = all(child.exact for child in self.children)
+        return union(found)
+
+    def predicate(self, columns):
+        tests = [child.predicate(columns) for child in self.children]
+        return lambda i: any(test(i) for test in tests)
+
+
+class Not(Node):
+    def __init__(self, child):
+        self.child = child
+
+    def predicate(self, columns):
+        test = self.child.predicate(columns)
+        return lambda i: not test(i)
+
+
+class AddressMatch(Node):
+    def __init__(self, columns, op, value):
+        self.columns = columns
+        self.op = op
+        if op not in ('==', '!='):
+            raise FilterSyntaxError(f"addresses only support == and !=, not {op}")
+        try:
+            self.network = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            raise FilterSyntaxError(f"'{value}' is not an IP address or network")
+
+    def string_ids(self, columns, start=0):
+        # Ids of the interned strings from `start` on that fall in the network
+        network = self.network
+        if network.num_addresses == 1:
+            string_id = columns.string_ids.get(str(network.network_address))
+            return set() if string_id is None or string_id < start else {string_id}
+        ids = set()
+        for string_id in range(start, len(columns.strings)):
+            try:
+                if ipaddress.ip_address(columns.strings[string_id]) in network:
+                    ids.add(string_id)
+            except ValueError:
+                pass
+        return ids
+
+    def estimate(self, columns, index):
+        if self.op != '==':
+            return None
+        ids = self.string_ids(columns)
+        return sum(index.size(name, ids) for name in self.columns)
+
+    def candidates(self, columns, index):
+        if self.op != '==':
+            return None
+        ids = self.string_ids(columns)
+        self.exact = True
+        return union([index.rows(name, ids) for name in self.columns])
+
+    def predicate(self, columns):
+        strings = columns.strings
+        ids = self.string_ids(columns)
+        scanned = [len(strings)]
+
+        def current_ids():
+            # Live rows keep interning new addresses after the filter is applied
+            if len(strings) != scanned[0]:
+                ids.update(self.string_ids(columns, scanned[0]))
+                scanned[0] = len(strings)
+            return ids
+
+        values = [getattr(columns, name) for name in self.columns]
+        if len(values) == 1:
+            column = values[0]
+            match = lambda i: column[i] in current_ids()
+        else:
+            src, dst = values
+            match = lambda i: src[i] in current_ids() or dst[i] in current_ids()
+        if self.op == '!=':
+            return lambda i: not match(i)
+        return match
+
+
+class NumberMatch(Node):
+    def __init__(self, columns, op, value, ip_proto=None):
+        self.columns = columns
+        self.op = op
+        self.ip_proto = ip_proto
+        if op not in COMPARE:
+            raise FilterSyntaxError(f"numeric fields do not support {op}")
+        try:
+            self.value = int(value, 0)
+        except ValueError:
+            raise FilterSyntaxError(f"'{value}' is not a number")
+
+    def test(self):
+        compare, value = COMPARE[self.op], self.value
+        if self.columns == ('l4_protos',):
+            return lambda key: key != NO_FLOW and compare(key, value)
+        return lambda key: compare(key, value)
+
+    def estimate(self, columns, index):
+        test = self.test()
+        return sum(index.size_where(name, test) for name in self.columns)
+
+    def candidates(self, columns, index):
+        test = self.test()
+        self.exact = self.ip_proto is None
+        return union([index.rows_where(name, test) for name in self.columns])
+
+    def predicate(self, columns):
+        compare = self.test()
+        values = [getattr(columns, name) for name in self.columns]
+        if len(values) == 1:
+            column = values[0]
+            match = lambda i: compare(column[i])
+        else:
+            first, second = values
+            match = lambda i: compare(first[i]) or compare(second[i])
+        if self.ip_proto is None:
+            return match
+        l4_protos, ip_proto = columns.l4_protos, self.ip_proto
+        return lambda i: l4_protos[i] == ip_proto and match(i)
+
+
+class TimeMatch(Node):
+    def __init__(self, op, value):
+        self.op = op
+        if op not in COMPARE:
+            raise FilterSyntaxError(f"time fields do not support {op}")
+        try:
+            self.value = float(value)
+        except ValueError:
+            raise FilterSyntaxError(f"'{value}' is not a timestamp")
+
+    def predicate(self, columns):
+        compare, value, times = COMPARE[self.op], self.value, columns.times
+        return lambda i: compare(times[i], value)
+
+
+class ProtocolMatch(Node):
+    def __init__(self, names, negate=False):
+        self.names = names
+        self.negate = negate
+
+    def proto_ids(self, columns, start=0):
+        return {columns.protocol_ids[name] for name in self.names
+                if columns.protocol_ids.get(name, -1) >= start}
+
+    def estimate(self, columns, index):
+        if self.negate:
+            return None
+        return index.size('proto_ids', self.proto_ids(columns))
+
+    def candidates(self, columns, index):
+        if self.negate:
+            return None
+        self.exact = True
+        return index.rows('proto_ids', self.proto_ids(columns))
+
+    def predicate(self, columns):
+        protocols, proto_ids, negate = columns.protocols, columns.proto_ids, self.negate
+        ids = self.proto_ids(columns)
+        scanned = [len(protocols)]
+
+        def current_ids():
+            # Protocols first seen after the filter was applied can match too
+            if len(protocols) != scanned[0]:
+                ids.update(self.proto_ids(columns, scanned[0]))
+                scanned[0] = len(protocols)
+            return ids
+
+        return lambda i: (proto_ids[i] in current_ids()) != negate
+
+
+class IpProtocolMatch(Node):
+    def __init__(self, numbers):
+        self.numbers = numbers
+
+    def estimate(self, columns, index):
+        return index.size('l4_protos', self.numbers)
+
+    def candidates(self, columns, index):
+        self.exact = True
+        return index.rows('l4_protos', self.numbers)
+
+    def predicate(self, columns):
+        numbers, l4_protos = set(self.numbers), columns.l4_protos
+        return lambda i: l4_protos[i] in numbers
+
+
+class IpVersionMatch(Node):
+    # "ip" / "ipv6": IP frames whose source address has that form
+    def __init__(self, version):
+        self.version = version
+
+    def predicate(self, columns):
+        strings, src_ids, l4_protos, v6 = columns.strings, columns.src_ids, columns.l4_protos, self.version == 6
+        return lambda i: l4_protos[i] != NO_FLOW and (':' in strings[src_ids[i]]) == v6
+
+
+class FlagMatch(Node):
+    def __init__(self, bit):
+        self.bit = bit
+
+    def estimate(self, columns, index):
+        bit = self.bit
+        return index.size_where('tcp_flags', lambda flags: flags & bit)
+
+    def candidates(self, columns, index):
+        self.exact = True
+        bit = self.bit
+        return index.rows_where('tcp_flags', lambda flags: flags & bit)
+
+    def predicate(self, columns):
+        bit, tcp_flags = self.bit, columns.tcp_flags
+        return lambda i: bool(tcp_flags[i] & bit)
+
+
+class TextMatch(Node):
+    def __init__(self, op, value):
+        self.op = op
+        if op == 'matches':
+            try:
+                self.pattern = re.compile(value, re.IGNORECASE)
+            except re.error as e:
+                raise FilterSyntaxError(f"bad regular expression: {e}")
+        elif op not in ('contains', '==', '!='):
+            raise FilterSyntaxError(f"text fields do not support {op}")
+        self.value = value
+
+    def predicate(self, columns):
+        infos, value = columns.infos, self.value
+        if self.op == 'matches':
+            search = self.pattern.search
+            return lambda i: search(infos[i]) is not None
+        if self.op == 'contains':
+            return lambda i: value in infos[i]
+        if self.op == '==':
+            return lambda i: infos[i] == value
+        return lambda i: infos[i] != value
+
+
+class Parser:
+    def __init__(self, text):
+        self.tokens = []
+        position = 0
+        text = text.strip()
+        while position < len(text):
+            match = TOKEN_RE.match(text, position)
+            if not match or match.end() == position:
+                raise FilterSyntaxError(f"unexpected character at {position}: {text[position:position + 10]!r}")
+            symbol, quoted, word = match.groups()
+            if symbol is not None:
+                self.tokens.append(('symbol', symbol))
+            elif quoted is not None:
+                self.tokens.append(('string', re.sub(r'\\(.)', r'\1', quoted)))
+            else:
+                self.tokens.append(('word', word))
+            position = match.end()
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if not self.tokens:
+            raise FilterSyntaxError("empty filter")
+        node = self.parse_or()
+        if self.position < len(self.tokens):
+            raise FilterSyntaxError(f"unexpected '{self.peek()[1]}'")
+        return node
+
+    def parse_or(self):
+        children = [self.parse_and()]
+        while self.peek()[1] in ('||', 'or'):
+            self.take()
+            children.append(self.parse_and())
+        return children[0] if len(children) == 1 else Or(children)
+
+    def parse_and(self):
+        children = [self.parse_not()]
+        while self.peek()[1] in ('&&', 'and'):
+            self.take()
+            children.append(self.parse_not())
+        return children[0] if len(children) == 1 else And(children)
+
+    def parse_not(self):
+        if self.peek()[1] in ('!', 'not'):
+            self.take()
+            return Not(self.parse_not())
+        return self.parse_primary()
+
+    def parse_primary(self):
+        kind, value = self.take()
+        if value == '(':
+            node = self.parse_or()
+            if self.take()[1] != ')':
+                raise FilterSyntaxError("missing ')'")
+            return node
+        if kind != 'word':
+            raise FilterSyntaxError(f"expected a field name, got '{value}'" if value else "filter ended early")
+        field = value.lower()
+        op = OPERATORS.get(self.peek()[1]) if self.peek()[0] != 'string' else None
+        if op is None:
+            return self.parse_existence(field)
+        self.take()
+        kind, operand = self.take()
+        if operand is None or kind == 'symbol':
+            raise FilterSyntaxError(f"missing value after '{field} {op}'")
+        return self.make_comparison(field, op, operand)
+
+    def parse_existence(self, field):
+        if field in PROTOCOL_NUMBERS:
+            return IpProtocolMatch(PROTOCOL_NUMBERS[field])
+        if field in PROTOCOL_LABELS:
+            return ProtocolMatch(PROTOCOL_LABELS[field])
+        if field == 'ip':
+            return IpVersionMatch(4)
+        if field == 'ipv6':
+            return IpVersionMatch(6)
+        if field.startswith('tcp.flags.') and field[10:] in TCP_FLAG_BITS:
+            return FlagMatch(TCP_FLAG_BITS[field[10:]])
+        raise FilterSyntaxError(f"unknown field or protocol '{field}'")
+
+    def make_comparison(self, field, op, operand):
+        spec = FIELDS.get(field)
+        if spec is None:
+            if field.startswith('tcp.flags.') and field[10:] in TCP_FLAG_BITS and op in ('==', '!='):
+                flag = FlagMatch(TCP_FLAG_BITS[field[10:]])
+                wanted = operand.lower() in ('1', 'true')
+                return flag if wanted == (op == '==') else Not(flag)
+            raise FilterSyntaxError(f"unknown field '{field}'")
+        kind, columns, ip_proto = spec
+        if kind == 'addr':
+            return AddressMatch(columns, op, operand)
+        if kind == 'number':
+            return NumberMatch(columns, op, operand, ip_proto)
+        if kind == 'time':
+            return TimeMatch(op, operand)
+        if kind == 'protocol':
+            if op not in ('==', '!='):
+                raise FilterSyntaxError(f"protocol only supports == and !=, not {op}")
+            return ProtocolMatch((operand.upper(),), negate=op == '!=')
+        return TextMatch(op, operand)
+
+
+class DisplayFilter:
+    def __init__(self, text):
+        self.text = text
+        self.root = Parser(text).parse()
+
+    def apply(self, columns, index):
+        # Returns the sorted packet indexes that match
+        index.update(columns)
+        rows = self.root.candidates(columns, index)
+        if rows is not None and self.root.exact:
+            return rows
+        test = self.root.predicate(columns)
+        if rows is None:
+            rows = range(len(columns.times))
+        return array('I', filter(test, rows))
+
+    def predicate(self, columns):
+        return self.root.predicate(columns)
+
+
+def compile_filter(text):
+    return DisplayFilter(text)
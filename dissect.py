@@ -0,0 +1,294 @@
+import logging
+import os
+import multiprocessing
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor
+from scapy.packet import NoPayload, Padding, Raw
+from scapy.layers.l2 import Ether, ARP
+from scapy.layers.inet import IP, TCP, UDP, ICMP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.dns import DNS
+
+SUMMARY_CHUNK_SIZE = 256
+
+
+def get_layers(packet):
+    # One pass down the payload chain instead of a haslayer() walk per test
+    layers = {}
+    layer = packet
+    while layer is not None and not isinstance(layer, NoPayload):
+        layers.setdefault(type(layer), layer)
+        layer = layer.payload
+    return layers
+
+
+def get_endpoints(packet, layers=None):
+    if layers is None:
+        layers = get_layers(packet)
+    ip = layers.get(IP) or layers.get(IPv6)
+    if ip is not None:
+        return ip.src, ip.dst
+    arp = layers.get(ARP)
+    if arp is not None:
+        return arp.psrc, arp.pdst
+    return "UNKNOWN", "UNKNOWN"
+
+
+def get_protocol_name(packet, layers=None):
+    if layers is None:
+        layers = get_layers(packet)
+    tcp = layers.get(TCP)
+    if tcp is not None:
+        if tcp.dport == 80 or tcp.sport == 80:
+            return "HTTP"
+        if tcp.dport == 443 or tcp.sport == 443:
+            return "HTTPS"
+        if tcp.dport == 53 or tcp.sport == 53:
+            return "DNS"
+        return "TCP"
+    udp = layers.get(UDP)
+    if udp is not None:
+        if udp.dport == 53 or udp.sport == 53:
+            return "DNS"
+        return "UDP"
+    if ICMP in layers:
+        return "ICMP"
+    if ARP in layers:
+        return "ARP"
+    if IPv6 in layers:
+        return "IPv6"
+    return "OTHER"
+
+
+def get_tcp_flags(tcp):
+    flags = []
+    if tcp.flags & 0x01:
+        flags.append("FIN")
+    if tcp.flags & 0x02:
+        flags.append("SYN")
+    if tcp.flags & 0x04:
+        flags.append("RST")
+    if tcp.flags & 0x08:
+        flags.append("PSH")
+    if tcp.flags & 0x10:
+        flags.append("ACK")
+    if tcp.flags & 0x20:
+        flags.append("URG")
+    return '/'.join(flags) if flags else "NONE"
+
+
+def get_packet_info(packet, layers=None):
+    if layers is None:
+        layers = get_layers(packet)
+    info = ""
+    tcp = layers.get(TCP)
+    udp = layers.get(UDP)
+    if tcp is not None:
+        info = f"TCP {tcp.sport} → {tcp.dport} [Flags: {get_tcp_flags(tcp)}]"
+        if tcp.dport == 80 or tcp.sport == 80:
+            raw = layers.get(Raw)
+            if raw is not None:
+                try:
+                    load = raw.load.decode('ascii', errors='ignore')
+                    if 'HTTP' in load:
+                        first_line = load.split('\r\n')[0]
+                        info = f"HTTP: {first_line}"
+                except Exception:
+                    pass
+    elif udp is not None:
+        info = f"UDP {udp.sport} → {udp.dport}"
+        dns = layers.get(DNS)
+        if (udp.dport == 53 or udp.sport == 53) and dns is not None:
+            if dns.qr == 0:
+                if dns.qd:
+                    info = f"DNS Query: {dns.qd.qname.decode('utf-8')}"
+            else:
+                if dns.an:
+                    info = f"DNS Response: {dns.an[0].rdata if dns.an else 'N/A'}"
+    elif ICMP in layers:
+        icmp = layers[ICMP]
+        info = f"ICMP Type: {icmp.type}, Code: {icmp.code}"
+    elif ARP in layers:
+        arp = layers[ARP]
+        if arp.op == 1:
+            info = f"ARP Who has {arp.pdst}? Tell {arp.psrc}"
+        elif arp.op == 2:
+            info = f"ARP {arp.psrc} is at {arp.hwsrc}"
+    return info
+
+
+def get_flow(packet, layers):
+    # (ip_proto, sport, dport, tcp_flags, seq, payload_offset, payload_length)
+    # for the flow table and TCP reassembly; None for non-IP frames
+    tcp = layers.get(TCP)
+    if tcp is not None:
+        header_length = (tcp.dataofs or 5) * 4
+        segment_length = len(tcp)
+        padding = layers.get(Padding)
+        payload_length = segment_length - header_length - (len(padding) if padding is not None else 0)
+        return (6, tcp.sport, tcp.dport, int(tcp.flags), tcp.seq, len(packet) - segment_length + header_length,
+                max(payload_length, 0))
+    udp = layers.get(UDP)
+    if udp is not None:
+        return (17, udp.sport, udp.dport, 0, 0, 0, 0)
+    ip = layers.get(IP)
+    if ip is not None:
+        return (ip.proto, 0, 0, 0, 0, 0, 0)
+    ipv6 = layers.get(IPv6)
+    if ipv6 is not None:
+        return (ipv6.nh, 0, 0, 0, 0, 0, 0)
+    return None
+
+
+def get_layer_ranges(packet):
+    # (start, end) byte range of each layer's own header in the frame, keyed by
+    # layer class; payload and trailing padding belong to the layers after it
+    ranges = {}
+    total = len(packet)
+    layer = packet
+    while layer is not None and not isinstance(layer, NoPayload):
+        size = len(layer)
+        start = total - size
+        ranges.setdefault(type(layer), (start, start + size - len(layer.payload)))
+        layer = layer.payload
+    return ranges
+
+
+def summarize(packet):
+    layers = get_layers(packet)
+    src, dst = get_endpoints(packet, layers)
+    return (float(packet.time), src, dst, get_protocol_name(packet, layers), len(packet),
+            get_packet_info(packet, layers), get_flow(packet, layers))
+
+
+def summarize_frame(raw, timestamp, decoder=None):
+    try:
+        packet = (decoder or Ether)(raw)
+        packet.time = timestamp
+        return summarize(packet)
+    except Exception as e:
+        return (float(timestamp), "UNKNOWN", "UNKNOWN", "OTHER", len(raw), f"Malformed packet: {e}", None)
+
+
+def summarize_frames(frames):
+    return [summarize_frame(raw, timestamp, decoder) for raw, timestamp, decoder in frames]
+
+
+def default_worker_count():
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+def worker_context():
+    # A forkserver with dissect preloaded starts each worker without a fresh
+    # scapy import; spawn where forkserver is unavailable. Both keep workers
+    # clear of the GUI's Qt and capture threads.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(['summary_worker'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+@contextmanager
+def worker_main():
+    # Workers are started from submit(); while that runs, summary_worker
+    # stands in for __main__ so they do not re-import the launching script
+    import summary_worker
+    main = sys.modules['__main__']
+    sys.modules['__main__'] = summary_worker
+    try:
+        yield
+    finally:
+        sys.modules['__main__'] = main
+
+
+class SummaryPool:
+    # Turns raw frames into table rows on a pool of worker processes. Chunks
+    # are collected strictly in submission order, so rows keep capture order
+    # no matter which worker finishes first. workers=0 summarizes inline.
+    # With `metrics`, each chunk's time from submit to finished is recorded.
+
+    def __init__(self, workers=None, chunk_size=SUMMARY_CHUNK_SIZE, metrics=None):
+        self.workers = default_worker_count() if workers is None else workers
+        self.chunk_size = chunk_size
+        self.metrics = metrics
+        self.executor = None
+        self.pending = deque()
+        self.pending_frames = 0
+
+    def start_executor(self):
+        if self.executor is None and self.workers > 0:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=worker_context())
+        return self.executor
+
+    def submit(self, frames):
+        for start in range(0, len(frames), self.chunk_size):
+            chunk = frames[start:start + self.chunk_size]
+            submitted = time.perf_counter()
+            executor = self.start_executor()
+            if executor is None:
+                future = Future()
+                future.set_result(summarize_frames(chunk))
+            else:
+                try:
+                    with worker_main():
+                        future = executor.submit(summarize_frames, chunk)
+                except RuntimeError as e:
+                    logging.error(f"Summary pool unavailable, summarizing inline: {e}")
+                    self.workers = 0
+                    self.executor = None
+                    future = Future()
+                    future.set_result(summarize_frames(chunk))
+            if self.metrics is not None:
+                future.add_done_callback(lambda f, submitted=submitted, count=len(chunk):
+                                         self.chunk_done(f, submitted, count))
+            self.pending.append((future, chunk))
+            self.pending_frames += len(chunk)
+
+    def chunk_done(self, future, submitted, count):
+        # Runs on the executor's management thread
+        if future.cancelled():
+            return
+        self.metrics.observe('dissect_seconds', time.perf_counter() - submitted)
+        self.metrics.inc('dissect_frames_total', count)
+
+    def collect(self, limit=None):
+        # Returns at most `limit` rows; the rest of a split chunk stays at the
+        # head of the queue for the next call
+        rows = []
+        while self.pending and self.pending[0][0].done():
+            room = None if limit is None else limit - len(rows)
+            if room is not None and room <= 0:
+                break
+            future, chunk = self.pending.popleft()
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Summary worker failed, summarizing chunk inline: {e}")
+                result = summarize_frames(chunk)
+            if room is not None and len(result) > room:
+                rest = Future()
+                rest.set_result(result[room:])
+                self.pending.appendleft((rest, chunk[room:]))
+                result, chunk = result[:room], chunk[:room]
+            self.pending_frames -= len(chunk)
+            rows.extend(result)
+        return rows
+
+    def backlog(self):
+        return self.pending_frames
+
+    def reset(self):
+        for future, chunk in self.pending:
+            future.cancel()
+        self.pending.clear()
+        self.pending_frames = 0
+
+    def shutdown(self):
+        self.reset()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+
+FLOW_IDLE_TIMEOUT = 120.0
+FLOW_HISTORY = 200000
+
+IPPROTO_NAMES = {1: 'ICMP', 6: 'TCP', 17: 'UDP', 58: 'ICMPv6'}
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+TCP_STATES = ('NEW', 'SYN', 'SYN-ACK', 'ESTABLISHED', 'CLOSING', 'CLOSED', 'RESET')
+STATE_NEW, STATE_SYN, STATE_SYN_ACK, STATE_ESTABLISHED, STATE_CLOSING, STATE_CLOSED, STATE_RESET = range(7)
+
+
+class Flow:
+    # One conversation. Direction "a" is whichever side sent the first packet
+    # we saw, which for TCP is normally the client.
+    __slots__ = ('proto', 'src', 'sport', 'dst', 'dport', 'packets_ab', 'packets_ba', 'bytes_ab', 'bytes_ba',
+                 'first_seen', 'last_seen', 'state', 'fins', 'active')
+
+    def __init__(self, proto, src, sport, dst, dport, timestamp):
+        self.proto = proto
+        self.src = src
+        self.sport = sport
+        self.dst = dst
+        self.dport = dport
+        self.packets_ab = self.packets_ba = 0
+        self.bytes_ab = self.bytes_ba = 0
+        self.first_seen = self.last_seen = timestamp
+        self.state = STATE_NEW
+        self.fins = 0
+        self.active = True
+
+    @property
+    def packets(self):
+        return self.packets_ab + self.packets_ba
+
+    @property
+    def bytes(self):
+        return self.bytes_ab + self.bytes_ba
+
+    @property
+    def duration(self):
+        return self.last_seen - self.first_seen
+
+    @property
+    def protocol_name(self):
+        return IPPROTO_NAMES.get(self.proto, str(self.proto))
+
+    @property
+    def state_name(self):
+        if self.proto != 6:
+            return 'ACTIVE' if self.active else 'IDLE'
+        return TCP_STATES[self.state]
+
+    def update_tcp(self, flags, forward):
+        if flags & TCP_RST:
+            self.state = STATE_RESET
+        elif flags & TCP_FIN:
+            self.fins |= 1 if forward else 2
+            self.state = STATE_CLOSED if self.fins == 3 else STATE_CLOSING
+        elif self.state >= STATE_CLOSING:
+            return
+        elif flags & TCP_SYN:
+            if flags & TCP_ACK:
+                if self.state < STATE_SYN_ACK:
+                    self.state = STATE_SYN_ACK
+            elif self.state == STATE_NEW:
+                self.state = STATE_SYN
+        elif self.state in (STATE_NEW, STATE_SYN_ACK) or (flags & TCP_ACK and self.state == STATE_SYN):
+            self.state = STATE_ESTABLISHED
+
+
+class FlowTable:
+    # Folds summary rows into per-5-tuple conversations as they arrive. Both
+    # directions share one entry. Lookups go through a dict ordered by last
+    # activity, so idle flows are evicted from the front in O(1) each; they
+    # stay listed in `flows` (oldest trimmed beyond `history`) but a later
+    # packet with the same 5-tuple starts a new conversation. Idle time is
+    # measured on packet timestamps so capture files age out the same way.
+
+    def __init__(self, idle_timeout=FLOW_IDLE_TIMEOUT, history=FLOW_HISTORY):
+        self.idle_timeout = idle_timeout
+        self.history = history
+        self.clear()
+
+    def clear(self):
+        self.active = OrderedDict()
+        self.flows = []
+        self.evicted = 0
+        # Idle flows still listed in `flows`, the only ones a trim may drop
+        self.inactive = 0
+        # Bumped when flows are dropped from `flows`
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.flows)
+
+    def update(self, rows):
+        # rows: summary tuples (time, src, dst, protocol, length, info, flow), flow
+        # starting with (ip_proto, sport, dport, tcp_flags) or None for non-IP
+        active = self.active
+        timestamp = None
+        for row in rows:
+            flow_info = row[6]
+            if flow_info is None:
+                continue
+            timestamp, src, dst, length = row[0], row[1], row[2], row[4]
+            proto, sport, dport, flags = flow_info[:4]
+            forward = (src, sport) <= (dst, dport)
+            key = (proto, src, sport, dst, dport) if forward else (proto, dst, dport, src, sport)
+            flow = active.get(key)
+            if flow is not None and proto == 6 and flow.state >= STATE_CLOSED and flags & TCP_SYN and \
+                    not flags & TCP_ACK:
+                # Port reuse after a finished connection is a new conversation
+                flow.active = False
+                self.inactive += 1
+                flow = None
+            if flow is None:
+                flow = Flow(proto, src, sport, dst, dport, timestamp)
+                self.flows.append(flow)
+                active.pop(key, None)
+                active[key] = flow
+            else:
+                active.move_to_end(key)
+            if src == flow.src and sport == flow.sport:
+                flow.packets_ab += 1
+                flow.bytes_ab += length
+                is_forward = True
+            else:
+                flow.packets_ba += 1
+                flow.bytes_ba += length
+                is_forward = False
+            if timestamp > flow.last_seen:
+                flow.last_seen = timestamp
+            if proto == 6:
+                flow.update_tcp(flags, is_forward)
+        if timestamp is not None:
+            self.expire(timestamp)
+
+    def expire(self, now):
+        active = self.active
+        cutoff = now - self.idle_timeout
+        while active:
+            key, flow = next(iter(active.items()))
+            if flow.last_seen >= cutoff:
+                break
+            del active[key]
+            flow.active = False
+            self.evicted += 1
+            self.inactive += 1
+        excess = len(self.flows) - self.history
+        if excess > 0 and self.inactive >= max(1, self.history // 10):
+            # Trim in bulk so the conversations view resets rarely: drop the
+            # oldest idle flows, wherever they sit, down to 90% of history
+            drop = min(excess + self.history // 10, self.inactive)
+            kept = []
+            for flow in self.flows:
+                if drop and not flow.active:
+                    drop -= 1
+                else:
+                    kept.append(flow)
+            self.inactive -= len(self.flows) - len(kept)
+            self.flows = kept
+            self.generation += 1
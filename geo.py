@@ -0,0 +1,506 @@
+import csv
+import ipaddress
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+PRIVATE_IP_ERROR = 'Private or invalid IP'
+RATE_LIMIT_ERROR = 'Too Many Requests'
+GEO_WORKERS = 4
+GEO_RATE = 5.0  # requests per second across all geo workers
+GEO_BURST = 10
+GEO_CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                              'sniffmapper', 'geo_cache.sqlite')
+GEO_CACHE_SIZE = 16384
+GEO_CACHE_TTL = 7 * 24 * 3600
+GEO_ERROR_TTL = 300
+GEO_PRIVATE_TTL = 30 * 24 * 3600
+GEO_DB_ENV = 'SNIFFMAPPER_GEO_DB'
+OFFLINE_MISS_ERROR = 'Not in offline database'
+
+# Header aliases accepted by OfflineGeoDB for CSV range files
+GEO_DB_COLUMNS = {
+    'start': ('start_ip', 'ip_start', 'ip_from', 'range_start', 'first_ip'),
+    'end': ('end_ip', 'ip_end', 'ip_to', 'range_end', 'last_ip'),
+    'network': ('network', 'cidr', 'prefix'),
+    'city': ('city', 'city_name'),
+    'region': ('region', 'region_name', 'state', 'stateprov', 'subdivision'),
+    'country': ('country', 'country_code', 'country_iso_code'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lon', 'lng'),
+    'org': ('org', 'organization', 'isp', 'asn_org'),
+    'postal': ('postal', 'postal_code', 'zip', 'zip_code'),
+    'timezone': ('timezone', 'time_zone'),
+}
+# Column order of header-less files (the DB-IP "city lite" layout)
+GEO_DB_HEADERLESS = ('start', 'end', 'continent', 'country', 'region', 'city', 'latitude', 'longitude')
+
+
+def is_private_ip(ip):
+    try:
+        ip_obj = ipaddress.ip_address(ip)
+        return ip_obj.is_private
+    except ValueError:
+        return True
+
+
+def get_geolocation(ip, session=None, limiter=None):
+    if not ip or is_private_ip(ip):
+        logging.info(f"Skipping geolocation for IP {ip}: Private or invalid IP")
+        return {'ip': ip, 'error': PRIVATE_IP_ERROR}
+
+    # requests costs ~100 ms to import; only pay for it once a lookup happens
+    import requests
+    http = session or requests
+    logging.info(f"Requesting geolocation for {ip}")
+    max_retries = 3
+    for attempt in range(max_retries):
+        response = None
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = http.get(f"https://ipinfo.io/{ip}/json", timeout=5)
+            response.raise_for_status()
+            data = response.json()
+
+            loc = data.get('loc', '')
+            latitude = longitude = 'N/A'
+            if loc:
+                latitude, longitude = loc.split(',')
+
+            geo_data = {
+                'ip': data.get('ip', 'Unknown'),
+                'city': data.get('city', 'Unknown'),
+                'region': data.get('region', 'Unknown'),
+                'country': data.get('country', 'Unknown'),
+                'latitude': latitude,
+                'longitude': longitude,
+                'org': data.get('org', 'Unknown'),
+                'postal': data.get('postal', ''),
+                'timezone': data.get('timezone', '')
+            }
+            logging.info(f"Successfully fetched geolocation for {ip}")
+            return geo_data
+        except requests.HTTPError as e:
+            if response is not None and response.status_code == 429:
+                if attempt < max_retries - 1:
+                    wait_time = (2 ** attempt) * 5
+                    retry_after = response.headers.get('Retry-After', '')
+                    if retry_after.isdigit():
+                        wait_time = max(wait_time, int(retry_after))
+                    logging.warning(f"Rate limit hit for {ip}, retry after {wait_time}s")
+                    if limiter is not None:
+                        # Pause every worker sharing the limiter, not just this one
+                        limiter.backoff(wait_time)
+                    else:
+                        time.sleep(wait_time)
+                    continue
+                logging.error(f"Max retries for {ip}: Too Many Requests")
+                return {'ip': ip, 'error': RATE_LIMIT_ERROR}
+            logging.error(f"HTTP error for {ip}: {e}")
+            return {'ip': ip, 'error': str(e)}
+        except requests.RequestException as e:
+            logging.error(f"Error fetching geolocation for {ip}: {e}")
+            return {'ip': ip, 'error': str(e)}
+        except ValueError as e:
+            logging.error(f"Malformed geolocation response for {ip}: {e}")
+            return {'ip': ip, 'error': str(e)}
+
+
+def parse_ip_int(value):
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    return int(ipaddress.ip_address(value))
+
+
+class OfflineGeoDB:
+    # Local IP-range -> location lookups. CSV files are loaded into sorted
+    # range starts/ends with a location id per range, one index per address
+    # family, and answered with a bisect. Identical locations are shared, so
+    # millions of ranges cost a few bytes each. .mmdb files are read through
+    # the optional maxminddb package.
+
+    def __init__(self, path):
+        self.path = path
+        self.loaded = False
+        self.lock = threading.Lock()
+        self.reader = None
+        self.locations = []
+        self.v4_starts = array('I')
+        self.v4_ends = array('I')
+        self.v4_ids = array('I')
+        self.v6_starts = []
+        self.v6_ends = []
+        self.v6_ids = array('I')
+
+    def load(self):
+        with self.lock:
+            if self.loaded:
+                return
+            started = time.perf_counter()
+            if self.path.endswith('.mmdb'):
+                import maxminddb
+                self.reader = maxminddb.open_database(self.path)
+            else:
+                self.load_csv()
+            self.loaded = True
+            logging.info(f"Loaded offline geolocation database {self.path} "
+                         f"({len(self.v4_starts)} IPv4 / {len(self.v6_starts)} IPv6 ranges) "
+                         f"in {time.perf_counter() - started:.2f}s")
+
+    def load_csv(self):
+        location_ids = {}
+        v4, v6 = [], []
+        with open(self.path, newline='', encoding='utf-8', errors='replace') as f:
+            rows = csv.reader(f)
+            first = next(rows, None)
+            if first is None:
+                return
+            columns = self.map_columns(first)
+            if columns is None:
+                columns = {name: i for i, name in enumerate(GEO_DB_HEADERLESS)}
+                rows = self.chain_first(first, rows)
+            for row in rows:
+                try:
+                    start, end = self.row_range(row, columns)
+                except (ValueError, IndexError):
+                    continue
+                location = tuple(self.row_field(row, columns, field)
+                                 for field in ('city', 'region', 'country', 'latitude', 'longitude',
+                                               'org', 'postal', 'timezone'))
+                location_id = location_ids.get(location)
+                if location_id is None:
+                    location_id = len(self.locations)
+                    self.locations.append(location)
+                    location_ids[location] = location_id
+                (v4 if end <= 0xFFFFFFFF and not self.is_v6(row, columns) else v6).append((start, end, location_id))
+        v4.sort()
+        v6.sort()
+        for start, end, location_id in v4:
+            self.v4_starts.append(start)
+            self.v4_ends.append(end)
+            self.v4_ids.append(location_id)
+        for start, end, location_id in v6:
+            self.v6_starts.append(start)
+            self.v6_ends.append(end)
+            self.v6_ids.append(location_id)
+
+    def chain_first(self, first, rows):
+        yield first
+        yield from rows
+
+    def map_columns(self, header):
+        names = [name.strip().lower() for name in header]
+        columns = {}
+        for field, aliases in GEO_DB_COLUMNS.items():
+            for alias in aliases:
+                if alias in names:
+                    columns[field] = names.index(alias)
+                    break
+        if 'network' in columns or ('start' in columns and 'end' in columns):
+            return columns
+        return None
+
+    def is_v6(self, row, columns):
+        if 'network' in columns:
+            return ':' in row[columns['network']]
+        return ':' in row[columns['start']]
+
+    def row_range(self, row, columns):
+        if 'network' in columns:
+            network = ipaddress.ip_network(row[columns['network']].strip(), strict=False)
+            return int(network.network_address), int(network.broadcast_address)
+        return parse_ip_int(row[columns['start']]), parse_ip_int(row[columns['end']])
+
+    def row_field(self, row, columns, field):
+        index = columns.get(field)
+        if index is None or index >= len(row):
+            return ''
+        return row[index].strip()
+
+    def lookup_range(self, address):
+        value = int(address)
+        if address.version == 4:
+            starts, ends, ids = self.v4_starts, self.v4_ends, self.v4_ids
+        else:
+            starts, ends, ids = self.v6_starts, self.v6_ends, self.v6_ids
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return self.locations[ids[i]]
+        return None
+
+    def lookup_mmdb(self, ip):
+        record = self.reader.get(ip)
+        if not record:
+            return None
+        location = record.get('location', {})
+        subdivisions = record.get('subdivisions') or [{}]
+        return (
+            record.get('city', {}).get('names', {}).get('en', ''),
+            subdivisions[0].get('names', {}).get('en', ''),
+            record.get('country', {}).get('iso_code', ''),
+            str(location.get('latitude', '')),
+            str(location.get('longitude', '')),
+            record.get('autonomous_system_organization', ''),
+            record.get('postal', {}).get('code', ''),
+            location.get('time_zone', '')
+        )
+
+    def lookup(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return {'ip': ip, 'error': PRIVATE_IP_ERROR}
+        if address.is_private:
+            return {'ip': ip, 'error': PRIVATE_IP_ERROR}
+        if not self.loaded:
+            self.load()
+        location = self.lookup_mmdb(ip) if self.reader is not None else self.lookup_range(address)
+        if location is None:
+            return {'ip': ip, 'error': OFFLINE_MISS_ERROR}
+        city, region, country, latitude, longitude, org, postal, timezone = location
+        return {
+            'ip': ip,
+            'city': city or 'Unknown',
+            'region': region or 'Unknown',
+            'country': country or 'Unknown',
+            'latitude': latitude or 'N/A',
+            'longitude': longitude or 'N/A',
+            'org': org or 'Unknown',
+            'postal': postal,
+            'timezone': timezone
+        }
+
+
+class GeoCache:
+    # Two tiers: an in-memory LRU consulted on the caller's thread and a SQLite
+    # table that survives restarts. Failed lookups are cached for a short TTL
+    # so a flaky or rate-limited API is not hammered; private addresses never
+    # leave memory since recomputing them is free after a restart.
+
+    def __init__(self, path=GEO_CACHE_PATH, capacity=GEO_CACHE_SIZE, ttl=GEO_CACHE_TTL,
+                 error_ttl=GEO_ERROR_TTL, private_ttl=GEO_PRIVATE_TTL):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.private_ttl = private_ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.db = sqlite3.connect(path, check_same_thread=False)
+                self.db.execute("CREATE TABLE IF NOT EXISTS geo (ip TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)")
+                self.db.execute("DELETE FROM geo WHERE expires < ?", (time.time(),))
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Geolocation cache at {path} unavailable, using memory only: {e}")
+                self.db = None
+
+    def remember(self, ip, data, expires):
+        self.memory[ip] = (expires, data)
+        self.memory.move_to_end(ip)
+        while len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def get_memory(self, ip):
+        with self.lock:
+            entry = self.memory.get(ip)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self.memory[ip]
+                return None
+            self.memory.move_to_end(ip)
+            self.hits += 1
+            return entry[1]
+
+    def get_disk(self, ip):
+        if self.db is None:
+            return None
+        with self.lock:
+            try:
+                row = self.db.execute("SELECT data, expires FROM geo WHERE ip = ? AND expires >= ?",
+                                      (ip, time.time())).fetchone()
+            except sqlite3.Error as e:
+                logging.error(f"Geolocation cache read failed for {ip}: {e}")
+                return None
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            self.remember(ip, data, row[1])
+            self.disk_hits += 1
+            return data
+
+    def get(self, ip):
+        data = self.get_memory(ip)
+        if data is None:
+            data = self.get_disk(ip)
+        return data
+
+    def put(self, ip, data):
+        error = data.get('error')
+        if error == PRIVATE_IP_ERROR:
+            expires = time.time() + self.private_ttl
+        elif error:
+            expires = time.time() + self.error_ttl
+        else:
+            expires = time.time() + self.ttl
+        with self.lock:
+            self.misses += 1
+            self.remember(ip, data, expires)
+            if self.db is None or error == PRIVATE_IP_ERROR:
+                return
+            try:
+                self.db.execute("INSERT OR REPLACE INTO geo (ip, data, expires) VALUES (?, ?, ?)",
+                                (ip, json.dumps(data), expires))
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Geolocation cache write failed for {ip}: {e}")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'memory_hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self.memory)
+            }
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+class TokenBucket:
+    # Shared request budget for the geo workers: steady rate with a small
+    # burst, plus a global pause when the API answers 429.
+
+    def __init__(self, rate=GEO_RATE, burst=GEO_BURST):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self, seconds):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class GeoResolver:
+    # Runs lookups on a small thread pool. Concurrent requests for the same IP
+    # share one future, so a burst of clicks costs a single API call. With a
+    # cache, memory hits are answered immediately without a thread hop. The
+    # default online lookup shares one keep-alive session and rate limiter.
+    # With `metrics`, lookups that miss the memory cache are counted and timed.
+
+    def __init__(self, lookup=None, workers=GEO_WORKERS, cache=None, metrics=None):
+        self.session = None
+        self.workers = workers
+        self.metrics = metrics
+        if lookup is None:
+            self.limiter = TokenBucket()
+            lookup = self.online_lookup
+        else:
+            self.limiter = None
+        self.lookup_func = lookup
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='geo')
+        self.inflight = {}
+        self.lock = threading.RLock()
+
+    def online_lookup(self, ip):
+        with self.lock:
+            if self.session is None:
+                import requests
+                self.session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)
+                self.session.mount('https://', adapter)
+        return get_geolocation(ip, self.session, self.limiter)
+
+    def resolve(self, ip):
+        started = time.perf_counter()
+        if self.cache is None:
+            data = self.lookup_func(ip)
+        else:
+            data = self.cache.get_disk(ip)
+            if data is None:
+                data = self.lookup_func(ip)
+                self.cache.put(ip, data)
+        if self.metrics is not None:
+            self.metrics.observe('geo_lookup_seconds', time.perf_counter() - started)
+            self.metrics.inc('geo_lookups_total')
+        return data
+
+    def lookup(self, ip):
+        if self.cache is not None:
+            data = self.cache.get_memory(ip)
+            if data is not None:
+                future = Future()
+                future.set_result(data)
+                return future
+        with self.lock:
+            future = self.inflight.get(ip)
+            if future is None:
+                future = self.executor.submit(self.resolve, ip)
+                self.inflight[ip] = future
+                future.add_done_callback(lambda f, ip=ip: self.finished(ip, f))
+        return future
+
+    def finished(self, ip, future):
+        with self.lock:
+            if self.inflight.get(ip) is future:
+                del self.inflight[ip]
+
+    def pending(self):
+        with self.lock:
+            return len(self.inflight)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.session is not None:
+            self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+
+def create_geo_resolver(metrics=None):
+    # Sensors without Internet access point SNIFFMAPPER_GEO_DB at a local
+    # range database; everyone else goes through the cached ipinfo.io path.
+    path = os.environ.get(GEO_DB_ENV)
+    if path:
+        return GeoResolver(lookup=OfflineGeoDB(path).lookup, metrics=metrics)
+    return GeoResolver(cache=GeoCache(), metrics=metrics)
+
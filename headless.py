@@ -0,0 +1,348 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import wait
+from datetime import datetime
+from capture import (CAPTURE_ENGINES, RingCapture, CaptureFileReader, PcapngWriter, copy_block,
+                     interface_decoder, linktype_decoder)
+from dissect import SummaryPool
+from reassembly import TcpReassembler
+
+# Scripted capture without the GUI: no Qt, no QtWebEngine and only the Scapy
+# layers the summaries need, so it starts quickly and stays small on servers.
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+POLL_SECONDS = 0.2
+# A capture file is read faster than it is summarized; at most this many
+# chunks wait in the queue, and reading pauses while the summary backlog is full
+FILE_QUEUE_CHUNKS = 16
+SUMMARY_BACKLOG_FRAMES = 65536
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless CyberTech packet capture")
+    parser.add_argument('-i', '--interface', help="interface to capture on")
+    parser.add_argument('-f', '--filter', default="ip or ip6", help="BPF capture filter (default: %(default)s)")
+    parser.add_argument('-d', '--duration', type=float, help="stop after this many seconds")
+    parser.add_argument('-c', '--count', type=int, help="stop after this many packets")
+    parser.add_argument('-r', '--read', metavar='FILE', help="summarize a pcap/pcapng file instead of capturing")
+    parser.add_argument('-o', '--output', metavar='FILE', help="write summaries here instead of stdout")
+    parser.add_argument('-w', '--write', metavar='DIR', help="also record captured frames as rotating pcapng files")
+    parser.add_argument('--format', choices=('text', 'csv', 'jsonl'), default='text', help="summary format")
+    parser.add_argument('--engine', choices=sorted(CAPTURE_ENGINES),
+                        default='tpacket_v3' if 'tpacket_v3' in CAPTURE_ENGINES else 'scapy')
+    parser.add_argument('--workers', type=int, default=0,
+                        help="summary worker processes (default: summarize in this process)")
+    parser.add_argument('--geo', action='store_true', help="geolocate public endpoints as they appear")
+    parser.add_argument('--stats', action='store_true',
+                        help="print protocol, endpoint and port totals to stderr at the end (needs numpy)")
+    args = parser.parse_args(argv)
+    if not args.read and not args.interface:
+        parser.error("an interface (-i) or a capture file (-r) is required")
+    if args.stats:
+        # numpy is only imported when statistics are asked for
+        from columnar import numpy_available
+        if not numpy_available():
+            parser.error("--stats needs numpy")
+    return args
+
+
+class SummaryOutput:
+    def __init__(self, stream, fmt):
+        self.stream = stream
+        self.format = fmt
+        self.lock = threading.Lock()
+        self.closed = False
+        self.csv = csv.writer(stream) if fmt == 'csv' else None
+        if self.csv:
+            self.csv.writerow(['time', 'src', 'dst', 'protocol', 'length', 'info'])
+
+    def broken_pipe(self):
+        # The reader went away (e.g. piped into head): stop quietly
+        self.closed = True
+        os.dup2(os.open(os.devnull, os.O_WRONLY), self.stream.fileno())
+
+    def write_rows(self, rows):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.write_summaries(rows)
+            except BrokenPipeError:
+                self.broken_pipe()
+
+    def write_summaries(self, rows):
+        for timestamp, src, dst, protocol, length, info, _ in rows:
+            if self.format == 'csv':
+                self.csv.writerow([f"{timestamp:.6f}", src, dst, protocol, length, info])
+            elif self.format == 'jsonl':
+                self.stream.write(json.dumps({'time': timestamp, 'src': src, 'dst': dst, 'protocol': protocol,
+                                              'length': length, 'info': info}) + '\n')
+            else:
+                time_str = datetime.fromtimestamp(timestamp).strftime('%H:%M:%S.%f')[:-3]
+                self.stream.write(f"{time_str} {src} -> {dst} {protocol} {length} {info}\n")
+        self.stream.flush()
+
+    def write_geo(self, geo_data):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                if self.format == 'jsonl':
+                    self.stream.write(json.dumps({'geo': geo_data}) + '\n')
+                elif 'error' in geo_data:
+                    self.stream.write(f"# GEO {geo_data['ip']}: ERROR: {geo_data['error']}\n")
+                else:
+                    self.stream.write(f"# GEO {geo_data['ip']}: {geo_data['city']}, {geo_data['region']}, "
+                                      f"{geo_data['country']} ({geo_data['latitude']}, {geo_data['longitude']}) "
+                                      f"{geo_data['org']}\n")
+                self.stream.flush()
+            except BrokenPipeError:
+                self.broken_pipe()
+
+
+class EndpointGeolocator:
+    def __init__(self, output):
+        from geo import create_geo_resolver, is_private_ip
+        self.resolver = create_geo_resolver()
+        self.is_private_ip = is_private_ip
+        self.output = output
+        self.seen = set()
+        self.futures = []
+
+    def observe(self, rows):
+        for row in rows:
+            for ip in (row[1], row[2]):
+                if ip in self.seen:
+                    continue
+                self.seen.add(ip)
+                if self.is_private_ip(ip):
+                    continue
+                future = self.resolver.lookup(ip)
+                future.add_done_callback(self.done)
+                self.futures.append(future)
+
+    def done(self, future):
+        try:
+            self.output.write_geo(future.result())
+        except Exception as e:
+            logging.error(f"Geolocation failed: {e}")
+
+    def close(self):
+        wait(self.futures)
+        self.resolver.shutdown()
+
+
+def print_stats(columnar, top=10):
+    out = sys.stderr
+    out.write("\nPROTOCOLS\n")
+    for protocol, packets, volume in columnar.counts_by_protocol():
+        out.write(f"  {protocol:<8} {packets:>10} pkts {volume:>14} bytes\n")
+    out.write("TOP ENDPOINTS\n")
+    for endpoint, sent, received, packets in columnar.bytes_per_endpoint(top=top):
+        out.write(f"  {endpoint:<40} {sent:>12} sent {received:>12} received {packets:>10} pkts\n")
+    out.write("TOP DESTINATION PORTS\n")
+    for port, packets in columnar.top_ports(top=top):
+        out.write(f"  {port:<8} {packets:>10} pkts\n")
+    starts, packets, volume = columnar.rates()
+    if len(packets):
+        out.write(f"RATE  peak {int(packets.max())} pkts/s, mean {packets.mean():.1f} pkts/s, "
+                  f"peak {int(volume.max())} bytes/s over {len(packets)} s\n")
+
+
+def put_until_stopped(frames, item, stop_event):
+    while not stop_event.is_set():
+        try:
+            frames.put(item, timeout=POLL_SECONDS)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def read_capture_file(path, frames, stop_event):
+    reader = CaptureFileReader(path)
+    decoders = {}
+    try:
+        for chunk in reader.chunks():
+            if stop_event.is_set():
+                break
+            batch = []
+            for offset, length, timestamp, linktype in chunk:
+                decoder = decoders.get(linktype)
+                if decoder is None:
+                    decoder = decoders[linktype] = linktype_decoder(linktype)
+                batch.append((reader.data[offset:offset + length], timestamp, None, decoder))
+            if not put_until_stopped(frames, batch, stop_event):
+                break
+    finally:
+        reader.close()
+        put_until_stopped(frames, None, stop_event)
+
+
+def capture_ring(args, frames, stop_event, writer, stats):
+    decoder = interface_decoder(args.interface)
+
+    def handler(view, block_frames):
+        batch = copy_block(view, block_frames, args.interface, decoder)
+        if writer:
+            writer.submit([(raw, timestamp, decoder) for raw, timestamp, _, decoder in batch])
+        frames.put(batch)
+
+    try:
+        with RingCapture(args.interface, args.filter) as ring:
+            ring.run(handler, stop_event.is_set)
+            stats['received'], stats['dropped'] = ring.kernel_stats()
+    except Exception as e:
+        logging.error(f"Sniffing error: {e}")
+    finally:
+        frames.put(None)
+
+
+def start_capture(args, frames, stop_event, writer, stats):
+    if args.read:
+        thread = threading.Thread(target=read_capture_file, args=(args.read, frames, stop_event), daemon=True)
+    elif args.engine == 'tpacket_v3':
+        thread = threading.Thread(target=capture_ring, args=(args, frames, stop_event, writer, stats), daemon=True)
+    else:
+        from scapy.sendrecv import AsyncSniffer
+
+        def handler(packet):
+            raw = getattr(packet, 'original', None) or bytes(packet)
+            if writer:
+                writer.submit([(raw, packet.time, type(packet))])
+            frames.put([(raw, packet.time, args.interface, type(packet))])
+
+        sniffer = AsyncSniffer(iface=args.interface, filter=args.filter or None, prn=handler, store=False)
+        sniffer.start()
+        return sniffer
+    thread.start()
+    return thread
+
+
+def stop_capture(capture):
+    if hasattr(capture, 'stop'):
+        try:
+            capture.stop()
+        except Exception as e:
+            logging.error(f"Sniffing error: {e}")
+    else:
+        capture.join()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.read and os.geteuid() != 0:
+        logging.error("Packet sniffing requires root privileges or the CAP_NET_RAW capability")
+        return 1
+
+    stream = open(args.output, 'w', newline='') if args.output else sys.stdout
+    output = SummaryOutput(stream, args.format)
+    geolocator = EndpointGeolocator(output) if args.geo else None
+    writer = PcapngWriter(args.write) if args.write and not args.read else None
+    if writer:
+        writer.start()
+
+    frames = queue.Queue(maxsize=FILE_QUEUE_CHUNKS) if args.read else queue.Queue()
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+
+    pool = SummaryPool(workers=args.workers)
+    reassembler = TcpReassembler()
+    columnar = None
+    if args.stats:
+        from columnar import ColumnarStore
+        columnar = ColumnarStore()
+    # Frame bytes in submission order, so collected rows can be matched back up
+    # with their payloads for TCP reassembly
+    pending_frames = deque()
+
+    def collect_rows():
+        rows = pool.collect()
+        frames_for_rows = [pending_frames.popleft() for _ in rows]
+        return reassembler.process(rows, frames_for_rows.__getitem__)
+
+    stats = {'received': 0, 'dropped': 0}
+    started = time.monotonic()
+    capture = start_capture(args, frames, stop_event, writer, stats)
+    deadline = started + args.duration if args.duration else None
+    summarized = 0
+    source_done = False
+
+    def emit_rows(rows):
+        # Everything summarized goes through here, so --count, --geo and
+        # --stats see the same rows as the output
+        nonlocal summarized
+        if args.count:
+            rows = rows[:max(0, args.count - summarized)]
+        if not rows:
+            return
+        summarized += len(rows)
+        output.write_rows(rows)
+        if geolocator:
+            geolocator.observe(rows)
+        if columnar is not None:
+            columnar.append_rows(rows)
+
+    try:
+        while True:
+            if deadline and time.monotonic() >= deadline:
+                stop_event.set()
+            if args.count and summarized >= args.count or output.closed:
+                stop_event.set()
+            if stop_event.is_set():
+                break
+            if args.read and pool.backlog() >= SUMMARY_BACKLOG_FRAMES:
+                # Let the workers catch up before taking more of the file
+                time.sleep(0.01)
+                batch = []
+            else:
+                try:
+                    batch = frames.get(timeout=POLL_SECONDS)
+                except queue.Empty:
+                    batch = []
+            if batch is None:
+                source_done = True
+            elif batch:
+                if args.count:
+                    batch = batch[:args.count - summarized - pool.backlog()]
+                batch = [(bytes(raw), timestamp, decoder) for raw, timestamp, _, decoder in batch]
+                pending_frames.extend(raw for raw, _, _ in batch)
+                pool.submit(batch)
+            emit_rows(collect_rows())
+            if source_done and not pool.backlog():
+                break
+    finally:
+        stop_event.set()
+        stop_capture(capture)
+        while pool.backlog() and not (args.count and summarized >= args.count):
+            emit_rows(collect_rows())
+            time.sleep(0.01)
+        pool.shutdown()
+        if writer:
+            writer.close()
+        if geolocator:
+            geolocator.close()
+        if stream is not sys.stdout:
+            stream.close()
+
+    if columnar is not None:
+        print_stats(columnar)
+    elapsed = time.monotonic() - started
+    logging.info(f"{summarized} packets in {elapsed:.1f}s ({summarized / elapsed if elapsed else 0:.0f} pps), "
+                 f"{stats['dropped']} kernel drops")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
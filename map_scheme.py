@@ -0,0 +1,96 @@
+import logging
+import mimetypes
+
+from PyQt5.QtCore import QBuffer, QFile, QIODevice, QObject, pyqtSignal
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestJob, QWebEngineUrlScheme, QWebEngineUrlSchemeHandler
+
+from map_tiles import asset_path
+
+MAP_SCHEME = b'sniffmapper'
+QWEBCHANNEL_RESOURCE = ':/qtwebchannel/qwebchannel.js'
+
+
+def register_map_scheme():
+    # Must run before the QApplication is created
+    scheme = QWebEngineUrlScheme(MAP_SCHEME)
+    scheme.setSyntax(QWebEngineUrlScheme.Syntax.Host)
+    scheme.setFlags(QWebEngineUrlScheme.SecureScheme | QWebEngineUrlScheme.LocalAccessAllowed |
+                    QWebEngineUrlScheme.CorsEnabled)
+    QWebEngineUrlScheme.registerScheme(scheme)
+
+
+class TileRelay(QObject):
+    # Carries finished tile downloads from the tile workers to the GUI thread
+    ready = pyqtSignal(object, object)
+
+
+class MapSchemeHandler(QWebEngineUrlSchemeHandler):
+    # Serves the map page from memory: sniffmapper://app/ is the page, the
+    # bundled Leaflet files and qwebchannel.js; sniffmapper://tiles/z/x/y.png
+    # comes from the tile cache. Nothing is loaded from the network.
+
+    def __init__(self, html, tile_cache, parent=None):
+        super().__init__(parent)
+        self.html = html.encode('utf-8')
+        self.tile_cache = tile_cache
+        self.relay = TileRelay(self)
+        self.relay.ready.connect(self.reply_tile)
+
+    def requestStarted(self, job):
+        url = job.requestUrl()
+        host, path = url.host(), url.path()
+        if host == 'tiles':
+            self.serve_tile(job, path)
+        elif path in ('', '/', '/map.html'):
+            self.reply(job, b'text/html', self.html)
+        elif path == '/qwebchannel.js':
+            resource = QFile(QWEBCHANNEL_RESOURCE)
+            if resource.open(QIODevice.ReadOnly):
+                self.reply(job, b'application/javascript', bytes(resource.readAll()))
+            else:
+                job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+        elif path.startswith('/leaflet/'):
+            name = path[len('/leaflet/'):]
+            local = asset_path(name)
+            if local is not None:
+                with open(local, 'rb') as f:
+                    mime = mimetypes.guess_type(local)[0] or 'application/octet-stream'
+                    self.reply(job, mime.encode('ascii'), f.read())
+            else:
+                logging.error(f"Bundled Leaflet file {name} not found")
+                job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+        else:
+            job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+
+    def serve_tile(self, job, path):
+        try:
+            z, x, y = (int(part) for part in path.strip('/').rsplit('.', 1)[0].split('/'))
+        except ValueError:
+            job.fail(QWebEngineUrlRequestJob.UrlInvalid)
+            return
+        future = self.tile_cache.fetch(z, x, y)
+        if future.done():
+            self.reply_tile(job, self.tile_result(future))
+        else:
+            future.add_done_callback(lambda f, job=job: self.relay.ready.emit(job, self.tile_result(f)))
+
+    def tile_result(self, future):
+        if future.cancelled() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def reply_tile(self, job, data):
+        try:
+            if data is None:
+                job.fail(QWebEngineUrlRequestJob.UrlNotFound)
+            else:
+                self.reply(job, b'image/png', data)
+        except RuntimeError:
+            # The page dropped the request (zoomed or panned away) before the tile arrived
+            pass
+
+    def reply(self, job, mime, data):
+        buffer = QBuffer(job)
+        buffer.setData(data)
+        buffer.open(QIODevice.ReadOnly)
+        job.reply(mime, buffer)
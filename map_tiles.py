@@ -0,0 +1,252 @@
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from geo import TokenBucket
+
+TILE_URL = 'https://tile.openstreetmap.org/{z}/{x}/{y}.png'
+TILE_CACHE_PATH = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+                               'sniffmapper', 'tiles.mbtiles')
+TILE_DB_ENV = 'SNIFFMAPPER_TILES'
+# Operators point these at a tile server whose usage policy allows bulk
+# downloads; the OpenStreetMap servers only allow tiles a user is looking at
+TILE_URL_ENV = 'SNIFFMAPPER_TILE_URL'
+TILE_PREFETCH_ENV = 'SNIFFMAPPER_TILE_PREFETCH'
+TILE_WORKERS = 2
+TILE_RATE = 4.0  # tile server requests per second, shared with prefetching
+TILE_BURST = 8
+TILE_TIMEOUT = 10
+TILE_USER_AGENT = 'SniffMapper/1.0 (tile cache)'
+PREFETCH_MAX_ZOOM = 6
+# After a connection failure the tile server is not retried for this long
+OFFLINE_RETRY = 60.0
+
+# Leaflet 1.9.4 (BSD-2-Clause), checked in from its release's dist/ directory
+ASSET_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map_assets', 'leaflet')
+
+
+def tile_count(max_zoom):
+    return sum(4 ** z for z in range(max_zoom + 1))
+
+
+def asset_path(name, root=ASSET_DIR):
+    # Resolves a request path below the asset directory, refusing anything outside it
+    path = os.path.normpath(os.path.join(root, name.lstrip('/')))
+    if not path.startswith(os.path.normpath(root) + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+
+class TileStore:
+    # An MBTiles file: SQLite with a `tiles` table in TMS row order plus a
+    # `metadata` table, so caches built here open in other MBTiles tools and
+    # prebuilt MBTiles files can be dropped in for offline sensors.
+
+    def __init__(self, path=TILE_CACHE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = None
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, "
+                            "tile_row INTEGER, tile_data BLOB)")
+            self.db.execute("CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)")
+            if self.db.execute("SELECT COUNT(*) FROM metadata").fetchone()[0] == 0:
+                self.db.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)",
+                                    [('name', 'SniffMapper tile cache'), ('format', 'png'), ('type', 'baselayer'),
+                                     ('attribution', '&copy; OpenStreetMap contributors')])
+            self.db.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Tile cache at {path} unavailable: {e}")
+            self.db = None
+
+    def get(self, z, x, y):
+        if self.db is None:
+            return None
+        with self.lock:
+            try:
+                row = self.db.execute("SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? "
+                                      "AND tile_row = ?", (z, x, (1 << z) - 1 - y)).fetchone()
+            except sqlite3.Error as e:
+                logging.error(f"Tile cache read failed for {z}/{x}/{y}: {e}")
+                return None
+        return None if row is None else bytes(row[0])
+
+    def put(self, z, x, y, data):
+        if self.db is None:
+            return
+        with self.lock:
+            try:
+                self.db.execute("INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) "
+                                "VALUES (?, ?, ?, ?)", (z, x, (1 << z) - 1 - y, sqlite3.Binary(data)))
+                self.db.commit()
+            except sqlite3.Error as e:
+                logging.error(f"Tile cache write failed for {z}/{x}/{y}: {e}")
+
+    def existing(self, max_zoom):
+        # (z, x, y) of every stored tile up to max_zoom
+        if self.db is None:
+            return set()
+        with self.lock:
+            rows = self.db.execute("SELECT zoom_level, tile_column, tile_row FROM tiles WHERE zoom_level <= ?",
+                                   (max_zoom,)).fetchall()
+        return {(z, x, (1 << z) - 1 - row) for z, x, row in rows}
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
+class TileCache:
+    # Answers tile requests from the MBTiles store and downloads misses on a
+    # small pool, writing them back. Concurrent requests for one tile share a
+    # future. After a connection failure the server is left alone for a
+    # minute, so an isolated sensor gets instant blanks instead of timeouts.
+    # Prefetching runs on its own thread through the same rate limiter.
+
+    def __init__(self, store, url=TILE_URL, workers=TILE_WORKERS, online=True):
+        self.store = store
+        self.url = url
+        self.workers = workers
+        self.online = online
+        self.offline_until = 0.0
+        self.limiter = TokenBucket(TILE_RATE, TILE_BURST)
+        self.session = None
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tiles')
+        self.inflight = {}
+        self.lock = threading.RLock()
+        self.stop_prefetch = threading.Event()
+        self.prefetch_thread = None
+
+    def reachable(self):
+        return self.online and time.monotonic() >= self.offline_until
+
+    def download(self, z, x, y):
+        if not self.reachable():
+            return None
+        import requests
+        with self.lock:
+            if self.session is None:
+                self.session = requests.Session()
+                self.session.headers['User-Agent'] = TILE_USER_AGENT
+        self.limiter.acquire()
+        try:
+            response = self.session.get(self.url.format(z=z, x=x, y=y), timeout=TILE_TIMEOUT)
+            response.raise_for_status()
+        except requests.ConnectionError as e:
+            logging.warning(f"Tile server unreachable, serving cached tiles only: {e}")
+            self.offline_until = time.monotonic() + OFFLINE_RETRY
+            return None
+        except requests.RequestException as e:
+            logging.error(f"Tile download failed for {z}/{x}/{y}: {e}")
+            return None
+        self.store.put(z, x, y, response.content)
+        return response.content
+
+    def fetch(self, z, x, y):
+        # Future for the tile bytes (None when unavailable); cached tiles resolve immediately
+        data = self.store.get(z, x, y)
+        if data is not None or not self.reachable():
+            future = Future()
+            future.set_result(data)
+            return future
+        key = (z, x, y)
+        with self.lock:
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.executor.submit(self.download, z, x, y)
+                self.inflight[key] = future
+                future.add_done_callback(lambda f, key=key: self.finished(key, f))
+        return future
+
+    def finished(self, key, future):
+        with self.lock:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+
+    def prefetch(self, max_zoom=PREFETCH_MAX_ZOOM):
+        # Fills in missing tiles for zoom 0..max_zoom in the background
+        if not self.online or (self.prefetch_thread is not None and self.prefetch_thread.is_alive()):
+            return
+        self.prefetch_thread = threading.Thread(target=self.run_prefetch, args=(max_zoom,), name='tile-prefetch',
+                                                daemon=True)
+        self.prefetch_thread.start()
+
+    def run_prefetch(self, max_zoom):
+        existing = self.store.existing(max_zoom)
+        missing = [(z, x, y) for z in range(max_zoom + 1) for x in range(1 << z) for y in range(1 << z)
+                   if (z, x, y) not in existing]
+        if not missing:
+            return
+        logging.info(f"Prefetching {len(missing)} map tiles for zoom 0-{max_zoom}")
+        fetched = 0
+        for z, x, y in missing:
+            if self.stop_prefetch.is_set() or not self.reachable():
+                break
+            if self.download(z, x, y) is not None:
+                fetched += 1
+        logging.info(f"Tile prefetch finished: {fetched}/{len(missing)} downloaded")
+
+    def shutdown(self):
+        self.stop_prefetch.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        if self.session is not None:
+            self.session.close()
+        self.store.close()
+
+
+def tile_url():
+    return os.environ.get(TILE_URL_ENV) or TILE_URL
+
+
+def prefetch_on_open():
+    # Background prefetching from the GUI is off unless SNIFFMAPPER_TILE_PREFETCH=1
+    return os.environ.get(TILE_PREFETCH_ENV, '') not in ('', '0')
+
+
+def create_tile_cache():
+    # SNIFFMAPPER_TILES points at a prebuilt MBTiles file for sensors without
+    # Internet access; it is used as-is and the tile server is never contacted.
+    path = os.environ.get(TILE_DB_ENV)
+    if path:
+        return TileCache(TileStore(path), online=False)
+    return TileCache(TileStore(), url=tile_url())
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare SniffMapper's map for offline use")
+    parser.add_argument('--prefetch', action='store_true', help="download missing tiles into the MBTiles cache")
+    parser.add_argument('--max-zoom', type=int, default=PREFETCH_MAX_ZOOM, help="highest zoom level to prefetch")
+    parser.add_argument('-o', '--output', default=TILE_CACHE_PATH, help="MBTiles file to fill")
+    parser.add_argument('--url', default=tile_url(),
+                        help=f"tile URL template with {{z}}/{{x}}/{{y}} (default: ${TILE_URL_ENV} or {TILE_URL}); "
+                             "use a server whose policy allows bulk downloads")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not args.prefetch:
+        print("nothing to do: pass --prefetch", file=sys.stderr)
+        return 2
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = TileCache(TileStore(args.output), url=args.url)
+    print(f"{tile_count(args.max_zoom)} tiles up to zoom {args.max_zoom} -> {args.output}")
+    cache.run_prefetch(args.max_zoom)
+    cache.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+from collections import OrderedDict
+
+MAP_IDLE_TIMEOUT = 300.0
+
+
+class MapDeltaTracker:
+    # Byte counters per address pair for the map, plus the endpoints and links
+    # the page already holds. Rows only mark pairs dirty; delta() turns the
+    # dirty pairs whose ends are both located into the changes since the last
+    # frame, so a frame serializes what moved rather than the whole map. Pairs
+    # idle for `idle_timeout` seconds of packet time are removed from the page.
+
+    def __init__(self, idle_timeout=MAP_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self.clear()
+
+    def clear(self):
+        # (a, b) -> [bytes, last_seen], ordered by last activity
+        self.pairs = OrderedDict()
+        self.endpoint_bytes = {}
+        # ip -> keys of the live pairs it is part of
+        self.peers = {}
+        self.dirty = set()
+        self.expired_pairs = []
+        self.expired_endpoints = []
+        self.reset_sent()
+
+    def reset_sent(self):
+        # Forget what the page holds; the next delta is a full snapshot
+        self.sent_endpoints = {}
+        self.sent_links = {}
+        self.next_id = 0
+        self.full = True
+
+    def update(self, rows):
+        # rows: summary tuples (time, src, dst, protocol, length, info, flow)
+        pairs, endpoint_bytes, peers, dirty = self.pairs, self.endpoint_bytes, self.peers, self.dirty
+        timestamp = None
+        for row in rows:
+            if row[6] is None:
+                continue
+            timestamp, src, dst, length = row[0], row[1], row[2], row[4]
+            key = (src, dst) if src <= dst else (dst, src)
+            pair = pairs.get(key)
+            if pair is None:
+                pair = pairs[key] = [0, timestamp]
+                peers.setdefault(src, set()).add(key)
+                peers.setdefault(dst, set()).add(key)
+            else:
+                pairs.move_to_end(key)
+                pair[1] = timestamp
+            pair[0] += length
+            endpoint_bytes[src] = endpoint_bytes.get(src, 0) + length
+            endpoint_bytes[dst] = endpoint_bytes.get(dst, 0) + length
+            dirty.add(key)
+        if timestamp is not None:
+            self.expire(timestamp)
+
+    def located(self, ip):
+        # A newly geolocated address may complete links that were skipped so far
+        self.dirty.update(self.peers.get(ip, ()))
+
+    def expire(self, now):
+        pairs, peers = self.pairs, self.peers
+        cutoff = now - self.idle_timeout
+        while pairs:
+            key, pair = next(iter(pairs.items()))
+            if pair[1] >= cutoff:
+                break
+            del pairs[key]
+            self.dirty.discard(key)
+            self.expired_pairs.append(key)
+            for ip in key:
+                keys = peers.get(ip)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del peers[ip]
+                    self.endpoint_bytes.pop(ip, None)
+                    self.expired_endpoints.append(ip)
+
+    def endpoint_id(self, ip):
+        endpoint_id = self.sent_endpoints.get(ip)
+        if endpoint_id is None:
+            endpoint_id = self.sent_endpoints[ip] = self.next_id
+            self.next_id += 1
+        return endpoint_id
+
+    def delta(self, locations):
+        # locations: ip -> (latitude, longitude, label). Returns the changes since
+        # the previous call as plain lists, or None when there is nothing to send:
+        # endpoints [id, lat, lng, label, bytes], links [id, endpoint a, endpoint b,
+        # bytes], and the ids of removed links and endpoints.
+        full = self.full
+        if full:
+            dirty = self.pairs.keys()
+            self.expired_pairs = []
+            self.expired_endpoints = []
+            self.full = False
+        else:
+            dirty = self.dirty
+        removed_links = [self.sent_links.pop(key) for key in self.expired_pairs if key in self.sent_links]
+        removed_endpoints = [self.sent_endpoints.pop(ip) for ip in self.expired_endpoints
+                             if ip in self.sent_endpoints]
+        self.expired_pairs = []
+        self.expired_endpoints = []
+
+        touched = {ip for key in dirty for ip in key if ip in locations}
+        endpoints = []
+        for ip in touched:
+            latitude, longitude, label = locations[ip]
+            endpoints.append([self.endpoint_id(ip), latitude, longitude, label, self.endpoint_bytes.get(ip, 0)])
+        links = []
+        for key in dirty:
+            a, b = key
+            if a == b or a not in touched or b not in touched:
+                continue
+            link_id = self.sent_links.get(key)
+            if link_id is None:
+                link_id = self.sent_links[key] = self.next_id
+                self.next_id += 1
+            links.append([link_id, self.sent_endpoints[a], self.sent_endpoints[b], self.pairs[key][0]])
+        self.dirty = set()
+
+        if not (full or endpoints or links or removed_links or removed_endpoints):
+            return None
+        return {
+            'reset': full,
+            'endpoints': endpoints,
+            'links': links,
+            'removed_links': removed_links,
+            'removed_endpoints': removed_endpoints,
+        }
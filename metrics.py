@@ -0,0 +1,262 @@
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds in seconds; one more bucket catches everything slower
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+METRICS_PREFIX = 'sniffmapper_'
+METRICS_PORT_ENV = 'SNIFFMAPPER_METRICS_PORT'
+METRICS_JSON_ENV = 'SNIFFMAPPER_METRICS_JSON'
+METRICS_JSON_INTERVAL = 10.0
+
+METRIC_HELP = {
+    'capture_frames_total': "Frames handed from the capture thread to the frame queue",
+    'capture_handoff_seconds': "Time the capture thread spent putting one batch into the frame queue",
+    'drain_frames_total': "Frames taken off the frame queue by the GUI drain",
+    'drain_tick_seconds': "GUI drain timer ticks that had work, end to end",
+    'table_submit_seconds': "Storing one drained batch and submitting it for dissection",
+    'dissect_frames_total': "Frames summarized by the dissection pool",
+    'dissect_seconds': "Chunk time from submission to summarized, including time queued for a worker",
+    'table_rows_total': "Rows inserted into the packet table",
+    'table_insert_seconds': "Inserting one batch of rows into the table, flows, map and statistics",
+    'capture_to_table_seconds': "Age of the newest live packet when its row reached the table",
+    'geo_lookups_total': "Geolocation lookups that missed the memory cache",
+    'geo_lookup_seconds': "Geolocation lookups that missed the memory cache (disk cache, API or offline database)",
+    'map_frames_total': "Incremental updates sent to the network map",
+    'map_delta_seconds': "Building and sending one network map update",
+    'map_endpoints_sent_total': "Endpoints sent to the network map",
+    'map_links_sent_total': "Links sent to the network map",
+    'frame_queue_depth': "Frames waiting in the frame queue",
+    'frame_queue_dropped': "Frames discarded by the overload policy in the current capture",
+    'kernel_drops': "Frames the kernel dropped in the current capture",
+    'summary_backlog': "Frames submitted for dissection but not yet in the table",
+    'packets_stored': "Packets held by the capture",
+    'geo_pending': "Geolocation lookups in flight",
+}
+
+
+def quantile(counts, q, buckets=LATENCY_BUCKETS):
+    # Estimate from per-bucket (not cumulative) counts, interpolating inside
+    # the bucket the way Prometheus' histogram_quantile() does
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if seen + count >= rank and count:
+            if i >= len(buckets):
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-1]
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[slot] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return {'count': self.count, 'sum': self.sum, 'counts': list(self.counts)}
+
+
+class Metrics:
+    # Pipeline instrumentation shared by the capture thread, the GUI drain,
+    # the summary pool, the geo workers and the map. Counters only go up,
+    # histograms hold latencies in seconds, and gauges are functions sampled
+    # when a snapshot is taken. Updates are safe from any thread; callers
+    # time whole batches, so the cost stays per batch rather than per packet.
+
+    def __init__(self, descriptions=METRIC_HELP):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.descriptions = descriptions
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        histogram.observe(seconds)
+
+    def gauge(self, name, func):
+        self.gauges[name] = func
+
+    def snapshot(self):
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = list(self.histograms.items())
+        gauges = {}
+        for name, func in list(self.gauges.items()):
+            try:
+                gauges[name] = func()
+            except Exception as e:
+                logging.debug(f"Metrics gauge {name} failed: {e}")
+        return {
+            'time': time.time(),
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': {name: histogram.snapshot() for name, histogram in histograms},
+        }
+
+    def to_json(self, snapshot=None):
+        snapshot = snapshot or self.snapshot()
+        histograms = {}
+        for name, histogram in snapshot['histograms'].items():
+            counts = histogram['counts']
+            histograms[name] = {
+                'count': histogram['count'],
+                'sum': histogram['sum'],
+                'p50': quantile(counts, 0.5),
+                'p90': quantile(counts, 0.9),
+                'p99': quantile(counts, 0.99),
+                'buckets': dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], counts)),
+            }
+        return json.dumps({'time': snapshot['time'], 'counters': snapshot['counters'],
+                           'gauges': snapshot['gauges'], 'histograms': histograms})
+
+    def to_prometheus(self, snapshot=None):
+        # Text exposition format 0.0.4
+        snapshot = snapshot or self.snapshot()
+        lines = []
+
+        def header(name, kind):
+            text = self.descriptions.get(name)
+            if text:
+                lines.append(f"# HELP {METRICS_PREFIX}{name} {text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} {kind}")
+
+        for name, value in sorted(snapshot['counters'].items()):
+            header(name, 'counter')
+            lines.append(f"{METRICS_PREFIX}{name} {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            header(name, 'gauge')
+            lines.append(f"{METRICS_PREFIX}{name} {value}")
+        for name, histogram in sorted(snapshot['histograms'].items()):
+            header(name, 'histogram')
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, histogram['counts']):
+                cumulative += count
+                lines.append(f'{METRICS_PREFIX}{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{METRICS_PREFIX}{name}_bucket{{le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{METRICS_PREFIX}{name}_sum {histogram['sum']}")
+            lines.append(f"{METRICS_PREFIX}{name}_count {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(handler):
+    metrics = handler.server.metrics
+    if handler.path == '/metrics':
+        body, mime = metrics.to_prometheus().encode('utf-8'), 'text/plain; version=0.0.4; charset=utf-8'
+    elif handler.path == '/metrics.json':
+        body, mime = metrics.to_json().encode('utf-8'), 'application/json'
+    else:
+        handler.send_error(404)
+        return
+    handler.send_response(200)
+    handler.send_header('Content-Type', mime)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+class MetricsServer:
+    # Prometheus scrape endpoint on localhost only: /metrics in the text
+    # format and /metrics.json with the same snapshot as JSON
+
+    def __init__(self, metrics, port, host='127.0.0.1'):
+        # http.server pulls in the email package (~35 ms); only import it when serving
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            do_GET = serve_metrics
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.metrics = metrics
+        self.location = f"http://{host}:{self.httpd.server_address[1]}/metrics"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics-http', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class MetricsFileWriter(threading.Thread):
+    # Rewrites a JSON snapshot every `interval` seconds. The file is replaced
+    # atomically, so readers never see a half-written snapshot.
+
+    def __init__(self, metrics, path, interval=METRICS_JSON_INTERVAL):
+        super().__init__(name='metrics-json', daemon=True)
+        self.metrics = metrics
+        self.path = path
+        self.location = path
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.write()
+        self.write()
+
+    def write(self):
+        temp = f"{self.path}.tmp"
+        try:
+            with open(temp, 'w') as f:
+                f.write(self.metrics.to_json())
+            os.replace(temp, self.path)
+        except OSError as e:
+            logging.error(f"Cannot write metrics to {self.path}: {e}")
+
+    def close(self):
+        self.stopped.set()
+        self.join()
+
+
+def start_metrics_export(metrics):
+    # SNIFFMAPPER_METRICS_PORT serves Prometheus metrics on 127.0.0.1 and
+    # SNIFFMAPPER_METRICS_JSON names a file refreshed every 10 seconds.
+    # Returns the started exporters; both are off unless configured.
+    exporters = []
+    port = os.environ.get(METRICS_PORT_ENV)
+    if port:
+        try:
+            server = MetricsServer(metrics, int(port))
+            logging.info(f"Serving metrics at {server.location}")
+            exporters.append(server)
+        except (OSError, ValueError) as e:
+            logging.error(f"Cannot serve metrics on port {port}: {e}")
+    path = os.environ.get(METRICS_JSON_ENV)
+    if path:
+        writer = MetricsFileWriter(metrics, path)
+        writer.start()
+        logging.info(f"Writing metrics to {path} every {writer.interval:.0f}s")
+        exporters.append(writer)
+    return exporters
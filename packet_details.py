@@ -0,0 +1,267 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from scapy.packet import NoPayload, Packet, Raw
+from scapy.layers.l2 import Ether, ARP
+from scapy.layers.inet import IP, TCP, UDP, ICMP
+from scapy.layers.inet6 import IPv6
+from scapy.layers.dns import DNS
+
+from dissect import get_layers, get_layer_ranges, get_packet_info, get_tcp_flags
+
+DETAIL_CACHE_SIZE = 64
+
+PROTO_NAMES = {1: "ICMP", 6: "TCP", 17: "UDP", 2: "IGMP", 58: "ICMPv6", 89: "OSPF"}
+ARP_OPERATIONS = {1: "ARP REQUEST", 2: "ARP REPLY", 3: "RARP REQUEST", 4: "RARP REPLY"}
+
+
+class DetailNode:
+    # One row of the packet details tree. Nodes with a loader have their
+    # children built the first time they are expanded; after that the
+    # children are kept, along with the rest of the tree in the detail cache.
+    __slots__ = ('text', 'parent', 'children', 'loader', 'byte_range')
+
+    def __init__(self, text, parent=None, loader=None, byte_range=None):
+        self.text = text
+        self.parent = parent
+        self.loader = loader
+        self.children = None if loader is not None else []
+        self.byte_range = byte_range if byte_range is not None or parent is None else parent.byte_range
+
+    def has_children(self):
+        return self.loader is not None or bool(self.children)
+
+    def loaded(self):
+        return self.loader is None
+
+    def build(self):
+        # Runs the loader; the node counts as loaded only once load() finishes,
+        # so a model can announce the new rows before they become visible
+        if self.children is None:
+            self.children = []
+            self.loader(self)
+        return self.children
+
+    def load(self):
+        if self.loader is not None:
+            self.build()
+            self.loader = None
+        return self.children
+
+    def add(self, text, loader=None, byte_range=None):
+        child = DetailNode(text, self, loader, byte_range)
+        if self.children is None:
+            self.children = []
+        self.children.append(child)
+        return child
+
+    def add_lines(self, lines):
+        for line in lines:
+            self.add(line)
+
+
+def dns_records(records):
+    # Record lists are plain lists on current Scapy and payload chains on old releases
+    if records is None:
+        return []
+    if isinstance(records, list):
+        return list(records)
+    chain = []
+    while isinstance(records, Packet) and not isinstance(records, NoPayload):
+        chain.append(records)
+        records = records.payload
+    return chain
+
+
+def dns_name(name):
+    return name.decode('ascii', errors='replace') if isinstance(name, bytes) else str(name)
+
+
+def dns_flags(dns):
+    return ((dns.qr << 15) | (dns.opcode << 11) | (dns.aa << 10) | (dns.tc << 9) | (dns.rd << 8) | (dns.ra << 7) |
+            (dns.z << 6) | (dns.ad << 5) | (dns.cd << 4) | dns.rcode)
+
+
+def summary_lines(packet):
+    timestamp = datetime.fromtimestamp(float(packet.time)).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+    return [f"TIMESTAMP: {timestamp}", f"LENGTH: {len(packet)} bytes", f"SUMMARY: {get_packet_info(packet)}"]
+
+
+def ether_lines(eth):
+    return [f"SOURCE MAC: {eth.src}", f"DESTINATION MAC: {eth.dst}", f"TYPE: 0x{eth.type:04x}"]
+
+
+def ip_lines(ip):
+    return [
+        f"VERSION: {ip.version}",
+        f"HEADER LENGTH: {ip.ihl * 4} bytes",
+        f"TOS: 0x{ip.tos:02x}",
+        f"TOTAL LENGTH: {len(ip)} bytes",
+        f"ID: {ip.id}",
+        f"FLAGS: {ip.flags}",
+        f"FRAGMENT OFFSET: {ip.frag}",
+        f"TTL: {ip.ttl}",
+        f"PROTOCOL: {ip.proto} ({PROTO_NAMES.get(ip.proto, str(ip.proto))})",
+        f"CHECKSUM: 0x{ip.chksum:04x}",
+        f"SOURCE IP: {ip.src}",
+        f"DESTINATION IP: {ip.dst}",
+    ]
+
+
+def ipv6_lines(ipv6):
+    return [
+        f"VERSION: {ipv6.version}",
+        f"TRAFFIC CLASS: 0x{ipv6.tc:02x}",
+        f"FLOW LABEL: 0x{ipv6.fl:05x}",
+        f"PAYLOAD LENGTH: {ipv6.plen}",
+        f"NEXT HEADER: {ipv6.nh}",
+        f"HOP LIMIT: {ipv6.hlim}",
+        f"SOURCE IP: {ipv6.src}",
+        f"DESTINATION IP: {ipv6.dst}",
+    ]
+
+
+def tcp_lines(tcp):
+    return [
+        f"SOURCE PORT: {tcp.sport}",
+        f"DESTINATION PORT: {tcp.dport}",
+        f"SEQUENCE NUMBER: {tcp.seq}",
+        f"ACK NUMBER: {tcp.ack}",
+        f"DATA OFFSET: {tcp.dataofs * 4} bytes",
+        f"FLAGS: {get_tcp_flags(tcp)}",
+        f"WINDOW SIZE: {tcp.window}",
+        f"CHECKSUM: 0x{tcp.chksum:04x}",
+        f"URGENT POINTER: {tcp.urgptr}",
+    ]
+
+
+def udp_lines(udp):
+    return [f"SOURCE PORT: {udp.sport}", f"DESTINATION PORT: {udp.dport}", f"LENGTH: {udp.len}",
+            f"CHECKSUM: 0x{udp.chksum:04x}"]
+
+
+def icmp_lines(icmp):
+    return [f"TYPE: {icmp.type}", f"CODE: {icmp.code}", f"CHECKSUM: 0x{icmp.chksum:04x}"]
+
+
+def arp_lines(arp):
+    return [
+        f"HARDWARE TYPE: {arp.hwtype}",
+        f"PROTOCOL TYPE: 0x{arp.ptype:04x}",
+        f"HARDWARE SIZE: {arp.hwlen}",
+        f"PROTOCOL SIZE: {arp.plen}",
+        f"OPERATION: {ARP_OPERATIONS.get(arp.op, str(arp.op))}",
+        f"SENDER MAC: {arp.hwsrc}",
+        f"SENDER IP: {arp.psrc}",
+        f"TARGET MAC: {arp.hwdst}",
+        f"TARGET IP: {arp.pdst}",
+    ]
+
+
+def http_lines(packet):
+    try:
+        load = packet[Raw].load.decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    if 'HTTP' not in load:
+        return None
+    return load[:500].splitlines()
+
+
+def question_lines(question):
+    return [f"NAME: {dns_name(question.qname)}", f"TYPE: {question.qtype}", f"CLASS: {question.qclass}"]
+
+
+def record_lines(record):
+    return [
+        f"NAME: {dns_name(getattr(record, 'rrname', ''))}",
+        f"TYPE: {getattr(record, 'type', '')}",
+        f"CLASS: {getattr(record, 'rclass', '')}",
+        f"TTL: {getattr(record, 'ttl', '')}",
+        f"DATA: {getattr(record, 'rdata', '')}",
+    ]
+
+
+def load_dns(node, dns):
+    questions, answers = dns_records(dns.qd), dns_records(dns.an)
+    authority, additional = dns_records(dns.ns), dns_records(dns.ar)
+    node.add_lines([
+        f"TRANSACTION ID: 0x{dns.id:04x}",
+        f"FLAGS: 0x{dns_flags(dns):04x} ({'RESPONSE' if dns.qr else 'QUERY'})",
+        f"QUESTIONS: {len(questions)}",
+        f"ANSWER RRs: {len(answers)}",
+        f"AUTHORITY RRs: {len(authority)}",
+        f"ADDITIONAL RRs: {len(additional)}",
+    ])
+    # Each record list and each record is its own lazy subtree
+    for title, records, lines in (("QUESTIONS", questions, question_lines), ("ANSWERS", answers, record_lines),
+                                  ("AUTHORITY", authority, record_lines), ("ADDITIONAL", additional, record_lines)):
+        if records:
+            node.add(f"{title} ({len(records)})",
+                     lambda parent, records=records, lines=lines: load_records(parent, records, lines))
+
+
+def load_records(node, records, lines):
+    for i, record in enumerate(records):
+        name = dns_name(getattr(record, 'qname', None) or getattr(record, 'rrname', ''))
+        node.add(f"{i + 1}: {name}", lambda parent, record=record: parent.add_lines(lines(record)))
+
+
+def build_detail_tree(packet):
+    # Root whose children are one lazily expanded node per protocol layer,
+    # outermost first. Each section carries the byte range of the layer it
+    # describes for the hex view.
+    layers = get_layers(packet)
+    ranges = get_layer_ranges(packet)
+    root = DetailNode("")
+    root.add("PACKET INSPECTION", lambda node: node.add_lines(summary_lines(packet)), (0, 0))
+
+    def section(title, layer_type, lines):
+        layer = layers.get(layer_type)
+        root.add(title, lambda node: node.add_lines(lines(layer)), ranges.get(layer_type))
+
+    if Ether in layers:
+        section("ETHERNET FRAME", Ether, ether_lines)
+    if IP in layers:
+        section("IP DATAGRAM", IP, ip_lines)
+    elif IPv6 in layers:
+        section("IPv6 DATAGRAM", IPv6, ipv6_lines)
+    if TCP in layers:
+        tcp = layers[TCP]
+        section("TCP SEGMENT", TCP, tcp_lines)
+        if (tcp.dport == 80 or tcp.sport == 80) and Raw in layers:
+            lines = http_lines(packet)
+            if lines:
+                root.add("HTTP CONTENT", lambda node: node.add_lines(lines), ranges.get(Raw))
+    elif UDP in layers:
+        udp = layers[UDP]
+        section("UDP DATAGRAM", UDP, udp_lines)
+        if (udp.dport == 53 or udp.sport == 53) and DNS in layers:
+            root.add("DNS MESSAGE", lambda node: load_dns(node, layers[DNS]), ranges.get(DNS))
+    elif ICMP in layers:
+        section("ICMP MESSAGE", ICMP, icmp_lines)
+    elif ARP in layers:
+        section("ARP MESSAGE", ARP, arp_lines)
+    return root
+
+
+class DetailCache:
+    # Detail trees by packet index, least recently shown dropped first. A tree
+    # keeps whatever subtrees were expanded while it was on screen.
+
+    def __init__(self, capacity=DETAIL_CACHE_SIZE):
+        self.capacity = capacity
+        self.trees = OrderedDict()
+
+    def get(self, index, packet_loader):
+        root = self.trees.get(index)
+        if root is None:
+            root = self.trees[index] = build_detail_tree(packet_loader())
+            if len(self.trees) > self.capacity:
+                self.trees.popitem(last=False)
+        else:
+            self.trees.move_to_end(index)
+        return root
+
+    def clear(self):
+        self.trees.clear()
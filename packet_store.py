@@ -0,0 +1,141 @@
+import mmap
+from array import array
+from collections import OrderedDict
+
+DISSECT_CACHE_SIZE = 128
+
+
+class PacketStore:
+    # Keeps captured frames as raw bytes in one contiguous buffer plus typed
+    # per-packet arrays. Scapy objects are only rebuilt when someone asks for
+    # one, and the most recent ones are kept in a small LRU. Frames loaded
+    # from capture files are not copied at all: they are recorded as offsets
+    # into a read-only mapping of the file.
+
+    def __init__(self, cache_size=DISSECT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.clear()
+
+    def clear(self):
+        for source in getattr(self, 'sources', [])[1:]:
+            source.close()
+        self.sources = [None]
+        self.data = bytearray()
+        self.source_ids = array('H')
+        self.offsets = array('Q')
+        self.lengths = array('I')
+        self.times = array('d')
+        self.iface_ids = array('H')
+        self.decoder_ids = array('H')
+        self.interfaces = []
+        self.decoders = []
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def table_id(self, table, value):
+        try:
+            return table.index(value)
+        except ValueError:
+            table.append(value)
+            return len(table) - 1
+
+    def add_file(self, path):
+        with open(path, 'rb') as f:
+            self.sources.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        return len(self.sources) - 1
+
+    def append_ref(self, source_id, offset, length, timestamp, interface=None, decoder=None):
+        self.source_ids.append(source_id)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.times.append(float(timestamp))
+        self.iface_ids.append(self.table_id(self.interfaces, interface))
+        self.decoder_ids.append(self.table_id(self.decoders, decoder))
+        return len(self.offsets) - 1
+
+    def append_raw(self, raw, timestamp, interface=None, decoder=None):
+        self.source_ids.append(0)
+        self.offsets.append(len(self.data))
+        self.lengths.append(len(raw))
+        self.times.append(float(timestamp))
+        self.iface_ids.append(self.table_id(self.interfaces, interface))
+        self.decoder_ids.append(self.table_id(self.decoders, decoder))
+        self.data += raw
+        return len(self.offsets) - 1
+
+    def append(self, packet):
+        # Sniffed packets still carry the wire bytes; rebuilding them is a last resort
+        raw = getattr(packet, 'original', None) or bytes(packet)
+        index = self.append_raw(raw, packet.time, getattr(packet, 'sniffed_on', None), type(packet))
+        self.remember(index, packet)
+        return index
+
+    def extend(self, packets):
+        # Accepts Scapy packets, (raw, timestamp, interface, decoder) frames and
+        # (source_id, offset, length, timestamp, interface, decoder) file references
+        for packet in packets:
+            if isinstance(packet, tuple):
+                if len(packet) == 6:
+                    self.append_ref(*packet)
+                else:
+                    self.append_raw(*packet)
+            else:
+                self.append(packet)
+
+    def raw(self, index):
+        if index < 0:
+            index += len(self.offsets)
+        start = self.offsets[index]
+        source_id = self.source_ids[index]
+        if source_id:
+            return self.sources[source_id][start:start + self.lengths[index]]
+        return bytes(self.data[start:start + self.lengths[index]])
+
+    def frame(self, index):
+        # Picklable (raw, timestamp, decoder) tuple for the summary workers
+        return (self.raw(index), self.times[index], self.decoders[self.decoder_ids[index]])
+
+    def time(self, index):
+        return self.times[index]
+
+    def interface(self, index):
+        return self.interfaces[self.iface_ids[index]]
+
+    def remember(self, index, packet):
+        self.cache[index] = packet
+        self.cache.move_to_end(index)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    def dissect(self, index):
+        decoder = self.decoders[self.decoder_ids[index]]
+        if decoder is None:
+            from scapy.layers.l2 import Ether
+            decoder = Ether
+        packet = decoder(self.raw(index))
+        packet.time = self.times[index]
+        interface = self.interface(index)
+        if interface is not None:
+            packet.sniffed_on = interface
+        return packet
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.offsets)
+        if not 0 <= index < len(self.offsets):
+            raise IndexError("packet index out of range")
+        packet = self.cache.get(index)
+        if packet is None:
+            packet = self.dissect(index)
+            self.remember(index, packet)
+        else:
+            self.cache.move_to_end(index)
+        return packet
+
+    def __iter__(self):
+        # Bulk iteration rebuilds packets without churning the LRU
+        for index in range(len(self.offsets)):
+            packet = self.cache.get(index)
+            yield packet if packet is not None else self.dissect(index)
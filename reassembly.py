@@ -0,0 +1,293 @@
+import struct
+from collections import OrderedDict
+
+STREAM_MAX_BYTES = 16384
+STREAM_MAX_PENDING = 65536
+MAX_STREAMS = 20000
+MAX_CONNECTIONS = 100000
+STREAM_IDLE_TIMEOUT = 60.0
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+HTTP_METHODS = (b'GET ', b'POST ', b'PUT ', b'DELETE ', b'HEAD ', b'OPTIONS ', b'PATCH ', b'CONNECT ', b'TRACE ')
+
+# Parser outcomes besides a (protocol, info) result
+NEED_MORE = 'need-more'
+NO_MATCH = 'no-match'
+
+
+def parse_http(data, port):
+    if data.startswith(HTTP_METHODS):
+        end = data.find(b'\r\n')
+        if end < 0:
+            return NEED_MORE
+        info = f"HTTP: {data[:end].decode('ascii', errors='replace')}"
+        headers_end = data.find(b'\r\n\r\n')
+        if headers_end < 0 and len(data) < STREAM_MAX_BYTES:
+            return NEED_MORE
+        for line in data[end + 2:headers_end if headers_end >= 0 else None].split(b'\r\n'):
+            if line[:5].lower() == b'host:':
+                info += f" (Host: {line[5:].strip().decode('ascii', errors='replace')})"
+                break
+        return 'HTTP', info
+    if data.startswith(b'HTTP/1.'):
+        end = data.find(b'\r\n')
+        if end < 0:
+            return NEED_MORE
+        return 'HTTP', f"HTTP: {data[:end].decode('ascii', errors='replace')}"
+    if len(data) < 8 and any(method.startswith(data) for method in HTTP_METHODS + (b'HTTP/1.',)):
+        return NEED_MORE
+    return NO_MATCH
+
+
+def tls_handshake(data):
+    # Concatenates handshake records until the first message is complete
+    message = bytearray()
+    offset = 0
+    while offset + 5 <= len(data):
+        content_type, major, length = data[offset], data[offset + 1], struct.unpack_from('!H', data, offset + 3)[0]
+        if content_type != 0x16 or major != 3:
+            return NO_MATCH
+        fragment = data[offset + 5:offset + 5 + length]
+        message += fragment
+        if len(message) >= 4:
+            needed = 4 + int.from_bytes(message[1:4], 'big')
+            if len(message) >= needed:
+                return bytes(message[:needed])
+        if len(fragment) < length:
+            break
+        offset += 5 + length
+    if offset == 0 and len(data) >= 1 and data[0] != 0x16:
+        return NO_MATCH
+    return NEED_MORE
+
+
+def client_hello_sni(message):
+    # message: a full ClientHello handshake message
+    offset = 4 + 2 + 32
+    session_id_length = message[offset]
+    offset += 1 + session_id_length
+    cipher_length = struct.unpack_from('!H', message, offset)[0]
+    offset += 2 + cipher_length
+    compression_length = message[offset]
+    offset += 1 + compression_length
+    if offset + 2 > len(message):
+        return None
+    extensions_end = offset + 2 + struct.unpack_from('!H', message, offset)[0]
+    offset += 2
+    while offset + 4 <= extensions_end:
+        ext_type, ext_length = struct.unpack_from('!HH', message, offset)
+        offset += 4
+        if offset + ext_length > len(message):
+            # Truncated; a partial name would be worse than none
+            return None
+        if ext_type == 0:
+            # server_name list: total length, then (type, length, name) entries
+            name_offset = offset + 2
+            while name_offset + 3 <= offset + ext_length:
+                name_type, name_length = message[name_offset], struct.unpack_from('!H', message, name_offset + 1)[0]
+                name_end = name_offset + 3 + name_length
+                if name_end > offset + ext_length:
+                    return None
+                if name_type == 0:
+                    return message[name_offset + 3:name_end].decode('ascii', errors='replace')
+                name_offset = name_end
+            return None
+        offset += ext_length
+    return None
+
+
+def parse_tls(data, port):
+    message = tls_handshake(data)
+    if message in (NEED_MORE, NO_MATCH):
+        return message
+    protocol = 'HTTPS' if port == 443 else 'TLS'
+    if message[0] == 1:
+        try:
+            sni = client_hello_sni(message)
+        except (IndexError, struct.error):
+            sni = None
+        return protocol, f"TLS ClientHello SNI: {sni}" if sni else "TLS ClientHello"
+    if message[0] == 2:
+        return protocol, "TLS ServerHello"
+    return protocol, "TLS Handshake"
+
+
+APP_PARSERS = (parse_http, parse_tls)
+
+
+def sequence_delta(seq, base):
+    return ((seq - base + 0x80000000) & 0xFFFFFFFF) - 0x80000000
+
+
+class TcpStream:
+    # One direction of a connection: the in-order prefix of its payload, up to
+    # STREAM_MAX_BYTES, plus a bounded set of segments that arrived early.
+    __slots__ = ('next_seq', 'data', 'pending', 'pending_bytes', 'last_seen', 'done')
+
+    def __init__(self, timestamp):
+        self.next_seq = None
+        self.data = bytearray()
+        self.pending = {}
+        self.pending_bytes = 0
+        self.last_seen = timestamp
+        self.done = False
+
+    def add(self, seq, payload, max_bytes, max_pending):
+        # Returns True when new in-order bytes were appended
+        if self.next_seq is None:
+            self.next_seq = seq
+        delta = sequence_delta(seq, self.next_seq)
+        if delta > 0:
+            if seq not in self.pending and self.pending_bytes + len(payload) <= max_pending:
+                self.pending[seq] = payload
+                self.pending_bytes += len(payload)
+            return False
+        grew = self.append(payload[-delta:] if delta else payload)
+        while self.pending:
+            ready = [s for s in self.pending if sequence_delta(s, self.next_seq) <= 0]
+            if not ready:
+                break
+            for s in ready:
+                segment = self.pending.pop(s)
+                self.pending_bytes -= len(segment)
+                delta = sequence_delta(s, self.next_seq)
+                grew = self.append(segment[-delta:] if delta else segment) or grew
+        if len(self.data) >= max_bytes:
+            self.data = self.data[:max_bytes]
+        return grew
+
+    def append(self, payload):
+        if not payload:
+            return False
+        self.data += payload
+        self.next_seq = (self.next_seq + len(payload)) & 0xFFFFFFFF
+        return True
+
+    def release(self):
+        self.data = bytearray()
+        self.pending = {}
+        self.pending_bytes = 0
+        self.done = True
+
+
+class TcpReassembler:
+    # Rebuilds the start of each TCP stream in capture order and runs the
+    # application parsers on it until one of them recognizes the protocol.
+    # Only the first STREAM_MAX_BYTES of a direction are kept, out-of-order
+    # data is capped per stream, and the stream table is an LRU evicted by
+    # count and by idle time on packet timestamps. Once a connection is
+    # identified its streams are freed and later rows just get the label.
+
+    def __init__(self, max_bytes=STREAM_MAX_BYTES, max_pending=STREAM_MAX_PENDING, max_streams=MAX_STREAMS,
+                 idle_timeout=STREAM_IDLE_TIMEOUT, max_connections=MAX_CONNECTIONS):
+        self.max_bytes = max_bytes
+        self.max_pending = max_pending
+        self.max_streams = max_streams
+        self.idle_timeout = idle_timeout
+        self.max_connections = max_connections
+        self.clear()
+
+    def clear(self):
+        self.streams = OrderedDict()
+        self.identified = OrderedDict()
+        self.evicted = 0
+        self.bytes_reassembled = 0
+
+    def buffered_bytes(self):
+        return sum(len(stream.data) + stream.pending_bytes for stream in self.streams.values())
+
+    def process(self, rows, raw):
+        # rows: summary tuples whose flow entry is (ip_proto, sport, dport,
+        # tcp_flags, seq, payload_offset, payload_length); raw(i) returns the
+        # frame bytes for rows[i] and is only called for segments still needed.
+        # Returns the rows with protocol/info filled in from stream content.
+        out = []
+        timestamp = None
+        for i, row in enumerate(rows):
+            flow = row[6]
+            if flow is None or flow[0] != 6:
+                out.append(row)
+                continue
+            timestamp, src, dst = row[0], row[1], row[2]
+            sport, dport, flags, seq, payload_offset, payload_length = flow[1:7]
+            forward = (src, sport) <= (dst, dport)
+            connection = (src, sport, dst, dport) if forward else (dst, dport, src, sport)
+            protocol = self.identified.get(connection)
+            if protocol is not None:
+                if flags & TCP_SYN and not flags & TCP_ACK:
+                    # A new connection reusing the ports
+                    del self.identified[connection]
+                else:
+                    self.identified.move_to_end(connection)
+                    out.append(row[:3] + (protocol,) + row[4:])
+                    continue
+            result = self.feed((src, sport, dst, dport), timestamp, flags, seq, payload_length,
+                               lambda: raw(i)[payload_offset:payload_offset + payload_length])
+            if result is not None:
+                self.identified[connection] = result[0]
+                if len(self.identified) > self.max_connections:
+                    self.identified.popitem(last=False)
+                self.drop(connection)
+                row = row[:3] + (result[0], row[4], result[1]) + row[6:]
+            elif flags & (TCP_FIN | TCP_RST):
+                self.drop(connection)
+            out.append(row)
+        if timestamp is not None:
+            self.expire(timestamp)
+        return out
+
+    def feed(self, key, timestamp, flags, seq, payload_length, payload):
+        stream = self.streams.get(key)
+        if stream is None:
+            if not payload_length and not flags & TCP_SYN:
+                return None
+            stream = self.streams[key] = TcpStream(timestamp)
+            if len(self.streams) > self.max_streams:
+                self.streams.popitem(last=False)
+                self.evicted += 1
+        else:
+            self.streams.move_to_end(key)
+            stream.last_seen = timestamp
+        if stream.done:
+            return None
+        if flags & TCP_SYN:
+            stream.next_seq = (seq + 1) & 0xFFFFFFFF
+            seq = stream.next_seq
+        if not payload_length:
+            return None
+        before = len(stream.data)
+        if not stream.add(seq, payload(), self.max_bytes, self.max_pending):
+            return None
+        self.bytes_reassembled += len(stream.data) - before
+        data = bytes(stream.data)
+        # The lower port is normally the service (443, 8443, ...) side
+        service_port = min(key[1], key[3])
+        waiting = False
+        for parser in APP_PARSERS:
+            result = parser(data, service_port)
+            if result is NEED_MORE:
+                waiting = True
+            elif result is not NO_MATCH:
+                return result
+        if not waiting or len(stream.data) >= self.max_bytes:
+            stream.release()
+        return None
+
+    def drop(self, connection):
+        src, sport, dst, dport = connection
+        self.streams.pop((src, sport, dst, dport), None)
+        self.streams.pop((dst, dport, src, sport), None)
+
+    def expire(self, now):
+        cutoff = now - self.idle_timeout
+        streams = self.streams
+        while streams:
+            key, stream = next(iter(streams.items()))
+            if stream.last_seen >= cutoff:
+                break
+            del streams[key]
+            self.evicted += 1
@@ -0,0 +1,192 @@
+import heapq
+from collections import deque
+from operator import itemgetter
+
+SERIES_SECONDS = 120
+TOP_WINDOW_SECONDS = 60
+TOP_N = 10
+
+L4_NAMES = {6: 'TCP', 17: 'UDP', 1: 'ICMP', 58: 'ICMPv6'}
+
+
+class RateSeries:
+    # Packets and bytes per second for the last `size` seconds in two ring
+    # buffers indexed by second % size. Moving forward clears at most `size`
+    # slots, so each packet costs O(1) however long the capture runs.
+
+    def __init__(self, size=SERIES_SECONDS):
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        self.packets = [0] * self.size
+        self.bytes = [0] * self.size
+        self.head = None
+
+    def advance(self, second):
+        if self.head is None:
+            self.head = second
+            return
+        if second <= self.head:
+            return
+        steps = min(second - self.head, self.size)
+        for offset in range(1, steps + 1):
+            slot = (self.head + offset) % self.size
+            self.packets[slot] = 0
+            self.bytes[slot] = 0
+        self.head = second
+
+    def add(self, second, length):
+        self.advance(second)
+        if second <= self.head - self.size:
+            return
+        slot = second % self.size
+        self.packets[slot] += 1
+        self.bytes[slot] += length
+
+    def series(self):
+        # Oldest first, ending at the newest complete or in-progress second
+        if self.head is None:
+            return [], []
+        seconds = range(self.head - self.size + 1, self.head + 1)
+        return [self.packets[s % self.size] for s in seconds], [self.bytes[s % self.size] for s in seconds]
+
+
+class WindowedCounter:
+    # Totals per key over the last `window` seconds. Each second gets its own
+    # small dict; when a second leaves the window its counts are subtracted
+    # from the running totals, so every increment is undone exactly once.
+
+    def __init__(self, window=TOP_WINDOW_SECONDS):
+        self.window = window
+        self.clear()
+
+    def clear(self):
+        self.buckets = deque()
+        self.totals = {}
+
+    def add(self, second, key, amount):
+        buckets = self.buckets
+        if not buckets or buckets[-1][0] < second:
+            buckets.append((second, {}))
+            self.expire(second)
+        counts = buckets[-1][1]
+        counts[key] = counts.get(key, 0) + amount
+        self.totals[key] = self.totals.get(key, 0) + amount
+
+    def expire(self, now):
+        buckets, totals = self.buckets, self.totals
+        while buckets and buckets[0][0] <= now - self.window:
+            for key, amount in buckets.popleft()[1].items():
+                remaining = totals[key] - amount
+                if remaining:
+                    totals[key] = remaining
+                else:
+                    del totals[key]
+
+    def top(self, n=TOP_N):
+        return heapq.nlargest(n, self.totals.items(), key=itemgetter(1))
+
+
+class ProtocolHierarchy:
+    # Cumulative packets/bytes for each path such as ('IPv4', 'TCP', 'HTTPS').
+    # The number of distinct paths is small and fixed by the protocol names.
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.counts = {}
+        # path -> the [packets, bytes] entries of the path and all its parents
+        self.chains = {}
+        self.total_packets = 0
+        self.total_bytes = 0
+
+    def add(self, path, length):
+        chain = self.chains.get(path)
+        if chain is None:
+            chain = self.chains[path] = [self.counts.setdefault(path[:depth], [0, 0])
+                                         for depth in range(1, len(path) + 1)]
+        for entry in chain:
+            entry[0] += 1
+            entry[1] += length
+        self.total_packets += 1
+        self.total_bytes += length
+
+    def rows(self):
+        # (path, packets, bytes) with parents before children, busiest first
+        children = {}
+        for path in self.counts:
+            children.setdefault(path[:-1], []).append(path)
+        ordered = []
+
+        def walk(parent):
+            for path in sorted(children.get(parent, ()), key=lambda p: -self.counts[p][0]):
+                ordered.append((path, self.counts[path][0], self.counts[path][1]))
+                walk(path)
+
+        walk(())
+        return ordered
+
+
+def protocol_path(protocol, ip_proto, ipv6):
+    # Network / transport / application levels for the hierarchy
+    if ip_proto is None:
+        return (protocol,)
+    network = 'IPv6' if ipv6 else 'IPv4'
+    transport = L4_NAMES.get(ip_proto, f"IP PROTO {ip_proto}")
+    if protocol in (transport, 'IPv6', 'OTHER'):
+        return (network, transport)
+    return (network, transport, protocol)
+
+
+class TrafficStats:
+    # Incremental statistics for the dashboard: a per-second rate series,
+    # the protocol hierarchy and sliding-window top endpoints and ports.
+    # update() does constant work per row; snapshots only touch the fixed
+    # series, the handful of hierarchy nodes and the windowed totals.
+
+    def __init__(self, series_seconds=SERIES_SECONDS, top_window=TOP_WINDOW_SECONDS):
+        self.rates = RateSeries(series_seconds)
+        self.hierarchy = ProtocolHierarchy()
+        self.endpoints = WindowedCounter(top_window)
+        self.ports = WindowedCounter(top_window)
+        self.paths = {}
+
+    def clear(self):
+        self.rates.clear()
+        self.hierarchy.clear()
+        self.endpoints.clear()
+        self.ports.clear()
+
+    def update(self, rows):
+        rates, hierarchy, endpoints, ports = self.rates, self.hierarchy, self.endpoints, self.ports
+        paths = self.paths
+        for row in rows:
+            second = int(row[0])
+            length = row[4]
+            flow = row[6]
+            ip_proto = None if flow is None else flow[0]
+            key = (row[3], ip_proto, ':' in row[1])
+            path = paths.get(key)
+            if path is None:
+                path = paths[key] = protocol_path(*key)
+            rates.add(second, length)
+            hierarchy.add(path, length)
+            endpoints.add(second, row[1], length)
+            endpoints.add(second, row[2], length)
+            if ip_proto == 6 or ip_proto == 17:
+                # The lower port is normally the service side
+                ports.add(second, (L4_NAMES[ip_proto], min(flow[1], flow[2])), 1)
+
+    def snapshot(self, top=TOP_N):
+        packets, volume = self.rates.series()
+        return {
+            'pps': packets,
+            'bps': [value * 8 for value in volume],
+            'hierarchy': self.hierarchy.rows(),
+            'total_packets': self.hierarchy.total_packets,
+            'total_bytes': self.hierarchy.total_bytes,
+            'top_endpoints': self.endpoints.top(top),
+            'top_ports': self.ports.top(top),
+        }
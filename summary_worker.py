@@ -0,0 +1,6 @@
+# Entry module for SummaryPool worker processes. Spawned and forkserver
+# workers re-import the parent's __main__ before running any task; while the
+# pool starts workers this module stands in for it, so they load only the
+# dissection code instead of re-running SniffMapper.py (PyQt5, the GUI
+# modules) or headless.py.
+from dissect import summarize_frames
@@ -0,0 +1,89 @@
+import os
+import struct
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from capture import (PCAPNG_BYTE_ORDER, PCAPNG_EPB, PCAPNG_IDB, PCAPNG_SHB, PCAPNG_SPB, CaptureFileReader, FrameQueue,
+                     PcapngWriter)
+
+FRAME = (b'\x00' * 60, 1700000000.5, None)
+
+
+def test_writer_close_flushes_queued_frames(tmp_path):
+    writer = PcapngWriter(str(tmp_path))
+    writer.start()
+    writer.submit([FRAME] * 10)
+    writer.close()
+    assert not writer.is_alive()
+    assert writer.frames_written == 10
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_writer_close_after_failure_does_not_hang(tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_bytes(b'')
+    writer = PcapngWriter(str(blocker / 'capture'), queue_batches=1)
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+    writer.submit([FRAME] * 3)
+    assert writer.frames_dropped == 3
+    started = time.monotonic()
+    writer.close(timeout=1)
+    assert time.monotonic() - started < 1
+
+
+def test_writer_close_without_start_returns(tmp_path):
+    writer = PcapngWriter(str(tmp_path), queue_batches=1)
+    writer.submit([FRAME])
+    writer.submit([FRAME])
+    writer.close()
+    assert writer.frames_dropped == 1
+
+
+def test_lossless_put_waits_instead_of_dropping():
+    frame_queue = FrameQueue(capacity=10, policy='drop_newest')
+    frame_queue.put([FRAME] * 8)
+    producer = threading.Thread(target=frame_queue.put, args=([FRAME] * 5, lambda: False, True))
+    producer.start()
+    producer.join(0.3)
+    assert producer.is_alive()
+    assert len(frame_queue.get(8)) == 8
+    producer.join(5)
+    assert len(frame_queue) == 5
+    assert frame_queue.frames_dropped == 0
+
+
+def test_lossless_put_is_abandoned_when_stopped():
+    frame_queue = FrameQueue(capacity=10, policy='drop_oldest')
+    frame_queue.put([FRAME] * 10)
+    frame_queue.put([FRAME] * 5, lambda: True, lossless=True)
+    assert len(frame_queue) == 10
+    assert frame_queue.frames_dropped == 0
+
+
+def test_simple_packet_block_takes_previous_timestamp(tmp_path):
+    frame = b'\x00' * 60
+    micros = 1700000000250000
+    blocks = [
+        struct.pack('<IIIHHqI', PCAPNG_SHB, 28, PCAPNG_BYTE_ORDER, 1, 0, -1, 28),
+        struct.pack('<IIHHII', PCAPNG_IDB, 20, 1, 0, 0, 20),
+        struct.pack('<IIIIIII', PCAPNG_EPB, 92, 0, micros >> 32, micros & 0xFFFFFFFF, 60, 60) + frame +
+        struct.pack('<I', 92),
+        struct.pack('<III', PCAPNG_SPB, 76, 60) + frame + struct.pack('<I', 76),
+    ]
+    path = tmp_path / 'spb.pcapng'
+    path.write_bytes(b''.join(blocks))
+    reader = CaptureFileReader(str(path))
+    try:
+        frames = [frame for chunk in reader.chunks() for frame in chunk]
+    finally:
+        reader.close()
+    assert len(frames) == 2
+    assert frames[0][2] == frames[1][2] == pytest.approx(1700000000.25)
+    assert frames[1][1] == 60
@@ -0,0 +1,99 @@
+import os
+import sys
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from display_filter import NO_FLOW, PacketIndex, compile_filter
+
+
+class Columns:
+    # The column layout PacketTableModel exposes to display filters
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.times = array('d')
+        self.lengths = array('I')
+        self.src_ids = array('I')
+        self.dst_ids = array('I')
+        self.proto_ids = array('H')
+        self.l4_protos = array('H')
+        self.sports = array('H')
+        self.dports = array('H')
+        self.tcp_flags = array('B')
+        self.infos = []
+        self.strings = []
+        self.string_ids = {}
+        self.protocols = []
+        self.protocol_ids = {}
+
+    def intern(self, text, strings, ids):
+        if text not in ids:
+            ids[text] = len(strings)
+            strings.append(text)
+        return ids[text]
+
+    def append(self, src, dst, protocol, flow=(6, 1234, 80, 0x10)):
+        self.times.append(float(len(self.times)))
+        self.lengths.append(60)
+        self.src_ids.append(self.intern(src, self.strings, self.string_ids))
+        self.dst_ids.append(self.intern(dst, self.strings, self.string_ids))
+        self.proto_ids.append(self.intern(protocol, self.protocols, self.protocol_ids))
+        self.l4_protos.append(flow[0] if flow else NO_FLOW)
+        self.sports.append(flow[1] if flow else 0)
+        self.dports.append(flow[2] if flow else 0)
+        self.tcp_flags.append(flow[3] if flow else 0)
+        self.infos.append(f"{src} -> {dst}")
+        return len(self.times) - 1
+
+
+def matching(text, columns):
+    display_filter = compile_filter(text)
+    return display_filter, display_filter.predicate(columns)
+
+
+def test_new_addresses_match_after_filter_is_applied():
+    columns = Columns()
+    columns.append('10.0.0.1', '1.1.1.1', 'TCP')
+    display_filter, test = matching('ip.addr == 8.8.8.8', columns)
+    assert list(display_filter.apply(columns, PacketIndex())) == []
+    row = columns.append('10.0.0.1', '8.8.8.8', 'DNS', (17, 5353, 53, 0))
+    other = columns.append('10.0.0.2', '9.9.9.9', 'DNS', (17, 5353, 53, 0))
+    assert test(row)
+    assert not test(other)
+
+
+def test_new_addresses_match_network_filter():
+    columns = Columns()
+    _, test = matching('ip.src == 192.168.0.0/16', columns)
+    row = columns.append('192.168.1.5', '1.1.1.1', 'TCP')
+    other = columns.append('172.16.0.1', '1.1.1.1', 'TCP')
+    assert test(row)
+    assert not test(other)
+
+
+def test_new_protocols_match_after_filter_is_applied():
+    columns = Columns()
+    columns.append('10.0.0.1', '1.1.1.1', 'TCP')
+    _, http = matching('http', columns)
+    _, not_http = matching('proto != HTTP', columns)
+    row = columns.append('10.0.0.1', '1.1.1.1', 'HTTP')
+    other = columns.append('10.0.0.1', '1.1.1.1', 'TLS')
+    assert http(row)
+    assert not http(other)
+    assert not not_http(row)
+    assert not_http(other)
+
+
+def test_filter_matches_rows_after_clear():
+    columns = Columns()
+    columns.append('10.0.0.1', '8.8.8.8', 'DNS', (17, 5353, 53, 0))
+    display_filter, test = matching('ip.addr == 8.8.8.8 && dns', columns)
+    assert test(0)
+    # CLEAR keeps the filter and recompiles its predicate over the emptied columns
+    columns.clear()
+    test = display_filter.predicate(columns)
+    row = columns.append('10.0.0.1', '8.8.8.8', 'DNS', (17, 5353, 53, 0))
+    assert test(row)
+    assert list(display_filter.apply(columns, PacketIndex())) == [row]
@@ -0,0 +1,44 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scapy.layers.inet import IP, UDP
+from scapy.layers.l2 import Ether
+
+from dissect import SummaryPool
+
+
+def frames(count):
+    return [(bytes(Ether() / IP(src='10.0.0.1', dst='10.0.0.2') / UDP(sport=1000 + i, dport=53)), float(i), None)
+            for i in range(count)]
+
+
+def test_collect_limit_splits_chunks_in_order():
+    pool = SummaryPool(workers=0, chunk_size=4)
+    pool.submit(frames(10))
+    first = pool.collect(3)
+    assert [row[0] for row in first] == [0.0, 1.0, 2.0]
+    assert pool.backlog() == 7
+    second = pool.collect(6)
+    assert [row[0] for row in second] == [3.0, 4.0, 5.0, 6.0, 7.0, 8.0]
+    assert [row[0] for row in pool.collect()] == [9.0]
+    assert pool.backlog() == 0
+
+
+def test_worker_processes_match_inline_summaries():
+    pool = SummaryPool(workers=1, chunk_size=8)
+    try:
+        pool.submit(frames(20))
+        deadline = time.monotonic() + 60
+        rows = []
+        while pool.backlog() and time.monotonic() < deadline:
+            rows += pool.collect()
+            time.sleep(0.01)
+    finally:
+        pool.shutdown()
+    inline = SummaryPool(workers=0)
+    inline.submit(frames(20))
+    assert rows == inline.collect()
+    assert sys.modules['__main__'].__name__ == '__main__'
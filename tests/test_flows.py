@@ -0,0 +1,53 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flows import FlowTable
+
+
+def row(timestamp, port):
+    return (timestamp, '10.0.0.1', '10.0.0.2', 'UDP', 60, '', (17, port, 53, 0))
+
+
+def test_trim_keeps_list_when_every_flow_is_active():
+    table = FlowTable(idle_timeout=1000.0, history=10)
+    table.update([row(float(i), 1000 + i) for i in range(15)])
+    flows = table.flows
+    table.update([row(20.0, 1000)])
+    assert table.flows is flows
+    assert table.generation == 0
+    assert len(table) == 15
+
+
+def test_trim_drops_idle_flows_from_anywhere():
+    table = FlowTable(idle_timeout=10.0, history=10)
+    # Ports 1000-1004 stay busy at the front while later flows go idle
+    table.update([row(0.0, 1000 + i) for i in range(5)])
+    table.update([row(1.0, 2000 + i) for i in range(8)])
+    table.update([row(20.0, 1000 + i) for i in range(5)])
+    assert table.generation == 1
+    assert [flow.sport for flow in table.flows[:5]] == [1000, 1001, 1002, 1003, 1004]
+    # Down to 90% of history, oldest idle flows first
+    assert [flow.sport for flow in table.flows[5:]] == [2004, 2005, 2006, 2007]
+    generation = table.generation
+    table.update([row(21.0, 1000)])
+    assert table.generation == generation
+
+
+def tcp_row(timestamp, flags, sport=40000):
+    return (timestamp, '10.0.0.1', '10.0.0.2', 'TCP', 60, '', (6, sport, 80, flags))
+
+
+def test_port_reuse_retires_flow_and_trims_it():
+    table = FlowTable(idle_timeout=1000.0, history=10)
+    timestamp = 0.0
+    for _ in range(12):
+        # SYN then RST: the 5-tuple is finished and the next SYN starts a new flow
+        table.update([tcp_row(timestamp, 0x02), tcp_row(timestamp + 0.1, 0x04)])
+        timestamp += 1.0
+    assert table.inactive == len(table) - 1
+    assert len(table) <= 10
+    assert table.generation == 1
+    assert table.flows[-1].active
+    assert sum(flow.active for flow in table.flows) == 1
@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from map_tiles import TILE_PREFETCH_ENV, TILE_URL, TILE_URL_ENV, asset_path, prefetch_on_open, tile_url
+
+
+def test_bundled_leaflet_is_served_locally():
+    for name in ('leaflet-src.esm.js', 'leaflet.css', 'images/marker-icon.png', 'images/layers.png'):
+        assert asset_path(name) is not None
+
+
+def test_asset_path_stays_inside_asset_directory():
+    assert asset_path('../../SniffMapper.py') is None
+    assert asset_path('missing.js') is None
+
+
+def test_prefetch_is_opt_in(monkeypatch):
+    monkeypatch.delenv(TILE_PREFETCH_ENV, raising=False)
+    assert not prefetch_on_open()
+    monkeypatch.setenv(TILE_PREFETCH_ENV, '0')
+    assert not prefetch_on_open()
+    monkeypatch.setenv(TILE_PREFETCH_ENV, '1')
+    assert prefetch_on_open()
+
+
+def test_tile_url_is_configurable(monkeypatch):
+    monkeypatch.delenv(TILE_URL_ENV, raising=False)
+    assert tile_url() == TILE_URL
+    monkeypatch.setenv(TILE_URL_ENV, 'https://tiles.example.net/{z}/{x}/{y}.png')
+    assert tile_url() == 'https://tiles.example.net/{z}/{x}/{y}.png'
@@ -0,0 +1,123 @@
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reassembly import NEED_MORE, NO_MATCH, TcpReassembler, client_hello_sni, parse_http, parse_tls
+
+CLIENT = ('10.0.0.1', 40000)
+SERVER = ('93.184.216.34', 80)
+SYN = 0x02
+ACK = 0x10
+PSH_ACK = 0x18
+
+
+def segment(timestamp, flags, seq, payload=b'', client=CLIENT, server=SERVER):
+    # A summary row whose flow entry carries seq and the payload's place in the frame
+    row = (timestamp, client[0], server[0], 'TCP', 54 + len(payload), 'TCP segment',
+           (6, client[1], server[1], flags, seq, 0, len(payload)))
+    return row, payload
+
+
+def process(reassembler, segments):
+    rows = [row for row, _ in segments]
+    payloads = [payload for _, payload in segments]
+    return reassembler.process(rows, payloads.__getitem__)
+
+
+def client_hello(server_name):
+    name = server_name.encode('ascii')
+    names = struct.pack('!BH', 0, len(name)) + name
+    extensions = struct.pack('!HHH', 0, len(names) + 2, len(names)) + names
+    body = b'\x03\x03' + bytes(32) + b'\x00' + struct.pack('!H', 2) + b'\x13\x01' + b'\x01\x00' + \
+        struct.pack('!H', len(extensions)) + extensions
+    message = b'\x01' + len(body).to_bytes(3, 'big') + body
+    return b'\x16\x03\x01' + struct.pack('!H', len(message)) + message
+
+
+def test_http_request_split_across_segments():
+    reassembler = TcpReassembler()
+    first, second = b'GET /index.html HTTP/1.1\r\nHo', b'st: example.com\r\n\r\n'
+    rows = process(reassembler, [segment(0.0, SYN, 1000), segment(0.1, PSH_ACK, 1001, first)])
+    assert rows[1][3] == 'TCP'
+    rows = process(reassembler, [segment(0.2, PSH_ACK, 1001 + len(first), second), segment(0.3, ACK, 1100)])
+    assert rows[0][3] == 'HTTP'
+    assert rows[0][5] == 'HTTP: GET /index.html HTTP/1.1 (Host: example.com)'
+    # Later packets on the identified connection just get the label
+    assert rows[1][3] == 'HTTP'
+    assert not reassembler.streams
+
+
+def test_tls_client_hello_sni_split_across_segments():
+    reassembler = TcpReassembler()
+    server = ('93.184.216.34', 443)
+    hello = client_hello('example.org')
+    rows = process(reassembler, [segment(0.0, SYN, 5000, server=server),
+                                 segment(0.1, PSH_ACK, 5001, hello[:40], server=server),
+                                 segment(0.2, PSH_ACK, 5041, hello[40:], server=server)])
+    assert rows[1][3] == 'TCP'
+    assert rows[2][3:] == ('HTTPS', rows[2][4], 'TLS ClientHello SNI: example.org', rows[2][6])
+
+
+def test_out_of_order_and_retransmitted_segments():
+    reassembler = TcpReassembler()
+    first, second = b'GET / HTTP/1.1\r\nHost: ', b'example.net\r\n\r\n'
+    late = 1001 + len(first)
+    rows = process(reassembler, [
+        segment(0.0, SYN, 1000),
+        segment(0.1, PSH_ACK, late, second),
+        segment(0.2, PSH_ACK, late, second),
+        segment(0.3, PSH_ACK, 1001, first[:10]),
+        segment(0.4, PSH_ACK, 1001, first),
+    ])
+    assert [row[3] for row in rows] == ['TCP', 'TCP', 'TCP', 'TCP', 'HTTP']
+    assert rows[4][5] == 'HTTP: GET / HTTP/1.1 (Host: example.net)'
+
+
+def test_out_of_order_data_is_capped():
+    reassembler = TcpReassembler(max_pending=100)
+    process(reassembler, [segment(0.0, SYN, 1000)] +
+            [segment(0.1, PSH_ACK, 2000 + 60 * i, b'x' * 60) for i in range(10)])
+    stream = reassembler.streams[(CLIENT[0], CLIENT[1], SERVER[0], SERVER[1])]
+    assert stream.pending_bytes <= 100
+
+
+def test_parsers_wait_for_more_or_give_up():
+    assert parse_http(b'GE', 80) == NEED_MORE
+    assert parse_http(b'GET / HTTP/1.1', 80) == NEED_MORE
+    assert parse_http(b'\x00\x01binary', 80) == NO_MATCH
+    assert parse_tls(b'\x16\x03\x01\x00', 443) == NEED_MORE
+    assert parse_tls(client_hello('a.example')[:20], 443) == NEED_MORE
+    assert parse_tls(b'\x17\x03\x03\x00\x10' + bytes(16), 443) == NO_MATCH
+
+
+def test_truncated_client_hello_does_not_raise():
+    hello = client_hello('example.org')
+    assert client_hello_sni(hello[5:]) == 'example.org'
+    for cut in range(len(hello)):
+        # A record cut short waits for more data
+        assert parse_tls(hello[:cut], 443) == NEED_MORE
+        # A complete message whose body was cut short still parses, without an SNI
+        body = hello[9:9 + cut]
+        message = b'\x01' + len(body).to_bytes(3, 'big') + body
+        result = parse_tls(b'\x16\x03\x01' + struct.pack('!H', len(message)) + message, 443)
+        assert result[0] == 'HTTPS'
+        assert result[1] == 'TLS ClientHello' or cut >= len(hello) - 9
+
+
+def test_garbage_streams_do_not_raise():
+    generator = random.Random(1234)
+    reassembler = TcpReassembler()
+    segments = []
+    for i in range(300):
+        client = (f'10.0.{i % 7}.1', 40000 + i % 13)
+        server = ('192.0.2.1', generator.choice((80, 443, 8080)))
+        prefix = generator.choice((b'', b'\x16\x03\x01', b'GET ', b'HTTP/1.1 ', b'\x16\x03\x03\xff\xff\x01'))
+        payload = prefix + bytes(generator.randrange(256) for _ in range(generator.randrange(0, 200)))
+        flags = generator.choice((SYN, ACK, PSH_ACK, 0x11, 0x04))
+        segments.append(segment(i * 0.01, flags, generator.randrange(1 << 32), payload, client, server))
+    rows = process(reassembler, segments)
+    assert len(rows) == len(segments)
+    assert reassembler.buffered_bytes() <= len(reassembler.streams) * (reassembler.max_bytes + reassembler.max_pending)